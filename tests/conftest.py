@@ -0,0 +1,84 @@
+#
+# The tests run the tools against bm_mock_switch, serving the program of
+# data/mock_switch.json on a free port.
+#
+
+import io
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+from thrift.Thrift import TMessageType
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import TTransport
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "tools"))
+
+import bmpy_utils
+from bm_mock_switch import MockSwitch, MockSwitchServer
+from bm_runtime.standard import Standard
+
+CONFIG = os.path.join(TESTS_DIR, "data", "mock_switch.json")
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # keeps the config and md5 caches of bmpy_utils out of the home dir
+    monkeypatch.setenv("BMPY_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def switch():
+    return MockSwitch.from_file(CONFIG)
+
+
+@pytest.fixture
+def server(switch):
+    server = MockSwitchServer(switch, port=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    client = bmpy_utils.thrift_connect_standard("localhost", server.port,
+                                                out=io.StringIO())
+    yield client
+    client._oprot.trans.close()
+
+
+def reply_bytes(method, success):
+    """Encoded reply of a Standard method returning success."""
+    buf = TTransport.TMemoryBuffer()
+    protocol = TBinaryProtocol.TBinaryProtocol(buf)
+    protocol.writeMessageBegin(method, TMessageType.REPLY, 0)
+    getattr(Standard, method + "_result")(success=success).write(protocol)
+    protocol.writeMessageEnd()
+    return buf.getvalue()
+
+
+def trickling_server(reply, chunks, gap):
+    """Port of a server which answers one request with reply, split in
+    chunks, waiting gap seconds after each of them, like a slow switch."""
+    listener = socket.socket()
+    listener.bind(("localhost", 0))
+    listener.listen(1)
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn:
+            conn.recv(65536)
+            size = len(reply) // chunks + 1
+            for i in range(0, len(reply), size):
+                try:
+                    conn.sendall(reply[i:i + size])
+                except OSError:
+                    break
+                time.sleep(gap)
+        listener.close()
+    threading.Thread(target=serve, daemon=True).start()
+    return listener.getsockname()[1]
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+import bmpy_utils
+from bm_runtime.simple_pre_lag import SimplePreLAG
+from bm_runtime.standard.ttypes import *
+
+
+def lpm_key(addr, prefix_length):
+    return [BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(
+        key=bytes(addr), prefix_length=prefix_length))]
+
+
+def forward(mac, port):
+    return [bytes(mac), port.to_bytes(2, "big")]
+
+
+def test_lpm_longest_prefix_wins(client, switch):
+    client.bm_mt_add_entry(0, "MyIngress.ipv4_lpm", lpm_key([10, 0, 0, 0], 8),
+                           "MyIngress.ipv4_forward", forward([1] * 6, 1),
+                           BmAddEntryOptions())
+    handle = client.bm_mt_add_entry(
+        0, "MyIngress.ipv4_lpm", lpm_key([10, 1, 0, 0], 16),
+        "MyIngress.ipv4_forward", forward([2] * 6, 2), BmAddEntryOptions())
+    assert switch.match("MyIngress.ipv4_lpm", [bytes([10, 1, 2, 3])])[0] == \
+        handle
+    assert switch.match("MyIngress.ipv4_lpm", [bytes([11, 0, 0, 0])])[0] is \
+        None
+    assert client.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm") == 2
+
+
+def test_errors_match_bmv2(client):
+    with pytest.raises(InvalidTableOperation) as e:
+        client.bm_mt_get_num_entries(0, "nope")
+    assert e.value.code == TableOperationErrorCode.INVALID_TABLE_NAME
+    key = lpm_key([10, 0, 0, 0], 8)
+    client.bm_mt_add_entry(0, "MyIngress.ipv4_lpm", key, "MyIngress.drop", [],
+                           BmAddEntryOptions())
+    with pytest.raises(InvalidTableOperation) as e:
+        client.bm_mt_add_entry(0, "MyIngress.ipv4_lpm", key, "MyIngress.drop",
+                               [], BmAddEntryOptions())
+    assert e.value.code == TableOperationErrorCode.DUPLICATE_ENTRY
+
+
+def test_exact_table_full(client):
+    for i in range(4):
+        client.bm_mt_add_entry(
+            0, "MyIngress.dmac",
+            [BmMatchParam(type=BmMatchParamType.EXACT,
+                          exact=BmMatchParamExact(key=bytes([0] * 5 + [i])))],
+            "MyIngress.set_port", [b"\x00\x01"], BmAddEntryOptions())
+    with pytest.raises(InvalidTableOperation) as e:
+        client.bm_mt_add_entry(
+            0, "MyIngress.dmac",
+            [BmMatchParam(type=BmMatchParamType.EXACT,
+                          exact=BmMatchParamExact(key=bytes(6)))],
+            "MyIngress.set_port", [b"\x00\x01"], BmAddEntryOptions())
+    assert e.value.code == TableOperationErrorCode.TABLE_FULL
+
+
+def test_pre_replication(server, switch):
+    pre, = bmpy_utils.thrift_connect(
+        "localhost", server.port, [("simple_pre_lag", SimplePreLAG.Client)],
+        out=io.StringIO())
+    try:
+        mgrp = pre.bm_mc_mgrp_create(0, 1)
+        node = pre.bm_mc_node_create(0, 7, "11", "")
+        pre.bm_mc_node_associate(0, mgrp, node)
+        assert sorted(switch.pre.replicate(1)) == [(7, 0), (7, 1)]
+    finally:
+        pre._oprot.trans.close()
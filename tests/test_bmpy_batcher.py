@@ -0,0 +1,57 @@
+import pytest
+
+from bm_runtime.standard.ttypes import *
+from bmpy_batcher import WriteBatcher
+
+
+def lpm_key(i):
+    return [BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(
+        key=bytes([10, i, 0, 0]), prefix_length=16))]
+
+
+def add(batcher, i, data=None):
+    return batcher.bm_mt_add_entry(
+        0, "MyIngress.ipv4_lpm", lpm_key(i), "MyIngress.ipv4_forward",
+        [bytes(6), b"\x00\x01"] if data is None else data,
+        BmAddEntryOptions())
+
+
+def test_writes_are_batched_in_order(client):
+    with WriteBatcher(client, max_batch=8, max_delay=1.0) as batcher:
+        futures = [add(batcher, i) for i in range(20)]
+        batcher.barrier()
+        assert [f.result(timeout=1) for f in futures] == list(range(20))
+        assert batcher.nb_batches == 3
+        # reads wait for the queued writes
+        add(batcher, 20)
+        assert batcher.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm") == 21
+
+
+def test_switch_errors_go_to_their_future(client):
+    with WriteBatcher(client, max_delay=1.0) as batcher:
+        first = add(batcher, 1)
+        duplicate = add(batcher, 1)
+        last = add(batcher, 2)
+        batcher.barrier()
+        assert first.result(timeout=1) == 0
+        with pytest.raises(InvalidTableOperation):
+            duplicate.result(timeout=1)
+        assert last.result(timeout=1) == 1
+
+
+def test_write_which_cant_be_encoded_fails_alone(client):
+    with WriteBatcher(client, max_delay=1.0) as batcher:
+        before = add(batcher, 1)
+        bad = add(batcher, 2, data=[1, 2])
+        after = add(batcher, 3)
+        batcher.flush()
+        assert before.result(timeout=1) == 0
+        with pytest.raises(TypeError):
+            bad.result(timeout=1)
+        assert after.result(timeout=1) == 1
+        # the flusher thread is still alive and nothing of the bad write
+        # was sent
+        later = add(batcher, 4)
+        batcher.flush()
+        assert later.result(timeout=1) == 2
+        assert batcher.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm") == 3
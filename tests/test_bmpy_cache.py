@@ -0,0 +1,37 @@
+from bmpy_cache import CachingClient
+from bm_runtime.standard.ttypes import *
+
+TABLE = "MyIngress.ecmp_tbl"
+
+
+def protocol_key(protocol):
+    return [BmMatchParam(type=BmMatchParamType.EXACT,
+                         exact=BmMatchParamExact(bytes([protocol])))]
+
+
+def test_reads_are_cached_until_the_table_is_written(client):
+    cache = CachingClient(client)
+    assert cache.bm_mt_get_entries(0, "MyIngress.dmac") == []
+    cache.bm_mt_get_entries(0, "MyIngress.dmac")
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.bm_mt_add_entry(
+        0, "MyIngress.dmac",
+        [BmMatchParam(type=BmMatchParamType.EXACT,
+                      exact=BmMatchParamExact(bytes(6)))],
+        "NoAction", [], BmAddEntryOptions())
+    assert len(cache.bm_mt_get_entries(0, "MyIngress.dmac")) == 1
+
+
+def test_indirect_writes_invalidate_the_table(client):
+    cache = CachingClient(client)
+    mbr = cache.bm_mt_act_prof_add_member(0, "MyIngress.ecmp",
+                                          "MyIngress.set_port", [b"\x00\x01"])
+    handle = cache.bm_mt_indirect_add_entry(0, TABLE, protocol_key(6), mbr,
+                                            BmAddEntryOptions())
+    assert len(cache.bm_mt_get_entries(0, TABLE)) == 1
+    cache.bm_mt_indirect_add_entry(0, TABLE, protocol_key(17), mbr,
+                                   BmAddEntryOptions())
+    assert len(cache.bm_mt_get_entries(0, TABLE)) == 2
+    assert cache.bm_mt_get_entry(0, TABLE, handle).entry_handle == handle
+    cache.bm_mt_indirect_delete_entry(0, TABLE, handle)
+    assert len(cache.bm_mt_get_entries(0, TABLE)) == 1
@@ -0,0 +1,22 @@
+import bmpy_compact
+from bm_runtime.standard.ttypes import *
+
+TABLE = "MyIngress.ipv4_lpm"
+
+
+def test_compact_entries_match_the_generated_ones(client):
+    for i in range(3):
+        client.bm_mt_add_entry(
+            0, TABLE,
+            [BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(
+                key=bytes([10, i, 0, 0]), prefix_length=16))],
+            "MyIngress.ipv4_forward", [bytes([0xaa] * 6), b"\x00\x01"],
+            BmAddEntryOptions())
+    entries = client.bm_mt_get_entries(0, TABLE)
+    compact = bmpy_compact.get_entries(client, 0, TABLE)
+    assert [e.to_original() for e in compact] == entries
+    assert compact == bmpy_compact.get_entries(client, 0, TABLE)
+    assert repr(compact[0]) == repr(entries[0])
+    # not equal across classes, either way round
+    assert compact[0] != entries[0]
+    assert entries[0] != compact[0]
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import bmpy_encode
+from bm_runtime.standard.ttypes import *
+
+from conftest import CONFIG
+
+ROUTES = 50
+PORTS = [i % 512 for i in range(ROUTES)]
+ADDRS = [(10 << 24) | (i << 8) for i in range(ROUTES)]
+CASES = {
+    "lpm": ("MyIngress.ipv4_lpm", "MyIngress.ipv4_forward",
+            [(ADDRS, [24] * ROUTES)],
+            [[0xaa0000000000 + i for i in range(ROUTES)], PORTS]),
+    "ternary_range": ("MyIngress.acl", "MyIngress.drop",
+                      [(ADDRS, [0xffffff00] * ROUTES),
+                       ([i for i in range(ROUTES)],
+                        [i + 10 for i in range(ROUTES)])],
+                      []),
+    "no_arguments": ("MyIngress.ipv4_lpm", "MyIngress.drop",
+                     [(ADDRS, [24] * ROUTES)], []),
+}
+
+
+@pytest.fixture(params=["lists", "numpy"])
+def encoder_numpy(request, monkeypatch):
+    """Runs a test with the list-based encoder and, when NumPy is
+    installed, with the NumPy one."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(bmpy_encode, "numpy", None)
+    return request.param
+
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_column_encoding_matches_the_client(client, encoder_numpy, case):
+    table, action, key_columns, data_columns = CASES[case]
+    with open(CONFIG) as f:
+        config = json.load(f)
+    encoder = bmpy_encode.TableEncoder.from_config(config, table)
+    calls = encoder.encode_add_entries(client, table, action, key_columns,
+                                       data_columns)
+    expected = b"".join(
+        bmpy_encode.encode_request(client, "bm_mt_add_entry", 0, table,
+                                   key, action_name, data, options)
+        for key, action_name, data, options in encoder.entries(
+            action, key_columns, data_columns))
+    assert len(calls) == ROUTES
+    assert calls.data == expected
+
+    results = bmpy_encode.send_encoded(client, calls, window=16)
+    assert [call.error for call in results] == [None] * ROUTES
+    assert client.bm_mt_get_num_entries(0, table) == ROUTES
@@ -0,0 +1,134 @@
+import io
+import time
+
+from thrift.Thrift import TMessageType
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import TTransport
+
+import bmpy_pipeline
+import bmpy_record
+import bmpy_utils
+from bm_mock_switch import Latency, MockSwitch, MockSwitchServer
+from bm_runtime.standard import Standard
+from bm_runtime.standard.ttypes import *
+
+from conftest import CONFIG
+
+
+def session(port, recorder=None):
+    client = bmpy_utils.thrift_connect_standard(
+        "localhost", port, out=io.StringIO(), recorder=recorder)
+    entries = [([BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(
+        key=bytes([10, i, 0, 0]), prefix_length=16))],
+        "MyIngress.ipv4_forward", [bytes([0xaa] * 6), b"\x00\x01"],
+        BmAddEntryOptions()) for i in range(50)]
+    calls = bmpy_pipeline.add_entries(client, "MyIngress.ipv4_lpm", entries,
+                                      window=16)
+    results = [[call.result for call in calls]]
+    try:
+        client.bm_mt_get_num_entries(0, "nope")
+    except InvalidTableOperation as e:
+        results.append(e.code)
+    results.append(client.bm_mt_get_entries(0, "MyIngress.ipv4_lpm"))
+    client._oprot.trans.close()
+    return results
+
+
+def record(server, path):
+    with bmpy_record.Recorder.open(str(path)) as recorder:
+        results = session(server.port, recorder)
+    return results, bmpy_record.Recording.load(str(path))
+
+
+def test_recording_summary(server, tmp_path):
+    _, recording = record(server, tmp_path / "session.jsonl")
+    summary = recording.summary()
+    assert summary["connections"] == 1
+    assert summary["methods"] == {"standard:bm_mt_add_entry": 50,
+                                  "standard:bm_mt_get_entries": 1,
+                                  "standard:bm_mt_get_num_entries": 1}
+
+
+def test_replay_against_a_fresh_switch(server, tmp_path):
+    _, recording = record(server, tmp_path / "session.jsonl")
+    with MockSwitchServer(MockSwitch.from_file(CONFIG), port=0) as fresh:
+        result = bmpy_record.replay(recording, "localhost", fresh.port)
+    assert result.errors == []
+    assert result.calls == 52
+    assert not result.mismatches
+    methods = result.stats.to_dict()["standard"]
+    assert methods["bm_mt_get_num_entries"]["errors"] == 1
+
+
+def test_replay_server_answers_like_the_switch(server, tmp_path):
+    expected, recording = record(server, tmp_path / "session.jsonl")
+    with bmpy_record.ReplayServer(recording, port=0) as fake:
+        assert session(fake.port) == expected
+        assert fake.mismatches == 0
+
+
+def large_reply(nb_entries):
+    buf = TTransport.TMemoryBuffer()
+    protocol = TBinaryProtocol.TBinaryProtocol(buf)
+    entries = [BmMtEntry(
+        match_key=[BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(
+            key=bytes([10, i % 256, 0, 0]), prefix_length=16))],
+        entry_handle=i,
+        action_entry=BmActionEntry(
+            action_type=BmActionEntryType.ACTION_DATA,
+            action_name="MyIngress.ipv4_forward",
+            action_data=[bytes([0xaa] * 6), b"\x00\x01"]),
+        options=BmAddEntryOptions()) for i in range(nb_entries)]
+    protocol.writeMessageBegin("bm_mt_get_entries", TMessageType.REPLY, 0)
+    Standard.bm_mt_get_entries_result(success=entries).write(protocol)
+    protocol.writeMessageEnd()
+    return buf.getvalue()
+
+
+def test_splitter_parses_a_large_reply_once():
+    reply = large_reply(20000)
+    splitter = bmpy_record.MessageSplitter()
+    messages = []
+    start = time.perf_counter()
+    for i in range(0, len(reply) * 2, 4096):
+        messages += splitter.feed((reply + reply)[i:i + 4096])
+    # re-parsing from the start of the message on every read took seconds
+    assert time.perf_counter() - start < 2.0
+    assert [data for _, data in messages] == [reply, reply]
+    assert messages[0][0].name == "bm_mt_get_entries"
+
+
+def test_splitter_fed_byte_by_byte():
+    reply = large_reply(3)
+    splitter = bmpy_record.MessageSplitter()
+    messages = []
+    for i in range(len(reply)):
+        messages += splitter.feed(reply[i:i + 1])
+    assert [data for _, data in messages] == [reply]
+    assert not bmpy_record.is_error(reply)
+
+
+def test_truncated_reply_is_an_error():
+    assert bmpy_record.is_error(large_reply(3)[:-10])
+
+
+def test_replay_at_speed_1_measures_the_switch_latency(switch, tmp_path):
+    path = str(tmp_path / "slow.jsonl")
+    slow = MockSwitchServer(switch, port=0, latency=Latency(0.05)).start()
+    try:
+        with bmpy_record.Recorder.open(path) as recorder:
+            client = bmpy_utils.thrift_connect_standard(
+                "localhost", slow.port, out=io.StringIO(), recorder=recorder)
+            for _ in range(5):
+                client.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm")
+            client._oprot.trans.close()
+    finally:
+        slow.stop()
+    recording = bmpy_record.Recording.load(path)
+    with MockSwitchServer(MockSwitch.from_file(CONFIG), port=0) as fast:
+        result = bmpy_record.replay(recording, "localhost", fast.port,
+                                    speed=1)
+    assert result.errors == []
+    assert result.calls == 5
+    stats = result.stats.to_dict()["standard"]["bm_mt_get_num_entries"]
+    assert stats["max_time"] < 0.025
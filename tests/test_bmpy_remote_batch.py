@@ -0,0 +1,46 @@
+import io
+import json
+
+import bmpy_remote_batch
+from bm_runtime.standard import Standard
+
+CALLS = """\
+# comment
+bm_mt_get_num_entries 0 MyIngress.ipv4_lpm
+bm_mt_add_entry 0 MyIngress.ipv4_lpm "[BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(b'\\n\\0\\0\\1', 32))]" MyIngress.drop [] None
+bm_nope 1
+bm_mt_get_num_entries 0 nope
+bm_mt_get_num_entries 0 MyIngress.ipv4_lpm
+"""
+
+
+def run(client, calls, window):
+    out = io.StringIO()
+    failures = bmpy_remote_batch.run_batch(
+        client, Standard, calls.splitlines(), out, window)
+    return failures, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_batch_results_in_order(client):
+    failures, records = run(client, CALLS, window=4)
+    assert failures == 2
+    assert [r["line"] for r in records] == [2, 3, 4, 5, 6]
+    assert records[0]["result"] == 0
+    assert records[1]["result"] == 0
+    assert records[2]["error"]["type"] == "BadCall"
+    assert records[3]["error"]["code_name"] == "INVALID_TABLE_NAME"
+    assert records[4]["result"] == 1
+
+
+def test_call_which_cant_be_encoded_fails_alone(client):
+    calls = ("bm_mt_get_num_entries 0 MyIngress.ipv4_lpm\n"
+             "bm_mt_get_num_entries \"'x'\" MyIngress.ipv4_lpm\n"
+             "bm_mt_get_num_entries 0 MyIngress.dmac\n")
+    failures, records = run(client, calls, window=4)
+    assert failures == 1
+    assert [r["line"] for r in records] == [1, 2, 3]
+    assert records[0]["result"] == 0
+    assert records[1]["method"] == "bm_mt_get_num_entries"
+    # struct.error, or TypeError with fastbinary
+    assert records[1]["error"]["type"] in ("error", "TypeError")
+    assert records[2]["result"] == 0
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+from thrift.transport import TTransport
+
+import bmpy_stream
+import bmpy_utils
+from bm_runtime.standard.ttypes import *
+
+from conftest import reply_bytes, trickling_server
+
+
+def add_routes(client, n):
+    for i in range(n):
+        client.bm_mt_add_entry(
+            0, "MyIngress.ipv4_lpm",
+            [BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(
+                key=bytes([10, i, 0, 0]), prefix_length=16))],
+            "MyIngress.ipv4_forward",
+            [bytes([0xaa, i, 0, 0, 0, 0]), b"\x00\x01"],
+            BmAddEntryOptions())
+
+
+def test_iter_entries_matches_get_entries(client):
+    add_routes(client, 10)
+    entries = list(bmpy_stream.iter_entries(client, 0, "MyIngress.ipv4_lpm"))
+    assert entries == client.bm_mt_get_entries(0, "MyIngress.ipv4_lpm")
+
+
+def test_config_into_and_to_file(client, switch):
+    expected = client.bm_get_config().encode("utf-8")
+    assert bytes(bmpy_stream.get_config_into(client)) == expected
+    f = io.BytesIO()
+    assert bmpy_stream.get_config_to_file(client, f, chunk_size=100) == \
+        len(expected)
+    assert f.getvalue() == expected
+
+
+def test_stopping_early_leaves_the_connection_usable(client):
+    # the action data isn't valid UTF-8
+    add_routes(client, 10)
+    entries = bmpy_stream.iter_entries(client, 0, "MyIngress.ipv4_lpm")
+    assert [next(entries).entry_handle for _ in range(2)] == [0, 1]
+    entries.close()
+    assert client.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm") == 10
+
+
+def test_read_timeout_of_a_streamed_reply_is_timed_out():
+    # the payload is read with recv_into, past the buffered transport
+    reply = reply_bytes("bm_get_config", "x" * 200000)
+    port = trickling_server(reply, chunks=2, gap=1.0)
+    client = bmpy_utils.thrift_connect_standard(
+        "localhost", port, out=io.StringIO(),
+        timeouts=bmpy_utils.Timeouts(read=0.2))
+    try:
+        with pytest.raises(TTransport.TTransportException) as e:
+            bmpy_stream.get_config_into(client)
+        assert e.value.type == TTransport.TTransportException.TIMED_OUT
+    finally:
+        client._oprot.trans.close()
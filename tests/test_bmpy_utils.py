@@ -0,0 +1,138 @@
+import hashlib
+import io
+import time
+
+import pytest
+from thrift.transport import TTransport
+
+import bmpy_utils
+from bm_mock_switch import Latency, MockSwitchServer
+
+from conftest import reply_bytes, trickling_server
+
+
+def test_gives_up_once_backoff_is_exhausted(switch):
+    server = MockSwitchServer(switch, port=0).start()
+    client = bmpy_utils.thrift_connect_resilient(
+        "localhost", server.port,
+        backoff=bmpy_utils.Backoff(initial=0.01, max_attempts=3))
+    try:
+        client.bm_mgmt_get_info()
+        server.stop()
+        with pytest.raises(bmpy_utils.CONNECTION_ERRORS):
+            client.bm_mgmt_get_info()
+    finally:
+        client.close()
+
+
+def test_restart_while_idle_is_reported(switch):
+    server = MockSwitchServer(switch, port=0).start()
+    port = server.port
+    states = []
+    client = bmpy_utils.thrift_connect_resilient(
+        "localhost", port,
+        backoff=bmpy_utils.Backoff(initial=0.01, max_attempts=50))
+    client.add_state_callback(lambda c, state: states.append(state))
+    try:
+        assert client.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm") == 0
+        server.stop()
+        server = MockSwitchServer(switch, port=port).start()
+        assert client.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm") == 0
+        assert states == ["disconnected", "reconnected"]
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_slow_switch_is_not_a_restart(switch):
+    latency = Latency(per_method={"bm_get_config_md5": 1.0})
+    states = []
+    with MockSwitchServer(switch, port=0, latency=latency) as server:
+        client = bmpy_utils.thrift_connect_resilient(
+            "localhost", server.port,
+            backoff=bmpy_utils.Backoff(initial=0.01, max_attempts=3),
+            timeouts=bmpy_utils.Timeouts(read=0.2))
+        client.add_state_callback(lambda c, state: states.append(state))
+        try:
+            start = time.monotonic()
+            with pytest.raises(TTransport.TTransportException) as e:
+                client.bm_get_config_md5()
+            assert e.value.type == TTransport.TTransportException.TIMED_OUT
+            assert time.monotonic() - start < 0.9
+            assert client.bm_mt_get_num_entries(0, "MyIngress.ipv4_lpm") == 0
+            assert states == []
+        finally:
+            client.close()
+
+
+def test_per_method_timeout_replaces_the_default():
+    timeouts = bmpy_utils.Timeouts(read=10.0, per_method={
+        "bm_mgmt_get_info": 0.5, "bm_get_config": 120.0})
+    assert timeouts.read_timeout("bm_mgmt_get_info") == 0.5
+    assert timeouts.read_timeout("bm_get_config") == 120.0
+    assert timeouts.read_timeout("bm_mt_add_entry") == 10.0
+    assert timeouts.read_timeout("bm_mt_get_entries") >= 10.0
+
+
+def test_thrift_connect_applies_the_read_timeout(switch):
+    server = MockSwitchServer(
+        switch, port=0,
+        latency=Latency(per_method={"bm_get_config_md5": 1.0})).start()
+    client = bmpy_utils.thrift_connect_standard(
+        "localhost", server.port, out=io.StringIO(),
+        timeouts=bmpy_utils.Timeouts(connect=1.0, read=0.2))
+    try:
+        start = time.time()
+        with pytest.raises(TTransport.TTransportException) as e:
+            client.bm_get_config_md5()
+        assert e.value.type == TTransport.TTransportException.TIMED_OUT
+        assert time.time() - start < 0.9
+    finally:
+        client._oprot.trans.close()
+        server.stop()
+
+
+class SwappingClient(object):
+    """Reports the md5 of the old config and returns the new one, like a
+    switch whose config is swapped between the two calls."""
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.md5_calls = 0
+
+    def bm_get_config_md5(self):
+        self.md5_calls += 1
+        return hashlib.md5(self.old.encode("utf-8")).digest()
+
+    def bm_get_config(self):
+        return self.new
+
+
+def test_parsed_config_is_cached_under_the_md5_of_what_was_returned():
+    old, new = '{"program": "old"}', '{"program": "new"}'
+    client = SwappingClient(old, new)
+    out = io.StringIO()
+    assert bmpy_utils.get_parsed_json_config(client, out=out) == \
+        {"program": "new"}
+    assert client.md5_calls == 1
+    # a switch really running the old config doesn't get the new one
+    assert bmpy_utils.get_parsed_json_config(
+        SwappingClient(old, old), out=out) == {"program": "old"}
+    assert bmpy_utils.get_parsed_json_config(
+        SwappingClient(new, new), out=out) == {"program": "new"}
+
+
+def test_deadline_bounds_a_reply_read_in_chunks():
+    reply = reply_bytes("bm_get_config_md5", bytes(16))
+    port = trickling_server(reply, chunks=10, gap=0.1)
+    session = bmpy_utils.ThriftSession("localhost", port,
+                                       timeouts=bmpy_utils.Timeouts(read=1.0))
+    try:
+        start = time.time()
+        with pytest.raises(TTransport.TTransportException) as e:
+            session.call("standard", "bm_get_config_md5", deadline=0.3)
+        assert e.value.type == TTransport.TTransportException.TIMED_OUT
+        assert time.time() - start < 0.6
+    finally:
+        session.close()
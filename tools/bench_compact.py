@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+#
+# Memory held by a bm_mt_get_entries dump decoded into the generated structs
+# and into the compact ones of bmpy_compact, measured with tracemalloc.
+#
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from thrift.transport import TTransport
+
+import bmpy_compact
+import bmpy_utils as utils
+from bm_runtime.standard import Standard
+from bm_runtime.standard.ttypes import *
+
+
+parser = argparse.ArgumentParser(description='Compact structs benchmark')
+parser.add_argument('--entries', help='Number of table entries in the dump',
+                    type=int, action="store", default=1000000)
+parser.add_argument('--accelerated', help='Decode with fastbinary',
+                    action="store_true", default=utils.fastbinary is not None)
+parser.add_argument('--no-accelerated', dest='accelerated',
+                    action="store_false")
+
+args = parser.parse_args()
+
+
+def dump(entries):
+    """Encoded bm_mt_get_entries result of an LPM table."""
+    success = []
+    for i in range(entries):
+        key = (0x0a000000 + (i << 8)).to_bytes(4, 'big')
+        success.append(BmMtEntry(
+            match_key=[BmMatchParam(
+                type=BmMatchParamType.LPM,
+                lpm=BmMatchParamLPM(key=key, prefix_length=24))],
+            options=BmAddEntryOptions(), entry_handle=i,
+            action_entry=BmActionEntry(
+                action_type=BmActionEntryType.ACTION_DATA,
+                action_name="MyIngress.ipv4_forward",
+                action_data=[(i % 512).to_bytes(2, 'big'),
+                             (0xaa0000000000 + i).to_bytes(6, 'big')]),
+            life=BmMtEntryLife(timeout_ms=0, time_since_hit_ms=0)))
+    buf = TTransport.TMemoryBuffer()
+    Standard.bm_mt_get_entries_result(success=success).write(
+        utils.make_binary_protocol(buf, args.accelerated))
+    return buf.getvalue()
+
+
+def measure(name, data, result_cls, post=lambda entries: entries):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = result_cls()
+    result.read(utils.make_binary_protocol(TTransport.TMemoryBuffer(data),
+                                           args.accelerated))
+    post(result.success)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result.success) == args.entries
+    print("  {:<10}: held {:>8.1f} MB ({:>5.0f} B/entry), peak {:>8.1f} MB, "
+          "decode {:>6.2f} s".format(
+              name, current / 1e6, current / args.entries, peak / 1e6,
+              elapsed))
+    return result.success
+
+
+def main():
+    data = dump(args.entries)
+    print("{} entries, {:.1f} MB encoded, {}".format(
+        args.entries, len(data) / 1e6, utils.codec_path(args.accelerated)))
+    generated = measure("generated", data, Standard.bm_mt_get_entries_result)
+    sample = generated[-1]
+    del generated
+    compact = measure("compact", data,
+                      bmpy_compact.compact_result("bm_mt_get_entries"),
+                      bmpy_compact.intern_action_names)
+    assert compact[-1].to_original() == sample and \
+        repr(compact[-1]) == repr(sample)
+
+
+if __name__ == '__main__':
+    main()
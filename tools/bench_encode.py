@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+#
+# Time spent encoding the bm_mt_add_entry requests of an IPv4 route set, one
+# route at a time and with the column encoders of bmpy_encode. Requests are
+# written to memory, so no switch is needed.
+#
+
+import argparse
+import random
+import time
+
+from thrift.protocol import TBinaryProtocol, TMultiplexedProtocol
+from thrift.transport import TTransport
+
+import bmpy_encode
+from bm_runtime.standard import Standard
+from bm_runtime.standard.ttypes import *
+
+
+parser = argparse.ArgumentParser(description='Route encoding benchmark')
+parser.add_argument('--routes', help='Number of routes',
+                    type=int, action="store", default=1000000)
+parser.add_argument('--repeat', help='Number of runs, the best one is kept',
+                    type=int, action="store", default=3)
+
+args = parser.parse_args()
+
+KEY = [("lpm", 32)]
+ACTIONS = {"MyIngress.ipv4_forward": [48, 9]}
+TABLE = "MyIngress.ipv4_lpm"
+
+
+def make_client():
+    protocol = TBinaryProtocol.TBinaryProtocolAccelerated(
+        TTransport.TMemoryBuffer())
+    return Standard.Client(
+        TMultiplexedProtocol.TMultiplexedProtocol(protocol, "standard"))
+
+
+def send_all(client, entries):
+    for key, action_name, data, options in entries:
+        client.send_bm_mt_add_entry(0, TABLE, key, action_name, data, options)
+    return client._oprot.trans.getvalue()
+
+
+def routes(n):
+    rng = random.Random(0)
+    addrs = [rng.getrandbits(24) << 8 for _ in range(n)]
+    prefix_lengths = [24] * n
+    macs = [rng.getrandbits(48) for _ in range(n)]
+    ports = [rng.randrange(512) for _ in range(n)]
+    return addrs, prefix_lengths, macs, ports
+
+
+def per_route(addrs, prefix_lengths, macs, ports):
+    client = make_client()
+    options = BmAddEntryOptions()
+    entries = []
+    for addr, prefix_length, mac, port in zip(addrs, prefix_lengths, macs,
+                                              ports):
+        key = [BmMatchParam(type=BmMatchParamType.LPM,
+                            lpm=BmMatchParamLPM(key=addr.to_bytes(4, 'big'),
+                                                prefix_length=prefix_length))]
+        data = [mac.to_bytes(6, 'big'), port.to_bytes(2, 'big')]
+        entries.append((key, "MyIngress.ipv4_forward", data, options))
+    return send_all(client, entries)
+
+
+def columns(addrs, prefix_lengths, macs, ports):
+    encoder = bmpy_encode.TableEncoder(KEY, ACTIONS)
+    return send_all(make_client(), encoder.entries(
+        "MyIngress.ipv4_forward", [(addrs, prefix_lengths)], [macs, ports]))
+
+
+def encoded(addrs, prefix_lengths, macs, ports):
+    encoder = bmpy_encode.TableEncoder(KEY, ACTIONS)
+    return encoder.encode_add_entries(
+        make_client(), TABLE, "MyIngress.ipv4_forward",
+        [(addrs, prefix_lengths)], [macs, ports]).data
+
+
+def best_of(fn, *columns):
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fn(*columns)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, elapsed):
+    print("{:<26} {:>8.3f}s {:>8.0f} routes/s".format(
+        name, elapsed, args.routes / elapsed))
+
+
+data = routes(args.routes)
+sample = [column[:1000] for column in data]
+assert per_route(*sample) == columns(*sample) == encoded(*sample)
+report("per route", best_of(per_route, *data))
+report("columns, structs", best_of(columns, *data))
+report("columns, encoded (lists)", best_of(encoded, *data))
+if bmpy_encode.numpy is not None:
+    arrays = [bmpy_encode.numpy.array(c, dtype=bmpy_encode.numpy.uint64)
+              for c in data]
+    report("columns, encoded (numpy)", best_of(encoded, *arrays))
+else:
+    print("numpy not installed, skipping the array columns")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+#
+# Import time of the generated Standard service module against the lazy one
+# (see gen_lazy_runtime.py), plus the cost of the first call, each measured
+# in a fresh interpreter. "warm" uses the bytecode caches; "cold" compiles the
+# modules from source, like the first run after an install or an update.
+#
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+parser = argparse.ArgumentParser(description='Service module import benchmark')
+parser.add_argument('--repeat', help='Number of runs, the best one is kept',
+                    type=int, action="store", default=5)
+
+args = parser.parse_args()
+
+MODULES = ["bm_runtime.standard.Standard", "bm_runtime.standard.StandardLazy"]
+
+# thrift is imported first, since the tools import it anyway
+SNIPPET = """
+import importlib, time
+from thrift.protocol import TBinaryProtocol, TMultiplexedProtocol
+from thrift.transport import TTransport
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+protocol = TMultiplexedProtocol.TMultiplexedProtocol(
+    TBinaryProtocol.TBinaryProtocol(TTransport.TMemoryBuffer()), "standard")
+module.Client(protocol).send_bm_mt_get_entries(0, "MyIngress.ipv4_lpm")
+called = time.perf_counter()
+print(imported - start, called - imported)
+"""
+
+
+def run(module, cold):
+    tools_dir = os.path.dirname(os.path.abspath(__file__))
+    cache = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = tools_dir + os.pathsep + env.get("PYTHONPATH", "")
+    # bytecode goes to an empty cache, so that the tree isn't touched
+    env["PYTHONPYCACHEPREFIX"] = cache
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    cmd = [sys.executable, "-c", SNIPPET.format(module=module)]
+    try:
+        if cold:
+            cmd.insert(1, "-B")
+        else:
+            # fills the bytecode cache
+            subprocess.check_output(cmd, env=env)
+        out = subprocess.check_output(cmd, env=env)
+    finally:
+        shutil.rmtree(cache)
+    import_time, call_time = map(float, out.split())
+    return import_time, call_time
+
+
+def main():
+    for cold in (False, True):
+        print("{} start".format("cold" if cold else "warm"))
+        for module in MODULES:
+            runs = [run(module, cold) for _ in range(args.repeat)]
+            import_time = min(r[0] for r in runs)
+            call_time = min(r[1] for r in runs)
+            print("  {:<34}: import {:>7.1f} ms, first call {:>6.2f} ms".format(
+                module, import_time * 1e3, call_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
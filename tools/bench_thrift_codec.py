@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+#
+# Encode and decode throughput of bulk table RPC payloads with the pure Python
+# binary protocol and with the fastbinary accelerated one.
+#
+
+import argparse
+import time
+
+from thrift.transport import TTransport
+
+import bmpy_utils as utils
+from bm_runtime.standard import Standard
+from bm_runtime.standard.ttypes import *
+
+
+parser = argparse.ArgumentParser(description='Thrift codec benchmark')
+parser.add_argument('--entries', help='Number of table entries per payload',
+                    type=int, action="store", default=100000)
+parser.add_argument('--repeat', help='Number of runs, the best one is kept',
+                    type=int, action="store", default=3)
+
+args = parser.parse_args()
+
+
+def lpm_entry(i):
+    key = (0x0a000000 + (i << 8)).to_bytes(4, 'big')
+    match_key = [BmMatchParam(type=BmMatchParamType.LPM,
+                              lpm=BmMatchParamLPM(key=key, prefix_length=24))]
+    action_data = [(i % 512).to_bytes(2, 'big'),
+                   (0xaa0000000000 + i).to_bytes(6, 'big')]
+    return match_key, action_data
+
+
+def add_entry_args(entries):
+    msgs = []
+    for i in range(entries):
+        match_key, action_data = lpm_entry(i)
+        msgs.append(Standard.bm_mt_add_entry_args(
+            cxt_id=0, table_name="MyIngress.ipv4_lpm", match_key=match_key,
+            action_name="MyIngress.ipv4_forward", action_data=action_data,
+            options=BmAddEntryOptions()))
+    return msgs
+
+
+def get_entries_result(entries):
+    success = []
+    for i in range(entries):
+        match_key, action_data = lpm_entry(i)
+        success.append(BmMtEntry(
+            match_key=match_key, options=BmAddEntryOptions(), entry_handle=i,
+            action_entry=BmActionEntry(
+                action_type=BmActionEntryType.ACTION_DATA,
+                action_name="MyIngress.ipv4_forward",
+                action_data=action_data)))
+    return [Standard.bm_mt_get_entries_result(success=success)]
+
+
+def encode(msgs, accelerated):
+    buf = TTransport.TMemoryBuffer()
+    protocol = utils.make_binary_protocol(buf, accelerated)
+    for msg in msgs:
+        msg.write(protocol)
+    return buf.getvalue()
+
+
+def decode(data, cls, count, accelerated):
+    buf = TTransport.TMemoryBuffer(data)
+    protocol = utils.make_binary_protocol(buf, accelerated)
+    msgs = []
+    for _ in range(count):
+        msg = cls()
+        msg.read(protocol)
+        msgs.append(msg)
+    return msgs
+
+
+def best_of(fn):
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(name, msgs, cls):
+    print("{} ({} entries)".format(name, args.entries))
+    reference = encode(msgs, False)
+    for accelerated in (False, True):
+        if accelerated and utils.fastbinary is None:
+            print("  {:<26}: not available".format(
+                utils.codec_path(accelerated)))
+            continue
+        enc_time, data = best_of(lambda: encode(msgs, accelerated))
+        dec_time, decoded = best_of(
+            lambda: decode(data, cls, len(msgs), accelerated))
+        assert data == reference and decoded == msgs
+        print("  {:<26}: encode {:>10.0f} entries/s {:>7.1f} MB/s, "
+              "decode {:>10.0f} entries/s {:>7.1f} MB/s".format(
+                  utils.codec_path(accelerated),
+                  args.entries / enc_time, len(data) / enc_time / 1e6,
+                  args.entries / dec_time, len(data) / dec_time / 1e6))
+
+
+def main():
+    print("Active codec: {}".format(utils.codec_path()))
+    bench("bm_mt_add_entry", add_entry_args(args.entries),
+          Standard.bm_mt_add_entry_args)
+    bench("bm_mt_get_entries", get_entries_result(args.entries),
+          Standard.bm_mt_get_entries_result)
+
+
+if __name__ == '__main__':
+    main()
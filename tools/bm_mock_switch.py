@@ -0,0 +1,1530 @@
+#!/usr/bin/env python3
+
+#
+# Mock bmv2 switch: the Thrift services of simple_switch (standard,
+# simple_pre and simple_pre_lag) served by the generated Processors over
+# in-memory state, so that control plane tools can be tested and benchmarked
+# without a running switch.
+#
+#   ./tools/bm_mock_switch.py --json json/l3switch.json --thrift-port 9090
+#
+# or, from Python:
+#
+#   server = bm_mock_switch.MockSwitchServer(
+#       bm_mock_switch.MockSwitch.from_file("json/l3switch.json"), port=0)
+#   server.start()
+#   client = bmpy_utils.thrift_connect_standard("localhost", server.port)
+#
+# Tables, actions, action profiles, counters, registers, meters, parse value
+# sets, learn lists and calculations are read from the bmv2 JSON config, like
+# simple_switch does. Exact tables are dicts, LPM tables prefix tries and
+# ternary and range tables priority ordered lists. No packet goes through the
+# pipeline, but MockSwitch.match() looks a key up in a table the way the data
+# plane would, updating the direct counters and the time since last hit.
+#
+# Connections are served by one thread each like bmv2 (--server threaded), one
+# at a time (simple) or by a pool of processes (process). --latency and
+# --jitter delay every call, to see how tools behave against a slow switch.
+#
+
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import random
+import socket
+import threading
+import time
+import weakref
+
+from thrift.protocol import TBinaryProtocol
+from thrift.server import TProcessPoolServer
+from thrift.server import TServer
+from thrift.TMultiplexedProcessor import TMultiplexedProcessor
+from thrift.transport import TSocket
+from thrift.transport import TTransport
+
+from bm_runtime.standard import Standard
+from bm_runtime.standard.ttypes import *
+from bm_runtime.simple_pre import SimplePre
+from bm_runtime.simple_pre_lag import SimplePreLAG
+from bm_runtime.simple_pre_lag.ttypes import InvalidMcOperation, \
+    McOperationErrorCode
+
+
+logger = logging.getLogger("bm_mock_switch")
+
+MATCH_TYPES = {
+    "exact": BmMatchParamType.EXACT,
+    "lpm": BmMatchParamType.LPM,
+    "ternary": BmMatchParamType.TERNARY,
+    "valid": BmMatchParamType.VALID,
+    "range": BmMatchParamType.RANGE,
+    # bmv2 implements optional match as ternary
+    "optional": BmMatchParamType.TERNARY,
+}
+
+DEFAULT_MAX_SIZE = 1024
+
+
+def table_error(code):
+    return InvalidTableOperation(code)
+
+
+def to_int(data):
+    return int.from_bytes(data, "big")
+
+
+def nbytes(bitwidth):
+    return (bitwidth + 7) // 8
+
+
+class PrefixTrie(object):
+    """Longest prefix match over byte strings, one level per byte. A prefix
+    whose length isn't a multiple of 8 is kept in the node of its last full
+    byte, keyed by (number of extra bits, value of those bits)."""
+
+    def __init__(self):
+        # node: [children by byte value, {(bits, value): item}]
+        self.root = [{}, {}]
+        self.size = 0
+
+    @staticmethod
+    def split(key, prefix_length):
+        full, bits = divmod(prefix_length, 8)
+        partial = (bits, key[full] >> (8 - bits)) if bits else (0, 0)
+        return key[:full], partial
+
+    def find_node(self, path, create=False):
+        node = self.root
+        for byte in path:
+            child = node[0].get(byte)
+            if child is None:
+                if not create:
+                    return None
+                child = node[0][byte] = [{}, {}]
+            node = child
+        return node
+
+    def insert(self, key, prefix_length, item):
+        path, partial = self.split(key, prefix_length)
+        prefixes = self.find_node(path, create=True)[1]
+        if partial not in prefixes:
+            self.size += 1
+        prefixes[partial] = item
+
+    def get(self, key, prefix_length):
+        path, partial = self.split(key, prefix_length)
+        node = self.find_node(path)
+        return None if node is None else node[1].get(partial)
+
+    def remove(self, key, prefix_length):
+        path, partial = self.split(key, prefix_length)
+        nodes = [self.root]
+        for byte in path:
+            nodes.append(nodes[-1][0].get(byte))
+            if nodes[-1] is None:
+                return None
+        item = nodes[-1][1].pop(partial, None)
+        if item is not None:
+            self.size -= 1
+        # prunes the nodes left empty
+        for depth in range(len(path), 0, -1):
+            node = nodes[depth]
+            if node[0] or node[1]:
+                break
+            del nodes[depth - 1][0][path[depth - 1]]
+        return item
+
+    def lookup(self, key):
+        """Item of the longest prefix of key."""
+        best = None
+        node = self.root
+        for i in range(len(key) + 1):
+            prefixes = node[1]
+            if prefixes:
+                if i < len(key):
+                    byte = key[i]
+                    for bits in range(7, 0, -1):
+                        item = prefixes.get((bits, byte >> (8 - bits)))
+                        if item is not None:
+                            best = item
+                            break
+                    else:
+                        best = prefixes.get((0, 0), best)
+                else:
+                    best = prefixes.get((0, 0), best)
+            if i == len(key):
+                break
+            node = node[0].get(key[i])
+            if node is None:
+                break
+        return best
+
+
+class Entry(object):
+    __slots__ = ("handle", "match_key", "key", "priority", "action_name",
+                 "action_data", "mbr_handle", "grp_handle", "timeout_ms",
+                 "last_hit", "bytes", "packets", "meter_rates", "matchers")
+
+    def __init__(self, handle, match_key, key, priority):
+        self.handle = handle
+        self.match_key = match_key
+        self.key = key
+        self.priority = priority
+        self.action_name = None
+        self.action_data = None
+        self.mbr_handle = None
+        self.grp_handle = None
+        self.timeout_ms = None
+        self.last_hit = time.monotonic()
+        self.bytes = 0
+        self.packets = 0
+        self.meter_rates = None
+        self.matchers = None
+
+    def action_entry(self):
+        if self.mbr_handle is not None:
+            return BmActionEntry(action_type=BmActionEntryType.MBR_HANDLE,
+                                 mbr_handle=self.mbr_handle)
+        if self.grp_handle is not None:
+            return BmActionEntry(action_type=BmActionEntryType.GRP_HANDLE,
+                                 grp_handle=self.grp_handle)
+        return BmActionEntry(action_type=BmActionEntryType.ACTION_DATA,
+                             action_name=self.action_name,
+                             action_data=list(self.action_data))
+
+    def to_thrift(self, with_priority):
+        life = None
+        if self.timeout_ms is not None:
+            life = BmMtEntryLife(
+                timeout_ms=self.timeout_ms,
+                time_since_hit_ms=int(
+                    (time.monotonic() - self.last_hit) * 1000))
+        return BmMtEntry(
+            match_key=self.match_key,
+            options=BmAddEntryOptions(
+                priority=self.priority if with_priority else None),
+            entry_handle=self.handle, action_entry=self.action_entry(),
+            life=life)
+
+
+class Table(object):
+    def __init__(self, spec, switch):
+        self.name = spec["name"]
+        self.id = spec.get("id", 0)
+        self.match_type = spec.get("match_type", "exact")
+        self.type = spec.get("type", "simple")
+        self.max_size = spec.get("max_size", DEFAULT_MAX_SIZE)
+        self.with_counters = spec.get("with_counters", False)
+        self.support_timeout = spec.get("support_timeout", False)
+        self.direct_meters = spec.get("direct_meters")
+        self.action_profile = spec.get("action_profile")
+        self.actions = set(spec.get("actions", []))
+        # (match type, width in bytes or None if unknown) of each key field
+        self.key = []
+        for field in spec.get("key", []):
+            match_type = MATCH_TYPES[field["match_type"]]
+            if match_type == BmMatchParamType.VALID:
+                width = 1
+            else:
+                width = switch.field_width(field.get("target"))
+            self.key.append((match_type, width))
+        self.default_spec = spec.get("default_entry")
+        self.switch = switch
+        self.reset()
+
+    def reset(self):
+        self.entries = {}
+        # key -> handle, key being the normalized match key (and priority)
+        self.index = {}
+        self.trie = PrefixTrie() if self.match_type == "lpm" else None
+        # ternary and range entries by (priority, handle)
+        self.ordered = []
+        self.next_handle = 0
+        self.reset_default()
+
+    def reset_default(self):
+        self.default = None
+        spec = self.default_spec
+        if spec is not None and spec.get("action_id") is not None:
+            action = self.switch.actions_by_id.get(spec["action_id"])
+            if action is not None:
+                data = [int(v, 16).to_bytes(nbytes(p["bitwidth"]), "big")
+                        for v, p in zip(spec.get("action_data", []),
+                                        action["runtime_data"])]
+                self.default = (action["name"], data)
+
+    @property
+    def has_priority(self):
+        return self.match_type in ("ternary", "range")
+
+    def normalize(self, match_key):
+        """Hashable form of match_key, checked against the key of the table.
+        """
+        if len(match_key) != len(self.key):
+            raise table_error(TableOperationErrorCode.BAD_MATCH_KEY)
+        key = []
+        for param, (match_type, width) in zip(match_key, self.key):
+            if param.type != match_type:
+                raise table_error(TableOperationErrorCode.BAD_MATCH_KEY)
+            if match_type == BmMatchParamType.VALID:
+                key.append(bool(param.valid.key))
+                continue
+            if match_type == BmMatchParamType.EXACT:
+                values = (param.exact.key,)
+            elif match_type == BmMatchParamType.LPM:
+                values = (param.lpm.key,)
+            elif match_type == BmMatchParamType.TERNARY:
+                values = (param.ternary.key, param.ternary.mask)
+            else:
+                values = (param.range.start, param.range.end_)
+            if any(v is None or (width is not None and len(v) != width)
+                   for v in values):
+                raise table_error(TableOperationErrorCode.BAD_MATCH_KEY)
+            if match_type == BmMatchParamType.EXACT:
+                key.append(values[0])
+            elif match_type == BmMatchParamType.LPM:
+                plen = param.lpm.prefix_length
+                bits = len(values[0]) * 8
+                if plen is None or not 0 <= plen <= bits:
+                    raise table_error(TableOperationErrorCode.BAD_MATCH_KEY)
+                mask = ((1 << bits) - 1) ^ ((1 << (bits - plen)) - 1)
+                masked = (to_int(values[0]) & mask).to_bytes(len(values[0]),
+                                                             "big")
+                key.append((masked, plen))
+            elif match_type == BmMatchParamType.TERNARY:
+                masked = (to_int(values[0]) & to_int(values[1])).to_bytes(
+                    len(values[0]), "big")
+                key.append((masked, values[1]))
+            else:
+                if values[0] > values[1]:
+                    raise table_error(TableOperationErrorCode.BAD_MATCH_KEY)
+                key.append(values)
+        return tuple(key)
+
+    def trie_key(self, key):
+        """(bytes, prefix length) of a normalized LPM key: the other fields
+        first, then the LPM one, like bmv2 orders them."""
+        data, plen, lpm = b"", 0, None
+        for field in key:
+            if isinstance(field, tuple):
+                lpm = field
+            elif isinstance(field, bool):
+                data += b"\x01" if field else b"\x00"
+                plen += 8
+            else:
+                data += field
+                plen += len(field) * 8
+        return data + lpm[0], plen + lpm[1]
+
+    @staticmethod
+    def matchers(key, match_key):
+        """(kind, ...) of each field, for match() to scan ternary and range
+        tables."""
+        matchers = []
+        for field, param in zip(key, match_key):
+            if param.type == BmMatchParamType.EXACT:
+                matchers.append(("exact", field))
+            elif param.type == BmMatchParamType.VALID:
+                matchers.append(("exact", field))
+            elif param.type == BmMatchParamType.LPM:
+                bits = len(field[0]) * 8
+                mask = ((1 << bits) - 1) ^ ((1 << (bits - field[1])) - 1)
+                matchers.append(("mask", to_int(field[0]), mask))
+            elif param.type == BmMatchParamType.TERNARY:
+                matchers.append(("mask", to_int(field[0]), to_int(field[1])))
+            else:
+                matchers.append(("range", field[0], field[1]))
+        return tuple(matchers)
+
+    def check_action(self, action_name, action_data):
+        actions = self.actions
+        if self.action_profile is not None:
+            actions = self.switch.action_profiles[self.action_profile].actions
+        action = self.switch.actions.get(action_name)
+        if action is None or (actions and action_name not in actions):
+            raise table_error(TableOperationErrorCode.INVALID_ACTION_NAME)
+        if len(action_data) != len(action["runtime_data"]):
+            raise table_error(TableOperationErrorCode.BAD_ACTION_DATA)
+
+    def check_type(self, *types):
+        if self.type not in types:
+            raise table_error(TableOperationErrorCode.WRONG_TABLE_TYPE)
+
+    def add(self, match_key, options):
+        if len(self.entries) >= self.max_size:
+            raise table_error(TableOperationErrorCode.TABLE_FULL)
+        key = self.normalize(match_key)
+        priority = None
+        if self.has_priority:
+            priority = options.priority if options is not None and \
+                options.priority is not None else 0
+            index_key = key + (priority,)
+        else:
+            index_key = key
+        if index_key in self.index:
+            raise table_error(TableOperationErrorCode.DUPLICATE_ENTRY)
+        entry = Entry(self.next_handle, list(match_key), index_key, priority)
+        self.next_handle += 1
+        self.entries[entry.handle] = entry
+        self.index[index_key] = entry.handle
+        if self.trie is not None:
+            self.trie.insert(*self.trie_key(key), item=entry)
+        elif self.has_priority:
+            entry.matchers = self.matchers(key, match_key)
+            bisect.insort(self.ordered, (priority, entry.handle))
+        return entry
+
+    def get(self, handle):
+        entry = self.entries.get(handle)
+        if entry is None:
+            raise table_error(TableOperationErrorCode.INVALID_HANDLE)
+        return entry
+
+    def delete(self, handle):
+        entry = self.get(handle)
+        del self.entries[handle]
+        del self.index[entry.key]
+        if self.trie is not None:
+            self.trie.remove(*self.trie_key(entry.key))
+        elif self.has_priority:
+            del self.ordered[bisect.bisect_left(
+                self.ordered, (entry.priority, handle))]
+        return entry
+
+    def find(self, match_key, options):
+        key = self.normalize(match_key)
+        if self.has_priority:
+            priority = options.priority if options is not None and \
+                options.priority is not None else 0
+            key += (priority,)
+        handle = self.index.get(key)
+        if handle is None:
+            raise table_error(TableOperationErrorCode.BAD_MATCH_KEY)
+        return self.entries[handle]
+
+    def match(self, values):
+        """Entry matched by values, the bytes of each key field (a bool for
+        valid fields), or None on a miss."""
+        if self.match_type == "exact":
+            handle = self.index.get(tuple(values))
+            return None if handle is None else self.entries[handle]
+        if self.trie is not None:
+            data = b""
+            lpm_value = None
+            for value, (match_type, _) in zip(values, self.key):
+                if match_type == BmMatchParamType.LPM:
+                    lpm_value = value
+                elif isinstance(value, bool):
+                    data += b"\x01" if value else b"\x00"
+                else:
+                    data += value
+            return self.trie.lookup(data + lpm_value)
+        # lowest priority value first, like bmv2
+        for priority, handle in self.ordered:
+            entry = self.entries[handle]
+            for value, matcher in zip(values, entry.matchers):
+                kind = matcher[0]
+                if kind == "exact":
+                    if value != matcher[1]:
+                        break
+                elif kind == "mask":
+                    if to_int(value) & matcher[2] != matcher[1]:
+                        break
+                elif not matcher[1] <= value <= matcher[2]:
+                    break
+            else:
+                return entry
+        return None
+
+
+class ActionProfile(object):
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.id = spec.get("id", 0)
+        self.max_size = spec.get("max_size", DEFAULT_MAX_SIZE)
+        self.with_selection = spec.get("selector") is not None
+        # filled with the actions of the tables using the profile
+        self.actions = set()
+        self.reset()
+
+    def reset(self):
+        # mbr_handle -> [action_name, action_data]
+        self.members = {}
+        # grp_handle -> [mbr_handle, ...]
+        self.groups = {}
+        # number of entries and groups pointing to each member and group
+        self.mbr_refs = {}
+        self.grp_refs = {}
+        self.next_mbr = 0
+        self.next_grp = 0
+
+    def check_member(self, mbr_handle):
+        if mbr_handle not in self.members:
+            raise table_error(TableOperationErrorCode.INVALID_MBR_HANDLE)
+
+    def check_group(self, grp_handle):
+        if not self.with_selection:
+            raise table_error(
+                TableOperationErrorCode.NO_ACTION_PROFILE_SELECTION)
+        if grp_handle not in self.groups:
+            raise table_error(TableOperationErrorCode.INVALID_GRP_HANDLE)
+
+
+class MockSwitch(Standard.Iface):
+    """State of a mock switch and handler of its standard service. Not
+    thread-safe; the servers of this module serialize the calls."""
+
+    def __init__(self, config_str="{}", device_id=0, thrift_port=9090,
+                 notifications_socket=None):
+        self.device_id = device_id
+        self.thrift_port = thrift_port
+        self.notifications_socket = notifications_socket or \
+            "ipc:///tmp/bmv2-{}-notifications.ipc".format(device_id)
+        self.ports = {}
+        self.pending_config = None
+        self.pre = MockPre()
+        self.load_config(config_str)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            return cls(f.read(), **kwargs)
+
+    def load_config(self, config_str):
+        config = json.loads(config_str)
+        self.config_str = config_str
+        self.config_md5 = hashlib.md5(config_str.encode()).digest()
+        self.fields = {}
+        header_types = {t["name"]: t for t in config.get("header_types", [])}
+        for header in config.get("headers", []):
+            header_type = header_types.get(header.get("header_type"), {})
+            for field in header_type.get("fields", []):
+                self.fields[(header["name"], field[0])] = field[1]
+        self.actions = {a["name"]: a for a in config.get("actions", [])}
+        self.actions_by_id = {a["id"]: a for a in config.get("actions", [])}
+        self.tables = {}
+        self.action_profiles = {}
+        for pipeline in config.get("pipelines", []):
+            for spec in pipeline.get("action_profiles", []):
+                self.action_profiles[spec["name"]] = ActionProfile(spec)
+            for spec in pipeline.get("tables", []):
+                self.tables[spec["name"]] = Table(spec, self)
+        for table in self.tables.values():
+            profile = self.action_profiles.get(table.action_profile)
+            if profile is not None:
+                profile.actions |= table.actions
+        self.counter_arrays = {c["name"]: c
+                               for c in config.get("counter_arrays", [])
+                               if not c.get("is_direct")}
+        self.register_arrays = {r["name"]: r
+                                for r in config.get("register_arrays", [])}
+        self.meter_arrays = {m["name"]: m
+                             for m in config.get("meter_arrays", [])
+                             if not m.get("is_direct")}
+        self.parse_vsets_spec = {p["name"]: p
+                                 for p in config.get("parse_vsets", [])}
+        self.learn_lists = {l["id"]: l for l in config.get("learn_lists", [])}
+        self.calculations = {c["name"]: c
+                             for c in config.get("calculations", [])}
+        self.resources = {
+            BmResourceType.MATCH_TABLE: self.tables,
+            BmResourceType.ACTION_PROFILE: self.action_profiles,
+            BmResourceType.COUNTER: {c["name"]: c for c in
+                                     config.get("counter_arrays", [])},
+            BmResourceType.METER: {m["name"]: m for m in
+                                   config.get("meter_arrays", [])},
+            BmResourceType.REGISTER: self.register_arrays,
+            BmResourceType.LEARNING_LIST: {l["name"]: l for l in
+                                           config.get("learn_lists", [])},
+        }
+        self.reset_state()
+
+    def field_width(self, target):
+        """Width in bytes of a key field, None if it can't be resolved."""
+        if isinstance(target, list) and len(target) == 2:
+            bitwidth = self.fields.get(tuple(target))
+            if bitwidth is not None:
+                return nbytes(bitwidth)
+        return None
+
+    def reset_state(self):
+        for table in self.tables.values():
+            table.reset()
+        for profile in self.action_profiles.values():
+            profile.reset()
+        self.counters = {name: [[0, 0] for _ in range(c.get("size", 0))]
+                         for name, c in self.counter_arrays.items()}
+        self.registers = {name: [0] * r.get("size", 0)
+                          for name, r in self.register_arrays.items()}
+        self.meters = {name: [None] * m.get("size", 0)
+                       for name, m in self.meter_arrays.items()}
+        self.parse_vsets = {name: set() for name in self.parse_vsets_spec}
+        self.pre.reset()
+
+    # Lookups, for tests
+
+    def match(self, table_name, values, packet_bytes=0):
+        """Looks values up in a table like a packet would, and returns
+        (entry handle or None on a miss, BmActionEntry)."""
+        table = self.table(table_name)
+        entry = table.match(values)
+        if entry is None:
+            if table.default is None:
+                return None, BmActionEntry(action_type=BmActionEntryType.NONE)
+            name, data = table.default
+            return None, BmActionEntry(
+                action_type=BmActionEntryType.ACTION_DATA, action_name=name,
+                action_data=list(data))
+        entry.last_hit = time.monotonic()
+        entry.packets += 1
+        entry.bytes += packet_bytes
+        return entry.handle, entry.action_entry()
+
+    def expired(self, table_name):
+        """Handles of the entries idle for longer than their TTL."""
+        now = time.monotonic()
+        return [e.handle for e in self.table(table_name).entries.values()
+                if e.timeout_ms is not None and
+                (now - e.last_hit) * 1000 >= e.timeout_ms]
+
+    # Match tables
+
+    def table(self, table_name):
+        table = self.tables.get(table_name)
+        if table is None:
+            raise table_error(TableOperationErrorCode.INVALID_TABLE_NAME)
+        return table
+
+    def profile(self, act_prof_name):
+        profile = self.action_profiles.get(act_prof_name)
+        if profile is None:
+            raise table_error(
+                TableOperationErrorCode.INVALID_ACTION_PROFILE_NAME)
+        return profile
+
+    def table_profile(self, table_name, *types):
+        table = self.table(table_name)
+        table.check_type(*types)
+        return table, self.action_profiles[table.action_profile]
+
+    def bm_mt_get_num_entries(self, cxt_id, table_name):
+        return len(self.table(table_name).entries)
+
+    def bm_mt_clear_entries(self, cxt_id, table_name, reset_default_entry):
+        table = self.table(table_name)
+        for handle in list(table.entries):
+            self.delete_entry(table, handle)
+        if reset_default_entry:
+            table.reset_default()
+
+    def bm_mt_add_entry(self, cxt_id, table_name, match_key, action_name,
+                        action_data, options):
+        table = self.table(table_name)
+        table.check_type("simple")
+        table.check_action(action_name, action_data)
+        entry = table.add(match_key, options)
+        entry.action_name = action_name
+        entry.action_data = list(action_data)
+        return entry.handle
+
+    def bm_mt_set_default_action(self, cxt_id, table_name, action_name,
+                                 action_data):
+        table = self.table(table_name)
+        table.check_type("simple")
+        table.check_action(action_name, action_data)
+        spec = table.default_spec or {}
+        if spec.get("action_entry_const"):
+            raise table_error(TableOperationErrorCode.DEFAULT_ENTRY_IS_CONST)
+        if spec.get("action_const") and table.default is not None and \
+                table.default[0] != action_name:
+            raise table_error(TableOperationErrorCode.DEFAULT_ACTION_IS_CONST)
+        table.default = (action_name, list(action_data))
+
+    def bm_mt_reset_default_entry(self, cxt_id, table_name):
+        table = self.table(table_name)
+        if (table.default_spec or {}).get("action_entry_const"):
+            raise table_error(TableOperationErrorCode.DEFAULT_ENTRY_IS_CONST)
+        table.reset_default()
+
+    def delete_entry(self, table, handle):
+        entry = table.delete(handle)
+        if table.action_profile is not None:
+            profile = self.action_profiles[table.action_profile]
+            if entry.mbr_handle is not None:
+                profile.mbr_refs[entry.mbr_handle] -= 1
+            if entry.grp_handle is not None:
+                profile.grp_refs[entry.grp_handle] -= 1
+
+    def bm_mt_delete_entry(self, cxt_id, table_name, entry_handle):
+        table = self.table(table_name)
+        table.check_type("simple")
+        self.delete_entry(table, entry_handle)
+
+    def bm_mt_modify_entry(self, cxt_id, table_name, entry_handle,
+                           action_name, action_data):
+        table = self.table(table_name)
+        table.check_type("simple")
+        entry = table.get(entry_handle)
+        table.check_action(action_name, action_data)
+        entry.action_name = action_name
+        entry.action_data = list(action_data)
+
+    def bm_mt_set_entry_ttl(self, cxt_id, table_name, entry_handle,
+                            timeout_ms):
+        table = self.table(table_name)
+        if not table.support_timeout:
+            raise table_error(TableOperationErrorCode.AGEING_DISABLED)
+        table.get(entry_handle).timeout_ms = timeout_ms
+
+    # Action profiles
+
+    def bm_mt_act_prof_add_member(self, cxt_id, act_prof_name, action_name,
+                                  action_data):
+        profile = self.profile(act_prof_name)
+        action = self.actions.get(action_name)
+        if action is None or action_name not in profile.actions:
+            raise table_error(TableOperationErrorCode.INVALID_ACTION_NAME)
+        if len(action_data) != len(action["runtime_data"]):
+            raise table_error(TableOperationErrorCode.BAD_ACTION_DATA)
+        if len(profile.members) >= profile.max_size:
+            raise table_error(TableOperationErrorCode.TABLE_FULL)
+        handle = profile.next_mbr
+        profile.next_mbr += 1
+        profile.members[handle] = [action_name, list(action_data)]
+        profile.mbr_refs[handle] = 0
+        return handle
+
+    def bm_mt_act_prof_delete_member(self, cxt_id, act_prof_name,
+                                     mbr_handle):
+        profile = self.profile(act_prof_name)
+        profile.check_member(mbr_handle)
+        if profile.mbr_refs[mbr_handle]:
+            raise table_error(TableOperationErrorCode.MBR_STILL_USED)
+        del profile.members[mbr_handle]
+        del profile.mbr_refs[mbr_handle]
+
+    def bm_mt_act_prof_modify_member(self, cxt_id, act_prof_name, mbr_handle,
+                                     action_name, action_data):
+        profile = self.profile(act_prof_name)
+        profile.check_member(mbr_handle)
+        action = self.actions.get(action_name)
+        if action is None or action_name not in profile.actions:
+            raise table_error(TableOperationErrorCode.INVALID_ACTION_NAME)
+        if len(action_data) != len(action["runtime_data"]):
+            raise table_error(TableOperationErrorCode.BAD_ACTION_DATA)
+        profile.members[mbr_handle] = [action_name, list(action_data)]
+
+    def bm_mt_act_prof_create_group(self, cxt_id, act_prof_name):
+        profile = self.profile(act_prof_name)
+        if not profile.with_selection:
+            raise table_error(
+                TableOperationErrorCode.NO_ACTION_PROFILE_SELECTION)
+        handle = profile.next_grp
+        profile.next_grp += 1
+        profile.groups[handle] = []
+        profile.grp_refs[handle] = 0
+        return handle
+
+    def bm_mt_act_prof_delete_group(self, cxt_id, act_prof_name, grp_handle):
+        profile = self.profile(act_prof_name)
+        profile.check_group(grp_handle)
+        if profile.grp_refs[grp_handle]:
+            raise table_error(TableOperationErrorCode.GRP_STILL_USED)
+        for mbr_handle in profile.groups.pop(grp_handle):
+            profile.mbr_refs[mbr_handle] -= 1
+        del profile.grp_refs[grp_handle]
+
+    def bm_mt_act_prof_add_member_to_group(self, cxt_id, act_prof_name,
+                                           mbr_handle, grp_handle):
+        profile = self.profile(act_prof_name)
+        profile.check_member(mbr_handle)
+        profile.check_group(grp_handle)
+        if mbr_handle in profile.groups[grp_handle]:
+            raise table_error(TableOperationErrorCode.MBR_ALREADY_IN_GRP)
+        profile.groups[grp_handle].append(mbr_handle)
+        profile.mbr_refs[mbr_handle] += 1
+
+    def bm_mt_act_prof_remove_member_from_group(self, cxt_id, act_prof_name,
+                                                mbr_handle, grp_handle):
+        profile = self.profile(act_prof_name)
+        profile.check_member(mbr_handle)
+        profile.check_group(grp_handle)
+        if mbr_handle not in profile.groups[grp_handle]:
+            raise table_error(TableOperationErrorCode.MBR_NOT_IN_GRP)
+        profile.groups[grp_handle].remove(mbr_handle)
+        profile.mbr_refs[mbr_handle] -= 1
+
+    def bm_mt_act_prof_get_members(self, cxt_id, act_prof_name):
+        profile = self.profile(act_prof_name)
+        return [self.bm_mt_act_prof_get_member(cxt_id, act_prof_name, h)
+                for h in sorted(profile.members)]
+
+    def bm_mt_act_prof_get_member(self, cxt_id, act_prof_name, mbr_handle):
+        profile = self.profile(act_prof_name)
+        profile.check_member(mbr_handle)
+        action_name, action_data = profile.members[mbr_handle]
+        return BmMtActProfMember(mbr_handle=mbr_handle,
+                                 action_name=action_name,
+                                 action_data=list(action_data))
+
+    def bm_mt_act_prof_get_groups(self, cxt_id, act_prof_name):
+        profile = self.profile(act_prof_name)
+        return [BmMtActProfGroup(grp_handle=h, mbr_handles=list(m))
+                for h, m in sorted(profile.groups.items())]
+
+    def bm_mt_act_prof_get_group(self, cxt_id, act_prof_name, grp_handle):
+        profile = self.profile(act_prof_name)
+        profile.check_group(grp_handle)
+        return BmMtActProfGroup(grp_handle=grp_handle,
+                                mbr_handles=list(profile.groups[grp_handle]))
+
+    # Indirect match tables
+
+    def bm_mt_indirect_add_entry(self, cxt_id, table_name, match_key,
+                                 mbr_handle, options):
+        table, profile = self.table_profile(table_name, "indirect",
+                                            "indirect_ws")
+        profile.check_member(mbr_handle)
+        entry = table.add(match_key, options)
+        entry.mbr_handle = mbr_handle
+        profile.mbr_refs[mbr_handle] += 1
+        return entry.handle
+
+    def bm_mt_indirect_modify_entry(self, cxt_id, table_name, entry_handle,
+                                    mbr_handle):
+        table, profile = self.table_profile(table_name, "indirect",
+                                            "indirect_ws")
+        entry = table.get(entry_handle)
+        profile.check_member(mbr_handle)
+        self.unref(profile, entry)
+        entry.mbr_handle = mbr_handle
+        profile.mbr_refs[mbr_handle] += 1
+
+    def unref(self, profile, entry):
+        if entry.mbr_handle is not None:
+            profile.mbr_refs[entry.mbr_handle] -= 1
+        if entry.grp_handle is not None:
+            profile.grp_refs[entry.grp_handle] -= 1
+        entry.mbr_handle = entry.grp_handle = None
+
+    def bm_mt_indirect_delete_entry(self, cxt_id, table_name, entry_handle):
+        table = self.table(table_name)
+        table.check_type("indirect", "indirect_ws")
+        self.delete_entry(table, entry_handle)
+
+    def bm_mt_indirect_set_entry_ttl(self, cxt_id, table_name, entry_handle,
+                                     timeout_ms):
+        self.table(table_name).check_type("indirect", "indirect_ws")
+        self.bm_mt_set_entry_ttl(cxt_id, table_name, entry_handle, timeout_ms)
+
+    def bm_mt_indirect_set_default_member(self, cxt_id, table_name,
+                                          mbr_handle):
+        table, profile = self.table_profile(table_name, "indirect",
+                                            "indirect_ws")
+        profile.check_member(mbr_handle)
+        table.default = tuple(profile.members[mbr_handle])
+
+    def bm_mt_indirect_reset_default_entry(self, cxt_id, table_name):
+        self.table(table_name).check_type("indirect", "indirect_ws")
+        self.bm_mt_reset_default_entry(cxt_id, table_name)
+
+    def bm_mt_indirect_ws_add_entry(self, cxt_id, table_name, match_key,
+                                    grp_handle, options):
+        table, profile = self.table_profile(table_name, "indirect_ws")
+        profile.check_group(grp_handle)
+        if not profile.groups[grp_handle]:
+            raise table_error(TableOperationErrorCode.EMPTY_GRP)
+        entry = table.add(match_key, options)
+        entry.grp_handle = grp_handle
+        profile.grp_refs[grp_handle] += 1
+        return entry.handle
+
+    def bm_mt_indirect_ws_modify_entry(self, cxt_id, table_name, entry_handle,
+                                       grp_handle):
+        table, profile = self.table_profile(table_name, "indirect_ws")
+        entry = table.get(entry_handle)
+        profile.check_group(grp_handle)
+        if not profile.groups[grp_handle]:
+            raise table_error(TableOperationErrorCode.EMPTY_GRP)
+        self.unref(profile, entry)
+        entry.grp_handle = grp_handle
+        profile.grp_refs[grp_handle] += 1
+
+    def bm_mt_indirect_ws_set_default_group(self, cxt_id, table_name,
+                                            grp_handle):
+        table, profile = self.table_profile(table_name, "indirect_ws")
+        profile.check_group(grp_handle)
+        members = profile.groups[grp_handle]
+        if not members:
+            raise table_error(TableOperationErrorCode.EMPTY_GRP)
+        table.default = tuple(profile.members[members[0]])
+
+    # Direct counters and meters
+
+    def counted_entry(self, table_name, entry_handle):
+        table = self.table(table_name)
+        if not table.with_counters:
+            raise table_error(TableOperationErrorCode.COUNTERS_DISABLED)
+        return table.get(entry_handle)
+
+    def bm_mt_read_counter(self, cxt_id, table_name, entry_handle):
+        entry = self.counted_entry(table_name, entry_handle)
+        return BmCounterValue(bytes=entry.bytes, packets=entry.packets)
+
+    def bm_mt_reset_counters(self, cxt_id, table_name):
+        table = self.table(table_name)
+        if not table.with_counters:
+            raise table_error(TableOperationErrorCode.COUNTERS_DISABLED)
+        for entry in table.entries.values():
+            entry.bytes = entry.packets = 0
+
+    def bm_mt_write_counter(self, cxt_id, table_name, entry_handle, value):
+        entry = self.counted_entry(table_name, entry_handle)
+        entry.bytes, entry.packets = value.bytes, value.packets
+
+    def metered_entry(self, table_name, entry_handle):
+        table = self.table(table_name)
+        if table.direct_meters is None:
+            raise table_error(TableOperationErrorCode.METERS_DISABLED)
+        return table.get(entry_handle)
+
+    def bm_mt_set_meter_rates(self, cxt_id, table_name, entry_handle, rates):
+        entry = self.metered_entry(table_name, entry_handle)
+        if not rates:
+            raise table_error(TableOperationErrorCode.INVALID_METER_OPERATION)
+        entry.meter_rates = list(rates)
+
+    def bm_mt_get_meter_rates(self, cxt_id, table_name, entry_handle):
+        entry = self.metered_entry(table_name, entry_handle)
+        return list(entry.meter_rates or [])
+
+    # Reading entries
+
+    def bm_mt_get_entries(self, cxt_id, table_name):
+        table = self.table(table_name)
+        return [entry.to_thrift(table.has_priority)
+                for entry in table.entries.values()]
+
+    def bm_mt_get_entry(self, cxt_id, table_name, entry_handle):
+        table = self.table(table_name)
+        return table.get(entry_handle).to_thrift(table.has_priority)
+
+    def bm_mt_get_default_entry(self, cxt_id, table_name):
+        table = self.table(table_name)
+        if table.default is None:
+            raise table_error(TableOperationErrorCode.NO_DEFAULT_ENTRY)
+        name, data = table.default
+        return BmActionEntry(action_type=BmActionEntryType.ACTION_DATA,
+                             action_name=name, action_data=list(data))
+
+    def bm_mt_get_entry_from_key(self, cxt_id, table_name, match_key,
+                                 options):
+        table = self.table(table_name)
+        return table.find(match_key, options).to_thrift(table.has_priority)
+
+    # Counter arrays
+
+    def counter(self, counter_name, index=None):
+        counter = self.counters.get(counter_name)
+        if counter is None:
+            raise InvalidCounterOperation(
+                CounterOperationErrorCode.INVALID_COUNTER_NAME)
+        if index is not None and not 0 <= index < len(counter):
+            raise InvalidCounterOperation(
+                CounterOperationErrorCode.INVALID_INDEX)
+        return counter
+
+    def bm_counter_read(self, cxt_id, counter_name, index):
+        value = self.counter(counter_name, index)[index]
+        return BmCounterValue(bytes=value[0], packets=value[1])
+
+    def bm_counter_reset_all(self, cxt_id, counter_name):
+        for value in self.counter(counter_name):
+            value[0] = value[1] = 0
+
+    def bm_counter_write(self, cxt_id, counter_name, index, value):
+        self.counter(counter_name, index)[index] = [value.bytes,
+                                                     value.packets]
+
+    # Learning
+
+    def learn_list(self, list_id):
+        if list_id not in self.learn_lists:
+            raise InvalidLearnOperation(LearnOperationErrorCode.INVALID_LIST_ID)
+
+    def bm_learning_ack(self, cxt_id, list_id, buffer_id, sample_ids):
+        self.learn_list(list_id)
+
+    def bm_learning_ack_buffer(self, cxt_id, list_id, buffer_id):
+        self.learn_list(list_id)
+
+    def bm_learning_set_timeout(self, cxt_id, list_id, timeout_ms):
+        self.learn_list(list_id)
+
+    def bm_learning_set_buffer_size(self, cxt_id, list_id, nb_samples):
+        self.learn_list(list_id)
+
+    # Config swaps
+
+    def bm_load_new_config(self, config_str):
+        if self.pending_config is not None:
+            raise InvalidSwapOperation(SwapOperationErrorCode.ONGOING_SWAP)
+        json.loads(config_str)
+        self.pending_config = config_str
+
+    def bm_swap_configs(self):
+        if self.pending_config is None:
+            raise InvalidSwapOperation(SwapOperationErrorCode.NO_ONGOING_SWAP)
+        config_str, self.pending_config = self.pending_config, None
+        self.load_config(config_str)
+
+    # Meter arrays
+
+    def meter(self, meter_array_name, index=None):
+        meter = self.meters.get(meter_array_name)
+        if meter is None:
+            raise InvalidMeterOperation(
+                MeterOperationErrorCode.INVALID_METER_NAME)
+        if index is not None and not 0 <= index < len(meter):
+            raise InvalidMeterOperation(MeterOperationErrorCode.INVALID_INDEX)
+        return meter
+
+    def check_rates(self, meter_array_name, rates):
+        rate_count = self.meter_arrays[meter_array_name].get("rate_count", 2)
+        if len(rates) != rate_count:
+            raise InvalidMeterOperation(
+                MeterOperationErrorCode.BAD_RATES_LIST)
+
+    def bm_meter_array_set_rates(self, cxt_id, meter_array_name, rates):
+        meter = self.meter(meter_array_name)
+        self.check_rates(meter_array_name, rates)
+        for index in range(len(meter)):
+            meter[index] = list(rates)
+
+    def bm_meter_set_rates(self, cxt_id, meter_array_name, index, rates):
+        meter = self.meter(meter_array_name, index)
+        self.check_rates(meter_array_name, rates)
+        meter[index] = list(rates)
+
+    def bm_meter_get_rates(self, cxt_id, meter_array_name, index):
+        return list(self.meter(meter_array_name, index)[index] or [])
+
+    # Registers
+
+    def register(self, register_array_name, index=None):
+        register = self.registers.get(register_array_name)
+        if register is None:
+            raise InvalidRegisterOperation(
+                RegisterOperationErrorCode.INVALID_REGISTER_NAME)
+        if index is not None and not 0 <= index < len(register):
+            raise InvalidRegisterOperation(
+                RegisterOperationErrorCode.INVALID_INDEX)
+        return register
+
+    def register_mask(self, register_array_name):
+        bitwidth = self.register_arrays[register_array_name].get("bitwidth",
+                                                                 32)
+        return (1 << bitwidth) - 1
+
+    def bm_register_read(self, cxt_id, register_array_name, idx):
+        return self.register(register_array_name, idx)[idx]
+
+    def bm_register_read_all(self, cxt_id, register_array_name):
+        return list(self.register(register_array_name))
+
+    def bm_register_write(self, cxt_id, register_array_name, index, value):
+        register = self.register(register_array_name, index)
+        register[index] = value & self.register_mask(register_array_name)
+
+    def bm_register_write_range(self, cxt_id, register_array_name,
+                                start_index, end_index, value):
+        register = self.register(register_array_name)
+        if not 0 <= start_index <= end_index <= len(register):
+            raise InvalidRegisterOperation(
+                RegisterOperationErrorCode.INVALID_INDEX)
+        value &= self.register_mask(register_array_name)
+        for index in range(start_index, end_index):
+            register[index] = value
+
+    def bm_register_reset(self, cxt_id, register_array_name):
+        register = self.register(register_array_name)
+        register[:] = [0] * len(register)
+
+    # Parse value sets
+
+    def parse_vset(self, parse_vset_name):
+        vset = self.parse_vsets.get(parse_vset_name)
+        if vset is None:
+            raise InvalidParseVSetOperation(
+                ParseVSetOperationErrorCode.INVALID_PARSE_VSET_NAME)
+        return vset
+
+    def bm_parse_vset_add(self, cxt_id, parse_vset_name, value):
+        self.parse_vset(parse_vset_name).add(value)
+
+    def bm_parse_vset_remove(self, cxt_id, parse_vset_name, value):
+        self.parse_vset(parse_vset_name).discard(value)
+
+    def bm_parse_vset_get(self, cxt_id, parse_vset_name):
+        return sorted(self.parse_vset(parse_vset_name))
+
+    def bm_parse_vset_clear(self, cxt_id, parse_vset_name):
+        self.parse_vset(parse_vset_name).clear()
+
+    # Ports
+
+    def bm_dev_mgr_add_port(self, iface_name, port_num, pcap_path):
+        if port_num in self.ports:
+            raise InvalidDevMgrOperation(DevMgrErrorCode.ERROR)
+        self.ports[port_num] = iface_name
+
+    def bm_dev_mgr_remove_port(self, port_num):
+        if self.ports.pop(port_num, None) is None:
+            raise InvalidDevMgrOperation(DevMgrErrorCode.ERROR)
+
+    def bm_dev_mgr_show_ports(self):
+        return [DevMgrPortInfo(port_num=port_num, iface_name=iface_name,
+                               is_up=True, extra={})
+                for port_num, iface_name in sorted(self.ports.items())]
+
+    # Management
+
+    def bm_mgmt_get_info(self):
+        return BmConfig(device_id=self.device_id,
+                        thrift_port=self.thrift_port,
+                        notifications_socket=self.notifications_socket)
+
+    def calculation(self, calc_name, algo, error_cls, codes):
+        calc = self.calculations.get(calc_name)
+        if calc is None:
+            raise error_cls(codes.INVALID_CALCULATION_NAME)
+        if calc.get("algo") != algo:
+            raise error_cls(codes.WRONG_TYPE_CALCULATION)
+
+    def bm_set_crc16_custom_parameters(self, cxt_id, calc_name, crc16_config):
+        self.calculation(calc_name, "crc16_custom", InvalidCrcOperation,
+                         CrcErrorCode)
+
+    def bm_set_crc32_custom_parameters(self, cxt_id, calc_name, crc32_config):
+        self.calculation(calc_name, "crc32_custom", InvalidCrcOperation,
+                         CrcErrorCode)
+
+    def bm_set_toeplitz_hash_key(self, cxt_id, calc_name, key):
+        self.calculation(calc_name, "toeplitz", InvalidToeplitzHashOperation,
+                         ToeplitzHashErrorCode)
+
+    def bm_reset_state(self):
+        self.reset_state()
+
+    def bm_get_config(self):
+        return self.config_str
+
+    def bm_get_config_md5(self):
+        return self.config_md5
+
+    def bm_get_id_from_name(self, cxt_id, resource_type, resource_name):
+        resources = self.resources.get(resource_type)
+        if resources is None:
+            raise InvalidIdLookup(IdLookupErrorCode.INVALID_RESOURCE_TYPE)
+        resource = resources.get(resource_name)
+        if resource is None:
+            raise InvalidIdLookup(IdLookupErrorCode.INVALID_RESOURCE_NAME)
+        return resource.id if hasattr(resource, "id") else \
+            resource.get("id", 0)
+
+    def bm_serialize_state(self):
+        state = {
+            "tables": {
+                name: [[e.handle, repr(e.key), e.action_name,
+                        [d.hex() for d in e.action_data or []],
+                        e.mbr_handle, e.grp_handle]
+                       for e in table.entries.values()]
+                for name, table in self.tables.items()},
+            "counters": self.counters,
+            "registers": self.registers,
+        }
+        return json.dumps(state, sort_keys=True)
+
+
+def port_map_to_ports(port_map):
+    """Ports set in a bmv2 port map string, the last character being
+    port 0."""
+    return [i for i, c in enumerate(reversed(port_map or "")) if c == "1"]
+
+
+class MockPre(SimplePreLAG.Iface):
+    """Handler of the simple_pre_lag service: multicast groups, nodes and
+    LAGs."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # mgrp_handle -> [mgid, [l1_handle, ...]]
+        self.mgrps = {}
+        # l1_handle -> [rid, ports, lags, mgrp_handle or None]
+        self.nodes = {}
+        # lag_index -> ports
+        self.lags = {}
+        self.next_mgrp = 0
+        self.next_node = 0
+
+    def mgrp(self, mgrp_handle):
+        mgrp = self.mgrps.get(mgrp_handle)
+        if mgrp is None:
+            raise InvalidMcOperation(McOperationErrorCode.INVALID_MGRP_HANDLE)
+        return mgrp
+
+    def node(self, l1_handle):
+        node = self.nodes.get(l1_handle)
+        if node is None:
+            raise InvalidMcOperation(McOperationErrorCode.INVALID_L1_HANDLE)
+        return node
+
+    def bm_mc_mgrp_create(self, cxt_id, mgrp):
+        if not 0 <= mgrp < 1 << 16 or \
+                any(m[0] == mgrp for m in self.mgrps.values()):
+            raise InvalidMcOperation(McOperationErrorCode.INVALID_MGID)
+        handle = self.next_mgrp
+        self.next_mgrp += 1
+        self.mgrps[handle] = [mgrp, []]
+        return handle
+
+    def bm_mc_mgrp_destroy(self, cxt_id, mgrp_handle):
+        for l1_handle in self.mgrp(mgrp_handle)[1]:
+            self.nodes[l1_handle][3] = None
+        del self.mgrps[mgrp_handle]
+
+    def bm_mc_node_create(self, cxt_id, rid, port_map, lag_map=None):
+        handle = self.next_node
+        self.next_node += 1
+        self.nodes[handle] = [rid, port_map_to_ports(port_map),
+                              port_map_to_ports(lag_map), None]
+        return handle
+
+    def bm_mc_node_associate(self, cxt_id, mgrp_handle, l1_handle):
+        mgrp = self.mgrp(mgrp_handle)
+        node = self.node(l1_handle)
+        if node[3] is not None:
+            raise InvalidMcOperation(McOperationErrorCode.INVALID_L1_HANDLE)
+        mgrp[1].append(l1_handle)
+        node[3] = mgrp_handle
+
+    def bm_mc_node_dissociate(self, cxt_id, mgrp_handle, l1_handle):
+        mgrp = self.mgrp(mgrp_handle)
+        node = self.node(l1_handle)
+        if node[3] != mgrp_handle:
+            raise InvalidMcOperation(McOperationErrorCode.INVALID_L1_HANDLE)
+        mgrp[1].remove(l1_handle)
+        node[3] = None
+
+    def bm_mc_node_destroy(self, cxt_id, l1_handle):
+        node = self.node(l1_handle)
+        if node[3] is not None:
+            self.mgrps[node[3]][1].remove(l1_handle)
+        del self.nodes[l1_handle]
+
+    def bm_mc_node_update(self, cxt_id, l1_handle, port_map, lag_map=None):
+        node = self.node(l1_handle)
+        node[1] = port_map_to_ports(port_map)
+        node[2] = port_map_to_ports(lag_map)
+
+    def bm_mc_set_lag_membership(self, cxt_id, lag_index, port_map):
+        self.lags[lag_index] = port_map_to_ports(port_map)
+
+    def bm_mc_get_entries(self, cxt_id):
+        # same layout as bmv2, with one L2 node per L1 node
+        return json.dumps({
+            "mgrps": [{"id": mgid, "l1_handles": list(l1_handles)}
+                      for mgid, l1_handles in self.mgrps.values()],
+            "l1_handles": [{"handle": h, "rid": node[0], "l2_handle": h}
+                           for h, node in sorted(self.nodes.items())],
+            "l2_handles": [{"handle": h, "ports": node[1], "lags": node[2]}
+                           for h, node in sorted(self.nodes.items())],
+            "lags": [{"id": lag_index, "ports": ports}
+                     for lag_index, ports in sorted(self.lags.items())],
+        })
+
+    def replicate(self, mgid):
+        """(rid, port) pairs a packet sent to multicast group mgid is
+        replicated to, LAGs being resolved to their first port."""
+        copies = []
+        for group_mgid, l1_handles in self.mgrps.values():
+            if group_mgid != mgid:
+                continue
+            for l1_handle in l1_handles:
+                rid, ports, lags, _ = self.nodes[l1_handle]
+                copies.extend((rid, port) for port in ports)
+                copies.extend((rid, self.lags[lag][0]) for lag in lags
+                              if self.lags.get(lag))
+        return copies
+
+
+class Latency(object):
+    """Delay of the calls to a mock switch, to model a slow or loaded one:
+    seconds (or per_method[method]) plus up to jitter seconds drawn
+    uniformly at random."""
+
+    def __init__(self, seconds=0.0, jitter=0.0, per_method=None, seed=None):
+        self.seconds = seconds
+        self.jitter = jitter
+        self.per_method = per_method or {}
+        self.rng = random.Random(seed)
+
+    def delay(self, method):
+        delay = self.per_method.get(method, self.seconds)
+        if self.jitter:
+            delay += self.rng.uniform(0, self.jitter)
+        return delay
+
+
+class Synchronized(object):
+    """Calls the methods of handler with lock held, after sleeping for the
+    delay of latency if any. The delays of concurrent calls overlap, like
+    network and queuing delays would."""
+
+    def __init__(self, handler, lock, latency=None):
+        self.handler = handler
+        self.lock = lock
+        self.latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self.handler, name)
+        if not callable(attr):
+            return attr
+        latency = self.latency
+
+        def method(*args):
+            if latency is not None:
+                time.sleep(latency.delay(name))
+            with self.lock:
+                return attr(*args)
+        return method
+
+
+def make_processor(switch, lock=None, latency=None):
+    """Multiplexed processor of the services of switch, like the one of
+    simple_switch."""
+    lock = lock or threading.RLock()
+    processor = TMultiplexedProcessor()
+    processor.registerProcessor(
+        "standard", Standard.Processor(Synchronized(switch, lock, latency)))
+    pre = Synchronized(switch.pre, lock, latency)
+    processor.registerProcessor("simple_pre", SimplePre.Processor(pre))
+    processor.registerProcessor("simple_pre_lag",
+                                SimplePreLAG.Processor(pre))
+    return processor
+
+
+class ServerSocket(TSocket.TServerSocket):
+    """TServerSocket which can be bound before the server starts, so that
+    the port picked by the system for port 0 is known, and whose accept()
+    raises TTransportException once close() was called. close() also shuts
+    the accepted connections down, like a switch going away would."""
+
+    def __init__(self, *args, **kwargs):
+        super(ServerSocket, self).__init__(*args, **kwargs)
+        self.clients = weakref.WeakSet()
+
+    def listen(self):
+        if self.handle is None:
+            super(ServerSocket, self).listen()
+
+    @property
+    def bound_port(self):
+        return self.handle.getsockname()[1]
+
+    def accept(self):
+        handle = self.handle
+        if handle is None:
+            raise TTransport.TTransportException(
+                TTransport.TTransportException.NOT_OPEN, "Server closed")
+        try:
+            client = super(ServerSocket, self).accept()
+        except OSError:
+            if self.handle is None:
+                raise TTransport.TTransportException(
+                    TTransport.TTransportException.NOT_OPEN, "Server closed")
+            raise
+        if client is not None:
+            self.clients.add(client)
+        return client
+
+    def close(self):
+        handle, self.handle = self.handle, None
+        if handle is not None:
+            # wakes up the threads blocked in accept()
+            try:
+                handle.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            handle.close()
+        for client in list(self.clients):
+            # the threads serving them see the end of the stream and close
+            # them
+            if client.handle is not None:
+                try:
+                    client.handle.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+class ThreadedServer(TServer.TThreadedServer):
+    """TThreadedServer, one thread per connection like bmv2, whose serve()
+    returns once its ServerSocket is closed."""
+
+    def serve(self):
+        self.serverTransport.listen()
+        while True:
+            try:
+                client = self.serverTransport.accept()
+            except TTransport.TTransportException:
+                if self.serverTransport.handle is None:
+                    return
+                raise
+            if not client:
+                continue
+            t = threading.Thread(target=self.handle, args=(client,))
+            t.daemon = self.daemon
+            t.start()
+
+
+SERVER_MODES = ("simple", "threaded", "process")
+
+
+class MockSwitchServer(object):
+    """Serves the services of switch on port, in a background thread
+    (start) or the calling one (serve_forever). mode is one of:
+
+    - "simple": one connection at a time;
+    - "threaded": one thread per connection, like bmv2, the calls being
+      serialized on the state of the switch;
+    - "process": a pool of workers forked processes, each with its own copy
+      of the state of the switch, as it was when serving started. Writes
+      made through one connection aren't seen through the others (nor in
+      self.switch), which is fine for load tests of reads or for clients
+      which keep a single connection."""
+
+    def __init__(self, switch, host="localhost", port=9090, mode="threaded",
+                 workers=4, latency=None):
+        if mode not in SERVER_MODES:
+            raise ValueError("Unknown server mode {!r}".format(mode))
+        self.switch = switch
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.server_socket = ServerSocket(host=host, port=port)
+        self.server_socket.listen()
+        self.port = self.server_socket.bound_port
+        switch.thrift_port = self.port
+        self.server = self.make_server(
+            make_processor(switch, self.lock, latency), workers)
+        self.thread = None
+
+    def make_server(self, processor, workers):
+        args = (processor, self.server_socket,
+                TTransport.TBufferedTransportFactory(),
+                TBinaryProtocol.TBinaryProtocolAcceleratedFactory())
+        if self.mode == "simple":
+            return TServer.TSimpleServer(*args)
+        if self.mode == "threaded":
+            return ThreadedServer(*args, daemon=True)
+        server = TProcessPoolServer.TProcessPoolServer(*args)
+        server.setNumWorkers(workers)
+        server.setPostForkCallback(self.after_fork)
+        return server
+
+    def after_fork(self):
+        # or all the workers would draw the same jitter
+        if self.latency is not None:
+            self.latency.rng.seed()
+
+    def serve_forever(self):
+        try:
+            self.server.serve()
+        except TTransport.TTransportException:
+            # the server socket was closed by stop()
+            if self.server_socket.handle is not None:
+                raise
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       name="MockSwitchServer", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.mode == "process":
+            self.server.stop()
+            for worker in self.server.workers:
+                worker.terminate()
+            for worker in self.server.workers:
+                worker.join()
+        self.server_socket.close()
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_interface(value):
+    port_num, _, iface_name = value.partition("@")
+    return int(port_num), iface_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock bmv2 switch')
+    parser.add_argument('--json', help='bmv2 JSON config of the program',
+                        type=str, action="store", default=None)
+    parser.add_argument('--thrift-port', help='Thrift server port',
+                        type=int, action="store", default=9090)
+    parser.add_argument('--thrift-ip', help='Address to listen on',
+                        type=str, action="store", default="localhost")
+    parser.add_argument('--device-id', help='Device id reported to clients',
+                        type=int, action="store", default=0)
+    parser.add_argument('-i', '--interface', help='<port>@<interface>, like '
+                        'simple_switch; may be repeated', type=parse_interface,
+                        action="append", default=[])
+    parser.add_argument('--server', help='Server mode', choices=SERVER_MODES,
+                        default="threaded")
+    parser.add_argument('--workers', help='Number of processes of the '
+                        'process server', type=int, action="store", default=4)
+    parser.add_argument('--latency', help='Delay of every call in seconds',
+                        type=float, action="store", default=0.0)
+    parser.add_argument('--jitter', help='Random extra delay of every call, '
+                        'up to this many seconds', type=float, action="store",
+                        default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.json is not None:
+        switch = MockSwitch.from_file(args.json, device_id=args.device_id)
+    else:
+        switch = MockSwitch(device_id=args.device_id)
+    for port_num, iface_name in args.interface:
+        switch.ports[port_num] = iface_name
+    latency = None
+    if args.latency or args.jitter:
+        latency = Latency(args.latency, args.jitter)
+    server = MockSwitchServer(switch, args.thrift_ip, args.thrift_port,
+                              mode=args.server, workers=args.workers,
+                              latency=latency)
+    logger.info("Mock switch %d serving %d tables on port %d (%s server)",
+                args.device_id, len(switch.tables), server.port, args.server)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
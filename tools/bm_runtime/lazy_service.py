@@ -0,0 +1,191 @@
+#
+# Runtime of the *Lazy service modules generated by tools/gen_lazy_runtime.py.
+#
+# The generated service modules (e.g. standard/Standard.py) define an _args and
+# a _result class per method and a Client with three methods per method of the
+# service, all of which are created when the module is imported. The *Lazy
+# modules only hold the thrift_spec of every method as constants, and the
+# structs and Client methods of a method are created the first time it is
+# used. Encoding and decoding are the same as with the generated module.
+#
+
+import importlib
+
+from thrift.Thrift import TMessageType, TApplicationException
+from thrift.transport import TTransport
+
+
+class LazyStruct(object):
+    thrift_spec = None
+    fields = ()
+
+    def __init__(self, *args, **kwargs):
+        for field, value in zip(self.fields, args):
+            kwargs.setdefault(field[2], value)
+        for field in self.fields:
+            setattr(self, field[2], kwargs.pop(field[2], field[4]))
+        if kwargs:
+            raise TypeError("{}() got unexpected arguments {}".format(
+                self.__class__.__name__, ", ".join(kwargs)))
+
+    def read(self, iprot):
+        if iprot._fast_decode is not None and \
+                isinstance(iprot.trans, TTransport.CReadableTransport):
+            iprot._fast_decode(self, iprot, [self.__class__, self.thrift_spec])
+            return
+        iprot.readStruct(self, self.thrift_spec)
+
+    def write(self, oprot):
+        if oprot._fast_encode is not None:
+            oprot.trans.write(
+                oprot._fast_encode(self, [self.__class__, self.thrift_spec]))
+            return
+        oprot.writeStruct(self, self.thrift_spec)
+
+    def validate(self):
+        return
+
+    def __repr__(self):
+        L = ['%s=%r' % (key, value)
+             for key, value in self.__dict__.items()]
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+    def __eq__(self, other):
+        return isinstance(other, self.__class__) and \
+            self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not (self == other)
+
+
+class LazyClient(object):
+    service = None
+
+    def __init__(self, iprot, oprot=None):
+        self._iprot = self._oprot = iprot
+        if oprot is not None:
+            self._oprot = oprot
+        self._seqid = 0
+
+    def __getattr__(self, name):
+        # only called for methods which weren't created yet
+        return getattr(self, self.service.add_client_methods(name))
+
+
+class LazyService(object):
+    """methods maps the name of every method to the thrift_spec of its
+    _args and _result structs (None for oneway methods), in which structs
+    of ttypes_name are referred to as "@<class name>"."""
+
+    def __init__(self, module_name, ttypes_name, methods):
+        self.module_name = module_name
+        self.ttypes_name = ttypes_name
+        self.methods = methods
+        self.ttypes = None
+        self.structs = {}
+        self.Client = type("Client", (LazyClient,),
+                           {"service": self, "__module__": module_name})
+
+    def resolve(self, spec):
+        if isinstance(spec, str) and spec.startswith("@"):
+            if self.ttypes is None:
+                self.ttypes = importlib.import_module(self.ttypes_name)
+            cls = getattr(self.ttypes, spec[1:])
+            return [cls, cls.thrift_spec]
+        if isinstance(spec, tuple):
+            return tuple(self.resolve(s) for s in spec)
+        return spec
+
+    def struct(self, name):
+        """The <method>_args or <method>_result class, created on first
+        use."""
+        cls = self.structs.get(name)
+        if cls is not None:
+            return cls
+        method, _, kind = name.rpartition("_")
+        specs = self.methods.get(method)
+        if kind not in ("args", "result") or specs is None or \
+                specs[kind == "result"] is None:
+            raise AttributeError(name)
+        thrift_spec = self.resolve(specs[kind == "result"])
+        cls = self.structs[name] = type(name, (LazyStruct,), {
+            "thrift_spec": thrift_spec,
+            "fields": tuple(f for f in thrift_spec if f is not None),
+            "__module__": self.module_name,
+        })
+        return cls
+
+    def add_client_methods(self, name):
+        """Adds send_<method>, recv_<method> and <method> to Client, name
+        being one of them, and returns name."""
+        method = name
+        for prefix in ("send_", "recv_"):
+            if name.startswith(prefix):
+                method = name[len(prefix):]
+        if method not in self.methods:
+            raise AttributeError(name)
+        args_cls = self.struct(method + "_args")
+        oneway = self.methods[method][1] is None
+
+        def send(self, *args, **kwargs):
+            self._oprot.writeMessageBegin(method, TMessageType.CALL,
+                                          self._seqid)
+            args_cls(*args, **kwargs).write(self._oprot)
+            self._oprot.writeMessageEnd()
+            self._oprot.trans.flush()
+
+        if oneway:
+            def call(self, *args, **kwargs):
+                send(self, *args, **kwargs)
+            recv = None
+        else:
+            result_cls = self.struct(method + "_result")
+            has_success = any(f[0] == 0 for f in result_cls.fields)
+            exceptions = [f[2] for f in result_cls.fields if f[0] != 0]
+
+            def recv(self):
+                iprot = self._iprot
+                (fname, mtype, rseqid) = iprot.readMessageBegin()
+                if mtype == TMessageType.EXCEPTION:
+                    x = TApplicationException()
+                    x.read(iprot)
+                    iprot.readMessageEnd()
+                    raise x
+                result = result_cls()
+                result.read(iprot)
+                iprot.readMessageEnd()
+                if has_success and result.success is not None:
+                    return result.success
+                for exception in exceptions:
+                    if getattr(result, exception) is not None:
+                        raise getattr(result, exception)
+                if has_success:
+                    raise TApplicationException(
+                        TApplicationException.MISSING_RESULT,
+                        "{} failed: unknown result".format(method))
+
+            def call(self, *args, **kwargs):
+                send(self, *args, **kwargs)
+                return recv(self)
+
+        for fn_name, fn in (("send_" + method, send),
+                            ("recv_" + method, recv), (method, call)):
+            if fn is not None:
+                fn.__name__ = fn_name
+                setattr(self.Client, fn_name, fn)
+        return name
+
+    def module_getattr(self, name):
+        """__getattr__ of the *Lazy modules: the _args and _result classes,
+        and the names of ttypes, like in the generated module."""
+        try:
+            return self.struct(name)
+        except AttributeError:
+            pass
+        if self.ttypes is None:
+            self.ttypes = importlib.import_module(self.ttypes_name)
+        try:
+            return getattr(self.ttypes, name)
+        except AttributeError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(
+                self.module_name, name))
@@ -0,0 +1,46 @@
+#
+# Autogenerated by tools/gen_lazy_runtime.py from SimplePre.py
+#
+# DO NOT EDIT, run tools/gen_lazy_runtime.py again instead
+#
+
+from ..lazy_service import LazyService
+
+METHODS = {
+    'bm_mc_mgrp_create': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'mgrp', None, None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+    'bm_mc_mgrp_destroy': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'mgrp_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+    'bm_mc_node_create': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'rid', None, None), (3, 11, 'port_map', 'UTF8', None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+    'bm_mc_node_associate': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'mgrp_handle', None, None), (3, 8, 'l1_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+    'bm_mc_node_dissociate': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'mgrp_handle', None, None), (3, 8, 'l1_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+    'bm_mc_node_destroy': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'l1_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+    'bm_mc_node_update': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'l1_handle', None, None), (3, 11, 'port_map', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+    'bm_mc_get_entries': (
+        (None, (1, 8, 'cxt_id', None, None)),
+        ((0, 11, 'success', 'UTF8', None), (1, 12, 'ouch', '@InvalidMcOperation', None)),
+    ),
+}
+
+_service = LazyService(__name__, __package__ + ".ttypes", METHODS)
+Client = _service.Client
+__getattr__ = _service.module_getattr
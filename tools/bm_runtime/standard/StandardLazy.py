@@ -0,0 +1,294 @@
+#
+# Autogenerated by tools/gen_lazy_runtime.py from Standard.py
+#
+# DO NOT EDIT, run tools/gen_lazy_runtime.py again instead
+#
+
+from ..lazy_service import LazyService
+
+METHODS = {
+    'bm_mt_get_num_entries': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None)),
+        ((0, 10, 'success', None, None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_clear_entries': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 2, 'reset_default_entry', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_add_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 15, 'match_key', (12, '@BmMatchParam', False), None), (4, 11, 'action_name', 'UTF8', None), (5, 15, 'action_data', (11, 'BINARY', False), None), (6, 12, 'options', '@BmAddEntryOptions', None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_set_default_action': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 11, 'action_name', 'UTF8', None), (4, 15, 'action_data', (11, 'BINARY', False), None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_reset_default_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_delete_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_modify_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None), (4, 11, 'action_name', 'UTF8', None), (5, 15, 'action_data', (11, 'BINARY', False), None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_set_entry_ttl': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None), (4, 8, 'timeout_ms', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_add_member': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 11, 'action_name', 'UTF8', None), (4, 15, 'action_data', (11, 'BINARY', False), None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_delete_member': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 8, 'mbr_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_modify_member': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 8, 'mbr_handle', None, None), (4, 11, 'action_name', 'UTF8', None), (5, 15, 'action_data', (11, 'BINARY', False), None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_create_group': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_delete_group': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 8, 'grp_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_add_member_to_group': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 8, 'mbr_handle', None, None), (4, 8, 'grp_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_remove_member_from_group': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 8, 'mbr_handle', None, None), (4, 8, 'grp_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_get_members': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None)),
+        ((0, 15, 'success', (12, '@BmMtActProfMember', False), None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_get_member': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 8, 'mbr_handle', None, None)),
+        ((0, 12, 'success', '@BmMtActProfMember', None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_get_groups': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None)),
+        ((0, 15, 'success', (12, '@BmMtActProfGroup', False), None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_act_prof_get_group': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'act_prof_name', 'UTF8', None), (3, 8, 'grp_handle', None, None)),
+        ((0, 12, 'success', '@BmMtActProfGroup', None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_add_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 15, 'match_key', (12, '@BmMatchParam', False), None), (4, 8, 'mbr_handle', None, None), (5, 12, 'options', '@BmAddEntryOptions', None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_modify_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None), (4, 8, 'mbr_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_delete_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_set_entry_ttl': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None), (4, 8, 'timeout_ms', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_set_default_member': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'mbr_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_reset_default_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_ws_add_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 15, 'match_key', (12, '@BmMatchParam', False), None), (4, 8, 'grp_handle', None, None), (5, 12, 'options', '@BmAddEntryOptions', None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_ws_modify_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None), (4, 8, 'grp_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_indirect_ws_set_default_group': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'grp_handle', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_read_counter': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None)),
+        ((0, 12, 'success', '@BmCounterValue', None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_reset_counters': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_write_counter': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None), (4, 12, 'value', '@BmCounterValue', None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_set_meter_rates': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None), (4, 15, 'rates', (12, '@BmMeterRateConfig', False), None)),
+        (None, (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_get_meter_rates': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None)),
+        ((0, 15, 'success', (12, '@BmMeterRateConfig', False), None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_get_entries': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None)),
+        ((0, 15, 'success', (12, '@BmMtEntry', False), None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_get_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 8, 'entry_handle', None, None)),
+        ((0, 12, 'success', '@BmMtEntry', None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_get_default_entry': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None)),
+        ((0, 12, 'success', '@BmActionEntry', None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_mt_get_entry_from_key': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'table_name', 'UTF8', None), (3, 15, 'match_key', (12, '@BmMatchParam', False), None), (4, 12, 'options', '@BmAddEntryOptions', None)),
+        ((0, 12, 'success', '@BmMtEntry', None), (1, 12, 'ouch', '@InvalidTableOperation', None)),
+    ),
+    'bm_counter_read': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'counter_name', 'UTF8', None), (3, 8, 'index', None, None)),
+        ((0, 12, 'success', '@BmCounterValue', None), (1, 12, 'ouch', '@InvalidCounterOperation', None)),
+    ),
+    'bm_counter_reset_all': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'counter_name', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidCounterOperation', None)),
+    ),
+    'bm_counter_write': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'counter_name', 'UTF8', None), (3, 8, 'index', None, None), (4, 12, 'value', '@BmCounterValue', None)),
+        (None, (1, 12, 'ouch', '@InvalidCounterOperation', None)),
+    ),
+    'bm_learning_ack': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'list_id', None, None), (3, 10, 'buffer_id', None, None), (4, 15, 'sample_ids', (8, None, False), None)),
+        (None, (1, 12, 'ouch', '@InvalidLearnOperation', None)),
+    ),
+    'bm_learning_ack_buffer': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'list_id', None, None), (3, 10, 'buffer_id', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidLearnOperation', None)),
+    ),
+    'bm_learning_set_timeout': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'list_id', None, None), (3, 8, 'timeout_ms', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidLearnOperation', None)),
+    ),
+    'bm_learning_set_buffer_size': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'list_id', None, None), (3, 8, 'nb_samples', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidLearnOperation', None)),
+    ),
+    'bm_load_new_config': (
+        (None, (1, 11, 'config_str', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidSwapOperation', None)),
+    ),
+    'bm_swap_configs': (
+        (),
+        (None, (1, 12, 'ouch', '@InvalidSwapOperation', None)),
+    ),
+    'bm_meter_array_set_rates': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'meter_array_name', 'UTF8', None), (3, 15, 'rates', (12, '@BmMeterRateConfig', False), None)),
+        (None, (1, 12, 'ouch', '@InvalidMeterOperation', None)),
+    ),
+    'bm_meter_set_rates': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'meter_array_name', 'UTF8', None), (3, 8, 'index', None, None), (4, 15, 'rates', (12, '@BmMeterRateConfig', False), None)),
+        (None, (1, 12, 'ouch', '@InvalidMeterOperation', None)),
+    ),
+    'bm_meter_get_rates': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'meter_array_name', 'UTF8', None), (3, 8, 'index', None, None)),
+        ((0, 15, 'success', (12, '@BmMeterRateConfig', False), None), (1, 12, 'ouch', '@InvalidMeterOperation', None)),
+    ),
+    'bm_register_read': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'register_array_name', 'UTF8', None), (3, 8, 'idx', None, None)),
+        ((0, 10, 'success', None, None), (1, 12, 'ouch', '@InvalidRegisterOperation', None)),
+    ),
+    'bm_register_read_all': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'register_array_name', 'UTF8', None)),
+        ((0, 15, 'success', (10, None, False), None), (1, 12, 'ouch', '@InvalidRegisterOperation', None)),
+    ),
+    'bm_register_write': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'register_array_name', 'UTF8', None), (3, 8, 'index', None, None), (4, 10, 'value', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidRegisterOperation', None)),
+    ),
+    'bm_register_write_range': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'register_array_name', 'UTF8', None), (3, 8, 'start_index', None, None), (4, 8, 'end_index', None, None), (5, 10, 'value', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidRegisterOperation', None)),
+    ),
+    'bm_register_reset': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'register_array_name', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidRegisterOperation', None)),
+    ),
+    'bm_parse_vset_add': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'parse_vset_name', 'UTF8', None), (3, 11, 'value', 'BINARY', None)),
+        (None, (1, 12, 'ouch', '@InvalidParseVSetOperation', None)),
+    ),
+    'bm_parse_vset_remove': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'parse_vset_name', 'UTF8', None), (3, 11, 'value', 'BINARY', None)),
+        (None, (1, 12, 'ouch', '@InvalidParseVSetOperation', None)),
+    ),
+    'bm_parse_vset_get': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'parse_vset_name', 'UTF8', None)),
+        ((0, 15, 'success', (11, 'BINARY', False), None), (1, 12, 'ouch', '@InvalidParseVSetOperation', None)),
+    ),
+    'bm_parse_vset_clear': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'parse_vset_name', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidParseVSetOperation', None)),
+    ),
+    'bm_dev_mgr_add_port': (
+        (None, (1, 11, 'iface_name', 'UTF8', None), (2, 8, 'port_num', None, None), (3, 11, 'pcap_path', 'UTF8', None)),
+        (None, (1, 12, 'ouch', '@InvalidDevMgrOperation', None)),
+    ),
+    'bm_dev_mgr_remove_port': (
+        (None, (1, 8, 'port_num', None, None)),
+        (None, (1, 12, 'ouch', '@InvalidDevMgrOperation', None)),
+    ),
+    'bm_dev_mgr_show_ports': (
+        (),
+        ((0, 15, 'success', (12, '@DevMgrPortInfo', False), None), (1, 12, 'ouch', '@InvalidDevMgrOperation', None)),
+    ),
+    'bm_mgmt_get_info': (
+        (),
+        ((0, 12, 'success', '@BmConfig', None),),
+    ),
+    'bm_set_crc16_custom_parameters': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'calc_name', 'UTF8', None), (3, 12, 'crc16_config', '@BmCrc16Config', None)),
+        (None, (1, 12, 'ouch', '@InvalidCrcOperation', None)),
+    ),
+    'bm_set_crc32_custom_parameters': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'calc_name', 'UTF8', None), (3, 12, 'crc32_config', '@BmCrc32Config', None)),
+        (None, (1, 12, 'ouch', '@InvalidCrcOperation', None)),
+    ),
+    'bm_set_toeplitz_hash_key': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 11, 'calc_name', 'UTF8', None), (3, 11, 'key', 'BINARY', None)),
+        (None, (1, 12, 'ouch', '@InvalidToeplitzHashOperation', None)),
+    ),
+    'bm_reset_state': (
+        (),
+        (),
+    ),
+    'bm_get_config': (
+        (),
+        ((0, 11, 'success', 'UTF8', None),),
+    ),
+    'bm_get_config_md5': (
+        (),
+        ((0, 11, 'success', 'BINARY', None),),
+    ),
+    'bm_get_id_from_name': (
+        (None, (1, 8, 'cxt_id', None, None), (2, 8, 'resource_type', None, None), (3, 11, 'resource_name', 'UTF8', None)),
+        ((0, 8, 'success', None, None), (1, 12, 'ouch', '@InvalidIdLookup', None)),
+    ),
+    'bm_serialize_state': (
+        (),
+        ((0, 11, 'success', 'UTF8', None),),
+    ),
+}
+
+_service = LazyService(__name__, __package__ + ".ttypes", METHODS)
+Client = _service.Client
+__getattr__ = _service.module_getattr
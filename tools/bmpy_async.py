@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+#
+# asyncio clients for the bmv2 Thrift services.
+#
+# Requests are encoded by the send_* methods of the generated clients and
+# replies decoded by their recv_* methods; only the transport changes. bmv2
+# answers the requests of a connection in order, so every call gets a future
+# which is resolved by the next reply, and concurrent calls on one connection
+# are pipelined.
+#
+
+import asyncio
+import collections
+
+from thrift.protocol import TMultiplexedProtocol
+from thrift.transport import TTransport
+
+import bmpy_utils as utils
+from bm_runtime.standard import Standard
+from bm_runtime.simple_pre import SimplePre
+from bm_runtime.simple_pre_lag import SimplePreLAG
+
+
+class WriteBuffer(TTransport.TTransportBase):
+    """Collects what the generated send_* methods write."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def isOpen(self):
+        return True
+
+    def write(self, buf):
+        self.chunks.append(buf)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def decode_reply(recv, iprot, buf):
+    """Decodes the reply at the start of buf with recv, a bound recv_* method.
+    Returns (outcome, is_error, consumed) or None if buf holds a partial
+    reply."""
+    mem = TTransport.TMemoryBuffer(bytes(buf))
+    iprot.trans = mem
+    try:
+        outcome, is_error = recv(), False
+    except (EOFError, TTransport.TTransportException):
+        return None
+    except Exception as e:
+        outcome, is_error = e, True
+    return outcome, is_error, mem.cstringio_buf.tell()
+
+
+class AsyncThriftClient(object):
+    """Base class of the asyncio clients; subclasses set client_cls and
+    service_name and get one coroutine per method of the service."""
+
+    client_cls = None
+    service_name = None
+    read_size = 1 << 16
+
+    def __init__(self, reader, writer, accelerated=None):
+        self.reader = reader
+        self.writer = writer
+        self.out = WriteBuffer()
+        oprot = TMultiplexedProtocol.TMultiplexedProtocol(
+            utils.make_binary_protocol(self.out, accelerated),
+            self.service_name)
+        self.iprot = utils.make_binary_protocol(
+            TTransport.TMemoryBuffer(b""), accelerated)
+        self.client = self.client_cls(self.iprot, oprot)
+        # (recv_* method, future) of the calls waiting for their reply
+        self.pending = collections.deque()
+        self.buf = bytearray()
+        self.reader_task = None
+        self.error = None
+
+    @classmethod
+    async def connect(cls, thrift_ip, thrift_port, accelerated=None):
+        reader, writer = await asyncio.open_connection(thrift_ip, thrift_port)
+        return cls(reader, writer, accelerated)
+
+    async def call(self, name, args):
+        if self.error is not None:
+            raise self.error
+        getattr(self.client, "send_" + name)(*args)
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((getattr(self.client, "recv_" + name), future))
+        self.writer.write(self.out.take())
+        if self.reader_task is None or self.reader_task.done():
+            self.reader_task = asyncio.ensure_future(self.read_replies())
+        await self.writer.drain()
+        return await future
+
+    async def read_replies(self):
+        # a partial reply is decoded again once the buffer has doubled, or
+        # when the socket has nothing more to read for now, so that a large
+        # reply costs O(size) decoding work overall
+        retry_at = 0
+        drained = True
+        try:
+            while self.pending:
+                if self.buf and (drained or len(self.buf) >= retry_at):
+                    recv, future = self.pending[0]
+                    decoded = decode_reply(recv, self.iprot, self.buf)
+                    if decoded is not None:
+                        outcome, is_error, consumed = decoded
+                        del self.buf[:consumed]
+                        self.pending.popleft()
+                        retry_at = 0
+                        if future.cancelled():
+                            continue
+                        if is_error:
+                            future.set_exception(outcome)
+                        else:
+                            future.set_result(outcome)
+                        continue
+                    retry_at = 2 * len(self.buf)
+                data = await self.reader.read(self.read_size)
+                if not data:
+                    raise TTransport.TTransportException(
+                        TTransport.TTransportException.END_OF_FILE,
+                        "Connection closed by the switch")
+                self.buf += data
+                drained = len(data) < self.read_size
+        except Exception as e:
+            self.fail(e)
+
+    def fail(self, error):
+        self.error = error
+        while self.pending:
+            _, future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (OSError, ConnectionError):
+            pass
+        self.fail(TTransport.TTransportException(
+            TTransport.TTransportException.NOT_OPEN, "Client closed"))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def _make_method(name):
+    async def method(self, *args):
+        return await self.call(name, args)
+    method.__name__ = name
+    return method
+
+
+def make_async_client_cls(cls_name, service_module, service_name):
+    """AsyncThriftClient subclass with a coroutine for every method of
+    service_module.Iface."""
+    attrs = {"client_cls": service_module.Client,
+             "service_name": service_name}
+    for name in vars(service_module.Iface):
+        if not name.startswith("_"):
+            attrs[name] = _make_method(name)
+    return type(cls_name, (AsyncThriftClient,), attrs)
+
+
+AsyncStandardClient = make_async_client_cls(
+    "AsyncStandardClient", Standard, "standard")
+AsyncSimplePreClient = make_async_client_cls(
+    "AsyncSimplePreClient", SimplePre, "simple_pre")
+AsyncSimplePreLAGClient = make_async_client_cls(
+    "AsyncSimplePreLAGClient", SimplePreLAG, "simple_pre_lag")
+
+
+async def thrift_connect_standard(thrift_ip, thrift_port, accelerated=None):
+    return await AsyncStandardClient.connect(thrift_ip, thrift_port,
+                                             accelerated)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+#
+# Batching of table writes made one at a time from many places.
+#
+#   batcher = WriteBatcher(bmpy_utils.thrift_connect_standard(ip, port))
+#   future = batcher.bm_mt_add_entry(0, "MyIngress.ipv4_lpm", key,
+#                                    "MyIngress.ipv4_forward", data, options)
+#   ...
+#   handle = future.result()
+#
+# bm_mt_add_entry, bm_mt_modify_entry and bm_mt_delete_entry are queued and
+# return a concurrent.futures.Future; a background thread sends the queue
+# through a bmpy_pipeline.Pipeline once it holds max_batch calls, max_delay
+# seconds after its oldest call was queued, or on barrier(). Writes reach the
+# switch in the order they were made.
+#
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+from thrift.transport import TTransport
+
+from bmpy_pipeline import Pipeline
+
+# Errors after which the replies of the rest of a batch are lost
+CONNECTION_ERRORS = (TTransport.TTransportException, EOFError, OSError)
+
+
+BATCHED_METHODS = frozenset([
+    "bm_mt_add_entry", "bm_mt_modify_entry", "bm_mt_delete_entry",
+])
+
+
+class WriteBatcher(object):
+    """Owns client: other bm_* methods called on the batcher wait for the
+    queued writes to be applied, then are called on client directly, so
+    that reads see the writes made before them. The future of a write
+    holds what the method returns (the entry handle for bm_mt_add_entry) or
+    raises the error of the switch, e.g. InvalidTableOperation."""
+
+    def __init__(self, client, max_batch=256, max_delay=0.005, window=128):
+        self.client = client
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.window = window
+        # (method, args, future, time queued)
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.io_lock = threading.Lock()
+        self.flush_requested = False
+        self.closed = False
+        self.nb_batches = 0
+        self.nb_writes = 0
+        self.thread = threading.Thread(target=self.run, daemon=True,
+                                       name="WriteBatcher")
+        self.thread.start()
+
+    def submit(self, name, *args):
+        assert name in BATCHED_METHODS, name
+        future = concurrent.futures.Future()
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("WriteBatcher is closed")
+            self.queue.append((name, args, future, time.monotonic()))
+            if len(self.queue) == 1 or len(self.queue) >= self.max_batch:
+                self.cond.notify()
+        return future
+
+    def flush(self):
+        """Sends the queued writes without waiting for their replies."""
+        with self.cond:
+            self.flush_requested = True
+            self.cond.notify()
+
+    def barrier(self):
+        """Waits until every write queued so far is applied."""
+        with self.cond:
+            if not self.queue:
+                last = None
+            else:
+                last = self.queue[-1][2]
+                self.flush_requested = True
+                self.cond.notify()
+        if last is not None:
+            concurrent.futures.wait([last])
+        # the last batch may still be held by the flusher thread
+        with self.io_lock:
+            pass
+
+    def next_batch(self):
+        with self.cond:
+            while True:
+                if self.queue:
+                    if self.flush_requested or self.closed or \
+                            len(self.queue) >= self.max_batch:
+                        break
+                    wait = self.queue[0][3] + self.max_delay - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self.cond.wait(wait)
+                elif self.closed:
+                    return None
+                else:
+                    self.cond.wait()
+            self.flush_requested = False
+            batch = []
+            while self.queue and len(batch) < self.max_batch:
+                batch.append(self.queue.popleft())
+            # take the lock before releasing cond, so that barrier() can't
+            # see an empty queue and return before this batch is applied
+            self.io_lock.acquire()
+            return batch
+
+    def send(self, batch):
+        futures = collections.deque(
+            future for _, _, future, _ in batch
+            if future.set_running_or_notify_cancel())
+
+        def on_result(call):
+            future = futures.popleft()
+            if call.error is not None:
+                future.set_exception(call.error)
+            else:
+                future.set_result(call.result)
+
+        try:
+            with Pipeline(self.client, self.window, on_result,
+                          keep_calls=False) as pipeline:
+                for name, args, future, _ in batch:
+                    if not future.running():
+                        continue
+                    try:
+                        pipeline.call(name, *args)
+                    except CONNECTION_ERRORS:
+                        raise
+                    except Exception as e:
+                        # e.g. arguments which can't be encoded: the write
+                        # wasn't sent, the rest of the batch is
+                        futures.remove(future)
+                        future.set_exception(e)
+        except CONNECTION_ERRORS as e:
+            # the replies of the rest of the batch are lost, and whether
+            # their writes were applied is unknown
+            for future in futures:
+                future.set_exception(e)
+        self.nb_batches += 1
+        self.nb_writes += len(batch)
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            try:
+                self.send(batch)
+            except Exception as e:
+                # keeps the thread alive for the next batches
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self.io_lock.release()
+
+    def close(self):
+        """Applies the queued writes and stops the flusher thread."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        if name in BATCHED_METHODS:
+            return lambda *args: self.submit(name, *args)
+        attr = getattr(self.client, name)
+        if not name.startswith("bm_"):
+            return attr
+
+        def method(*args):
+            self.barrier()
+            with self.io_lock:
+                return attr(*args)
+        return method
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+#
+# Read-through cache in front of a Standard client, for controllers in which
+# several components read the same tables of a switch at about the same time.
+#
+#   client = CachingClient(bmpy_utils.thrift_connect_standard(ip, port))
+#   entries = client.bm_mt_get_entries(0, "MyIngress.ipv4_lpm")
+#
+# Results of the methods in ttls are kept for that many seconds, and identical
+# reads issued while one is in flight wait for its reply instead of sending
+# their own. Writes to a table invalidate the cached reads of that table.
+#
+
+import threading
+import time
+
+
+DEFAULT_TTLS = {
+    "bm_mt_get_entries": 1.0,
+    "bm_mt_get_default_entry": 1.0,
+    "bm_dev_mgr_show_ports": 5.0,
+    "bm_mgmt_get_info": 30.0,
+}
+
+# Methods whose first two arguments are (cxt_id, table_name); the cached
+# reads among them are dropped by writes to the table
+TABLE_READS = frozenset([
+    "bm_mt_get_entries", "bm_mt_get_default_entry", "bm_mt_get_num_entries",
+    "bm_mt_get_entry", "bm_mt_get_entry_from_key",
+])
+TABLE_WRITES = frozenset([
+    "bm_mt_add_entry", "bm_mt_modify_entry", "bm_mt_delete_entry",
+    "bm_mt_clear_entries", "bm_mt_set_default_action",
+    "bm_mt_reset_default_entry", "bm_mt_set_entry_ttl",
+    "bm_mt_indirect_add_entry", "bm_mt_indirect_modify_entry",
+    "bm_mt_indirect_delete_entry", "bm_mt_indirect_set_entry_ttl",
+    "bm_mt_indirect_set_default_member",
+    "bm_mt_indirect_reset_default_entry",
+    "bm_mt_indirect_ws_add_entry", "bm_mt_indirect_ws_modify_entry",
+    "bm_mt_indirect_ws_set_default_group",
+])
+# Methods after which nothing cached can be trusted
+GLOBAL_WRITES = frozenset([
+    "bm_load_new_config", "bm_swap_configs", "bm_reset_state",
+    "bm_dev_mgr_add_port", "bm_dev_mgr_remove_port",
+])
+
+
+class Flight(object):
+    """A read on its way to the switch, which identical reads wait for."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def get(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class CachingClient(object):
+    """Wraps client, whose calls are serialized so that it can be shared by
+    threads. Methods absent from ttls, and reads with unhashable arguments,
+    are forwarded as is. hits, misses and coalesced count the reads served
+    from the cache, sent to the switch and joined to one in flight."""
+
+    def __init__(self, client, ttls=None, clock=time.monotonic):
+        self.client = client
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.clock = clock
+        # key -> (expiry, result), key being (method, args)
+        self.cache = {}
+        self.inflight = {}
+        # number of writes per (cxt_id, table_name) and of invalidations of
+        # everything, so that a read which was in flight during a write
+        # doesn't cache its outdated result
+        self.generations = {}
+        self.epoch = 0
+        self.lock = threading.Lock()
+        self.call_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def table_of(name, args):
+        if name in TABLE_READS or name in TABLE_WRITES:
+            return tuple(args[:2])
+        return None
+
+    def forward(self, name, args):
+        with self.call_lock:
+            return getattr(self.client, name)(*args)
+
+    def version(self, table):
+        return self.epoch, self.generations.get(table, 0)
+
+    def read(self, name, args):
+        key = (name, args)
+        table = self.table_of(name, args)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if cached[0] > self.clock():
+                    self.hits += 1
+                    return cached[1]
+                del self.cache[key]
+            flight = self.inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                flight = self.inflight[key] = Flight()
+                version = self.version(table)
+                owner = True
+        if not owner:
+            return flight.get()
+        try:
+            flight.result = self.forward(name, args)
+        except Exception as e:
+            flight.error = e
+        with self.lock:
+            if self.inflight.get(key) is flight:
+                del self.inflight[key]
+            if flight.error is None and self.version(table) == version:
+                self.cache[key] = (self.clock() + self.ttls[name],
+                                   flight.result)
+        flight.event.set()
+        return flight.get()
+
+    def write(self, name, args):
+        try:
+            return self.forward(name, args)
+        finally:
+            # invalidated whether the write succeeded or not, since a failed
+            # write may still have been partially applied
+            if name in GLOBAL_WRITES:
+                self.invalidate()
+            else:
+                self.invalidate(*self.table_of(name, args))
+
+    def invalidate(self, cxt_id=None, table_name=None):
+        """Drops the cached reads of a table, or all of them. Reads in
+        flight complete for their callers, but later reads don't join
+        them."""
+        with self.lock:
+            if table_name is None:
+                self.cache = {}
+                self.inflight = {}
+                self.epoch += 1
+                return
+            table = (cxt_id, table_name)
+            self.generations[table] = self.generations.get(table, 0) + 1
+            for store in (self.cache, self.inflight):
+                for key in [key for key in store
+                            if self.table_of(*key) == table]:
+                    del store[key]
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not name.startswith("bm_"):
+            return attr
+        if name in TABLE_WRITES or name in GLOBAL_WRITES:
+            return lambda *args: self.write(name, args)
+        if name not in self.ttls:
+            return lambda *args: self.forward(name, args)
+
+        def method(*args):
+            try:
+                hash(args)
+            except TypeError:
+                return self.forward(name, args)
+            return self.read(name, args)
+        return method
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+#
+# Memory-compact variants of the structs of bm_runtime.standard.ttypes which
+# table dumps are made of.
+#
+# The generated structs keep their fields in a per-instance dictionary (or,
+# from Python 3.11, in space reserved for one); the compact variants use
+# __slots__ instead. They have the same name, fields, constructor, repr and
+# encoding as the generated ones: their methods are those of the generated
+# classes, run with the compact classes in their globals, so decoding one
+# decodes the whole tree compactly.
+#
+#   entries = bmpy_compact.get_entries(client, 0, "MyIngress.ipv4_lpm")
+#
+
+import sys
+import types
+
+from thrift.Thrift import TApplicationException, TMessageType
+
+from bm_runtime.standard import Standard
+from bm_runtime.standard import ttypes
+
+
+HOT_STRUCTS = [
+    "BmMtEntry", "BmMatchParam", "BmMatchParamExact", "BmMatchParamLPM",
+    "BmMatchParamTernary", "BmMatchParamValid", "BmMatchParamRange",
+    "BmActionEntry", "BmMtEntryLife", "BmAddEntryOptions",
+]
+
+
+class CompactStruct(object):
+    __slots__ = ()
+    thrift_spec = None
+    # the generated class this is the compact variant of
+    original = None
+
+    def validate(self):
+        return
+
+    def to_original(self):
+        """The equivalent instance of the generated class."""
+        return self.original(**{
+            name: to_original(getattr(self, name)) for name in self.__slots__})
+
+    def __repr__(self):
+        L = ['%s=%r' % (name, getattr(self, name))
+             for name in self.__slots__]
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+    def __eq__(self, other):
+        # like the generated __eq__, only equal to its own class, so that
+        # equality stays symmetric; compare to_original() with the
+        # generated structs
+        if not isinstance(other, self.__class__):
+            return False
+        return all(getattr(self, name) == getattr(other, name)
+                   for name in self.__slots__)
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    __hash__ = None
+
+
+def to_original(value):
+    if isinstance(value, CompactStruct):
+        return value.to_original()
+    if isinstance(value, list):
+        return [to_original(v) for v in value]
+    return value
+
+
+# generated class -> compact class
+COMPACT = {}
+
+
+def compact_spec(spec):
+    """spec, a thrift_spec or part of one, with the hot structs replaced by
+    their compact variants."""
+    if isinstance(spec, list):
+        cls = COMPACT.get(spec[0])
+        if cls is None:
+            return spec
+        # nested structs first, fastbinary needs their whole spec
+        if cls.thrift_spec is None:
+            cls.thrift_spec = compact_spec(cls.original.thrift_spec)
+        return [cls, cls.thrift_spec]
+    if isinstance(spec, tuple):
+        return tuple(compact_spec(s) for s in spec)
+    return spec
+
+
+def rebind(fn, namespace):
+    """fn, with the names of its module looked up in namespace instead."""
+    return types.FunctionType(fn.__code__, namespace, fn.__name__,
+                              fn.__defaults__, fn.__closure__)
+
+
+def compact_namespace(module):
+    namespace = dict(vars(module))
+    namespace.update((cls.__name__, cls) for cls in COMPACT.values())
+    return namespace
+
+
+def make_compact_structs():
+    for name in HOT_STRUCTS:
+        original = getattr(ttypes, name)
+        fields = tuple(f[2] for f in original.thrift_spec if f is not None)
+        COMPACT[original] = type(name, (CompactStruct,), {
+            "__slots__": fields,
+            "original": original,
+            "__module__": __name__,
+        })
+    namespace = compact_namespace(ttypes)
+    for original, compact in COMPACT.items():
+        for method in ("__init__", "read", "write"):
+            setattr(compact, method, rebind(getattr(original, method),
+                                            namespace))
+    # once all classes exist, since the structs refer to each other
+    for original in COMPACT:
+        compact_spec([original, None])
+    globals().update((cls.__name__, cls) for cls in COMPACT.values())
+
+
+make_compact_structs()
+
+
+def compact_result(method):
+    """<method>_result struct whose hot structs are decoded compactly."""
+    original = getattr(Standard, method + "_result")
+    return type(original.__name__, (original,), {
+        "thrift_spec": compact_spec(original.thrift_spec),
+        "read": rebind(original.read, _standard_namespace),
+    })
+
+
+_standard_namespace = compact_namespace(Standard)
+
+
+_results = {}
+
+
+def call_compact(client, method, *args):
+    """Calls method on a Standard client, decoding its result with the
+    compact structs."""
+    result_cls = _results.get(method)
+    if result_cls is None:
+        result_cls = _results[method] = compact_result(method)
+    getattr(client, "send_" + method)(*args)
+    iprot = client._iprot
+    (fname, mtype, rseqid) = iprot.readMessageBegin()
+    if mtype == TMessageType.EXCEPTION:
+        x = TApplicationException()
+        x.read(iprot)
+        iprot.readMessageEnd()
+        raise x
+    result = result_cls()
+    result.read(iprot)
+    iprot.readMessageEnd()
+    if getattr(result, "success", None) is not None:
+        return result.success
+    for field in result.thrift_spec:
+        if field is not None and field[0] != 0 and \
+                getattr(result, field[2]) is not None:
+            raise getattr(result, field[2])
+    if result.thrift_spec[0] is not None:
+        raise TApplicationException(
+            TApplicationException.MISSING_RESULT,
+            "{} failed: unknown result".format(method))
+
+
+def intern_action_names(entries):
+    """Makes the entries share a single copy of each action name."""
+    for entry in entries:
+        action_entry = entry.action_entry
+        if action_entry is not None and action_entry.action_name is not None:
+            action_entry.action_name = sys.intern(action_entry.action_name)
+    return entries
+
+
+def get_entries(client, cxt_id, table_name):
+    return intern_action_names(
+        call_compact(client, "bm_mt_get_entries", cxt_id, table_name))
+
+
+def get_entry(client, cxt_id, table_name, entry_handle):
+    return call_compact(client, "bm_mt_get_entry", cxt_id, table_name,
+                        entry_handle)
+
+
+def get_default_entry(client, cxt_id, table_name):
+    return call_compact(client, "bm_mt_get_default_entry", cxt_id,
+                        table_name)
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+
+#
+# Column-wise encoding of table entries, for programming large route sets.
+#
+# Building the BmMatchParam and action data of every route in Python, then
+# encoding each bm_mt_add_entry request, dominates the time spent pushing a
+# large route set. The requests adding entries to one table with one action
+# all have the same length and only differ in a few bytes at fixed offsets,
+# so encode_add_entries encodes one request as a template and writes whole
+# columns (lists or NumPy arrays of IPv4 addresses, prefix lengths, MACs,
+# ports) into a buffer holding all the requests, which send_encoded then
+# pipelines. The widths come from the compiled JSON config of the program.
+#
+#   encoder = bmpy_encode.TableEncoder.from_config(config, "MyIngress.ipv4_lpm")
+#   calls = encoder.encode_add_entries(
+#       client, "MyIngress.ipv4_lpm", "MyIngress.ipv4_forward",
+#       [(dst_addrs, prefix_lengths)], [macs, ports])
+#   results = bmpy_encode.send_encoded(client, calls)
+#
+# TableEncoder.entries builds the structs instead, for bmpy_pipeline.add_entries
+# or any other use of the generated client.
+#
+
+import struct
+
+from thrift.transport import TTransport
+
+from bm_runtime.standard.ttypes import *
+from bmpy_pipeline import Pipeline
+
+# Fills the columns of the request buffer with one copy per column when
+# installed; otherwise requests are joined from their pieces
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MATCH_TYPES = {
+    "exact": BmMatchParamType.EXACT,
+    "lpm": BmMatchParamType.LPM,
+    "ternary": BmMatchParamType.TERNARY,
+    "valid": BmMatchParamType.VALID,
+    "range": BmMatchParamType.RANGE,
+    # bmv2 implements optional match as ternary
+    "optional": BmMatchParamType.TERNARY,
+}
+
+
+def nbytes(bitwidth):
+    return (bitwidth + 7) // 8
+
+
+def _is_array(values):
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def _check_fits(values, bitwidth):
+    if len(values) == 0:
+        return
+    if _is_array(values):
+        if values.min() < 0 or (bitwidth < 64 and (values >> bitwidth).any()):
+            raise ValueError("Value doesn't fit in {} bits".format(bitwidth))
+    elif min(values) < 0 or max(values) >> bitwidth:
+        raise ValueError("Value doesn't fit in {} bits".format(bitwidth))
+
+
+def _check_lengths(*columns):
+    if len(set(len(column) for column in columns)) > 1:
+        raise ValueError("Columns differ in length")
+
+
+def encode_column(values, bitwidth):
+    """Big-endian byte strings of (bitwidth + 7) // 8 bytes of values, a
+    list or NumPy array of non-negative integers. Raises ValueError if one
+    doesn't fit in bitwidth bits."""
+    _check_fits(values, bitwidth)
+    width = nbytes(bitwidth)
+    if _is_array(values):
+        values = values.tolist()
+    return [v.to_bytes(width, "big") for v in values]
+
+
+def encode_ipv4(addresses):
+    return encode_column(addresses, 32)
+
+
+def encode_mac(macs):
+    return encode_column(macs, 48)
+
+
+def _column_matrix(values, width):
+    """(len(values), width) array of the big-endian bytes of values."""
+    if width <= 8:
+        array = numpy.asarray(values, dtype=numpy.uint64)
+        return array.astype(">u8").view(numpy.uint8).reshape(-1, 8)[
+            :, 8 - width:]
+    return numpy.frombuffer(
+        b"".join(encode_column(values, width * 8)), numpy.uint8).reshape(
+            -1, width)
+
+
+def field_bitwidths(config):
+    """(header instance, field) -> bitwidth of a parsed JSON config."""
+    header_types = {t["name"]: t for t in config.get("header_types", [])}
+    widths = {}
+    for header in config.get("headers", []):
+        header_type = header_types.get(header.get("header_type"), {})
+        for field in header_type.get("fields", []):
+            widths[(header["name"], field[0])] = field[1]
+    return widths
+
+
+def find_table(config, table_name):
+    for pipeline in config.get("pipelines", []):
+        for table in pipeline.get("tables", []):
+            if table["name"] == table_name:
+                return table
+    raise KeyError("No table {} in the config".format(table_name))
+
+
+def encode_request(client, method, *args):
+    """Bytes client would send for a call to method."""
+    buf = TTransport.TMemoryBuffer()
+    oprot = client._oprot
+    trans = oprot.trans
+    oprot.trans = buf
+    try:
+        getattr(client, "send_" + method)(*args)
+    finally:
+        oprot.trans = trans
+    return buf.getvalue()
+
+
+class EncodedCalls(object):
+    """count calls to method, encoded back to back in data."""
+
+    def __init__(self, method, data, count):
+        self.method = method
+        self.data = data
+        self.count = count
+        self.size = len(data) // count if count else 0
+
+    def __len__(self):
+        return self.count
+
+
+def send_encoded(client, calls, window=128, on_result=None):
+    """Sends EncodedCalls through a Pipeline and returns their
+    PipelinedCalls, whose result is the entry handle for
+    encode_add_entries."""
+    # half a window at a time, so that replies are read while requests are
+    # still in flight
+    step = max(1, window // 2)
+    view = memoryview(calls.data)
+    with Pipeline(client, window, on_result) as pipeline:
+        for start in range(0, calls.count, step):
+            count = min(step, calls.count - start)
+            pipeline.call_encoded(
+                calls.method,
+                view[start * calls.size:(start + count) * calls.size], count)
+    return pipeline.calls
+
+
+class TableEncoder(object):
+    """Encodes the entries of a table.
+
+    key is the [(match type name, bitwidth), ...] of the fields of the key
+    and actions maps action names to the bitwidths of their parameters, as
+    found in the JSON config by from_config.
+
+    Key columns hold one item per field of the key: a column of values for
+    exact fields, of booleans for valid fields, and a pair of columns for
+    the other fields: (values, prefix lengths) for LPM, (values, masks) for
+    ternary, (starts, ends) for range. Data columns hold the values of each
+    parameter of the action."""
+
+    def __init__(self, key, actions):
+        self.key = [(MATCH_TYPES[match_type], bitwidth)
+                    for match_type, bitwidth in key]
+        self.actions = actions
+
+    @classmethod
+    def from_config(cls, config, table_name):
+        """config is the parsed JSON config, e.g. from
+        bmpy_utils.get_parsed_json_config."""
+        table = find_table(config, table_name)
+        widths = field_bitwidths(config)
+        key = []
+        for field in table.get("key", []):
+            if field["match_type"] == "valid":
+                bitwidth = 1
+            else:
+                bitwidth = widths.get(tuple(field.get("target", ())))
+                if bitwidth is None:
+                    raise KeyError("Unknown width for key field {}".format(
+                        field.get("name", field.get("target"))))
+            key.append((field["match_type"], bitwidth))
+        actions = {}
+        names = set(table.get("actions", []))
+        for action in config.get("actions", []):
+            if action["name"] in names:
+                actions[action["name"]] = [p["bitwidth"] for p in
+                                           action.get("runtime_data", [])]
+        return cls(key, actions)
+
+    def action_bitwidths(self, action_name, data_columns):
+        bitwidths = self.actions.get(action_name)
+        if bitwidths is None:
+            raise KeyError("Unknown action {}".format(action_name))
+        if len(data_columns) != len(bitwidths):
+            raise ValueError("{} takes {} parameters, got {}".format(
+                action_name, len(bitwidths), len(data_columns)))
+        return bitwidths
+
+    def variable_fields(self, key_columns, action_name, data_columns):
+        """[(column, bitwidth, width in bytes)] of the fields which differ
+        between entries, in the order they are encoded."""
+        if len(key_columns) != len(self.key):
+            raise ValueError("Expected {} key columns, got {}".format(
+                len(self.key), len(key_columns)))
+        fields = []
+        for column, (match_type, bitwidth) in zip(key_columns, self.key):
+            if match_type == BmMatchParamType.EXACT:
+                fields.append((column, bitwidth, nbytes(bitwidth)))
+            elif match_type == BmMatchParamType.VALID:
+                fields.append(([int(bool(v)) for v in column], 1, 1))
+            elif match_type == BmMatchParamType.LPM:
+                values, prefix_lengths = column
+                fields.append((values, bitwidth, nbytes(bitwidth)))
+                # an i32
+                fields.append((prefix_lengths, 31, 4))
+            else:
+                first, second = column
+                fields.append((first, bitwidth, nbytes(bitwidth)))
+                fields.append((second, bitwidth, nbytes(bitwidth)))
+        for column, bitwidth in zip(
+                data_columns, self.action_bitwidths(action_name,
+                                                    data_columns)):
+            fields.append((column, bitwidth, nbytes(bitwidth)))
+        _check_lengths(*[column for column, _, _ in fields])
+        for column, bitwidth, _ in fields:
+            _check_fits(column, bitwidth)
+        return fields
+
+    def sample_key(self, fill):
+        """Match key with every variable byte set to fill."""
+        key = []
+        for match_type, bitwidth in self.key:
+            value = bytes([fill]) * nbytes(bitwidth)
+            if match_type == BmMatchParamType.EXACT:
+                param = BmMatchParam(type=match_type,
+                                     exact=BmMatchParamExact(key=value))
+            elif match_type == BmMatchParamType.VALID:
+                param = BmMatchParam(type=match_type,
+                                     valid=BmMatchParamValid(key=bool(fill)))
+            elif match_type == BmMatchParamType.LPM:
+                param = BmMatchParam(type=match_type, lpm=BmMatchParamLPM(
+                    key=value, prefix_length=-1 if fill else 0))
+            elif match_type == BmMatchParamType.TERNARY:
+                param = BmMatchParam(type=match_type, ternary=BmMatchParamTernary(
+                    key=value, mask=value))
+            else:
+                param = BmMatchParam(type=match_type, range=BmMatchParamRange(
+                    start=value, end_=value))
+            key.append(param)
+        return key
+
+    def template(self, client, table_name, action_name, options, cxt_id):
+        """(request with zeroes in its variable fields, [offset of each
+        variable field]), found by comparing two requests whose variable
+        bytes are all zeroes and all ones."""
+        requests = []
+        for fill in (0x00, 0xff):
+            data = [bytes([fill]) * nbytes(bitwidth)
+                    for bitwidth in self.actions[action_name]]
+            requests.append(encode_request(
+                client, "bm_mt_add_entry", cxt_id, table_name,
+                self.sample_key(fill), action_name, data, options))
+        zeroes, ones = requests
+        assert len(zeroes) == len(ones)
+        runs = []
+        for i, (a, b) in enumerate(zip(zeroes, ones)):
+            if a != b:
+                if runs and runs[-1][0] + runs[-1][1] == i:
+                    runs[-1][1] += 1
+                else:
+                    runs.append([i, 1])
+        return zeroes, runs
+
+    def encode_add_entries(self, client, table_name, action_name,
+                           key_columns, data_columns, options=None,
+                           cxt_id=0):
+        """EncodedCalls of bm_mt_add_entry for the entries, as client would
+        send them."""
+        fields = self.variable_fields(key_columns, action_name, data_columns)
+        options = options or BmAddEntryOptions()
+        template, runs = self.template(client, table_name, action_name,
+                                       options, cxt_id)
+        if [width for _, width in runs] != [w for _, _, w in fields]:
+            raise ValueError("Unexpected encoding of bm_mt_add_entry")
+        count = len(fields[0][0]) if fields else 0
+        if count == 0:
+            return EncodedCalls("bm_mt_add_entry", b"", 0)
+        if numpy is not None:
+            requests = numpy.empty((count, len(template)), numpy.uint8)
+            requests[:] = numpy.frombuffer(template, numpy.uint8)
+            for (offset, width), (column, _, _) in zip(runs, fields):
+                requests[:, offset:offset + width] = _column_matrix(column,
+                                                                    width)
+            data = requests.tobytes()
+        else:
+            columns = [encode_column(column, width * 8)
+                       for column, _, width in fields]
+            constants = []
+            end = 0
+            for offset, width in runs:
+                constants.append(template[end:offset])
+                end = offset + width
+            tail = template[end:]
+            pieces = []
+            append = pieces.append
+            for values in zip(*columns):
+                for constant, value in zip(constants, values):
+                    append(constant)
+                    append(value)
+                append(tail)
+            data = b"".join(pieces)
+        return EncodedCalls("bm_mt_add_entry", data, count)
+
+    def match_keys(self, key_columns):
+        """Match keys of the entries, as lists of BmMatchParam."""
+        if len(key_columns) != len(self.key):
+            raise ValueError("Expected {} key columns, got {}".format(
+                len(self.key), len(key_columns)))
+        params = []
+        for column, (match_type, bitwidth) in zip(key_columns, self.key):
+            if match_type == BmMatchParamType.EXACT:
+                params.append([
+                    BmMatchParam(type=match_type,
+                                 exact=BmMatchParamExact(key=v))
+                    for v in encode_column(column, bitwidth)])
+            elif match_type == BmMatchParamType.VALID:
+                params.append([
+                    BmMatchParam(type=match_type,
+                                 valid=BmMatchParamValid(key=bool(v)))
+                    for v in column])
+            elif match_type == BmMatchParamType.LPM:
+                values, prefix_lengths = column
+                _check_lengths(values, prefix_lengths)
+                if _is_array(prefix_lengths):
+                    prefix_lengths = prefix_lengths.tolist()
+                params.append([
+                    BmMatchParam(type=match_type,
+                                 lpm=BmMatchParamLPM(key=v, prefix_length=p))
+                    for v, p in zip(encode_column(values, bitwidth),
+                                    prefix_lengths)])
+            elif match_type == BmMatchParamType.TERNARY:
+                values, masks = column
+                _check_lengths(values, masks)
+                params.append([
+                    BmMatchParam(type=match_type,
+                                 ternary=BmMatchParamTernary(key=v, mask=m))
+                    for v, m in zip(encode_column(values, bitwidth),
+                                    encode_column(masks, bitwidth))])
+            else:
+                starts, ends = column
+                _check_lengths(starts, ends)
+                params.append([
+                    BmMatchParam(type=match_type,
+                                 range=BmMatchParamRange(start=s, end_=e))
+                    for s, e in zip(encode_column(starts, bitwidth),
+                                    encode_column(ends, bitwidth))])
+        _check_lengths(*params)
+        return [list(key) for key in zip(*params)]
+
+    def action_data(self, action_name, data_columns):
+        """Action data of the entries, as lists of byte strings."""
+        bitwidths = self.action_bitwidths(action_name, data_columns)
+        _check_lengths(*data_columns)
+        encoded = [encode_column(column, bitwidth)
+                   for column, bitwidth in zip(data_columns, bitwidths)]
+        return [list(data) for data in zip(*encoded)]
+
+    def entries(self, action_name, key_columns, data_columns, options=None):
+        """(match_key, action_name, action_data, options) of the entries,
+        for bmpy_pipeline.add_entries."""
+        keys = self.match_keys(key_columns)
+        if data_columns:
+            data = self.action_data(action_name, data_columns)
+        else:
+            self.action_bitwidths(action_name, data_columns)
+            data = [[] for _ in keys]
+        _check_lengths(keys, data)
+        options = options or BmAddEntryOptions()
+        return [(key, action_name, d, options) for key, d in zip(keys, data)]
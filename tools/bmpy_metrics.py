@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+#
+# Per-RPC instrumentation of the generated Thrift clients: call and error
+# counts, latency histograms and bytes sent and received per method, dumpable
+# as JSON or in the Prometheus text format.
+#
+#   stats = RpcStats()
+#   client = instrument(bmpy_utils.thrift_connect_standard(ip, port), stats)
+#   ...
+#   stats.dump_json(sys.stdout)
+#
+# instrument() returns the client itself when stats is None, so leaving
+# instrumentation off costs nothing.
+#
+
+import bisect
+import json
+import time
+
+from thrift import Thrift
+from thrift.transport import TTransport
+
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"),
+)
+
+
+class MethodStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, elapsed, sent, received, error):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.bytes_sent += sent
+        self.bytes_received += received
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_time": self.total_time,
+            "mean_time": self.total_time / self.calls if self.calls else 0.0,
+            "max_time": self.max_time,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_buckets": [
+                ["+Inf" if bound == float("inf") else bound, count]
+                for bound, count in zip(LATENCY_BUCKETS, self.buckets)],
+        }
+
+
+class RpcStats(object):
+    """Statistics of the calls made through instrumented clients, keyed by
+    (service, method). Setting enabled to False stops recording without
+    unwrapping the clients."""
+
+    def __init__(self):
+        self.enabled = True
+        self.methods = {}
+
+    def get(self, service, method):
+        key = (service, method)
+        stats = self.methods.get(key)
+        if stats is None:
+            stats = self.methods[key] = MethodStats()
+        return stats
+
+    def reset(self):
+        self.methods = {}
+
+    def to_dict(self):
+        result = {}
+        for (service, method), stats in sorted(self.methods.items()):
+            result.setdefault(service, {})[method] = stats.to_dict()
+        return result
+
+    def dump_json(self, out, indent=2):
+        json.dump(self.to_dict(), out, indent=indent, sort_keys=True)
+        out.write("\n")
+
+    def prometheus_text(self, prefix="bmpy_rpc"):
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, type_, help_):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, type_))
+
+        items = sorted(self.methods.items())
+        for name, attr, help_ in (
+                ("calls_total", "calls", "Number of calls"),
+                ("errors_total", "errors", "Number of calls which raised"),
+                ("sent_bytes_total", "bytes_sent", "Bytes of requests"),
+                ("received_bytes_total", "bytes_received",
+                 "Bytes of replies")):
+            header(name, "counter", help_)
+            for (service, method), stats in items:
+                lines.append('{}_{}{{service="{}",method="{}"}} {}'.format(
+                    prefix, name, service, method, getattr(stats, attr)))
+        header("latency_seconds", "histogram", "Latency of calls")
+        for (service, method), stats in items:
+            labels = 'service="{}",method="{}"'.format(service, method)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append('{}_latency_seconds_bucket{{{},le="{}"}} {}'.format(
+                    prefix, labels, le, cumulative))
+            lines.append("{}_latency_seconds_sum{{{}}} {}".format(
+                prefix, labels, stats.total_time))
+            lines.append("{}_latency_seconds_count{{{}}} {}".format(
+                prefix, labels, stats.calls))
+        return "\n".join(lines) + "\n"
+
+
+class CountingTransport(TTransport.TTransportBase):
+    """Counts the bytes going through a socket transport."""
+
+    def __init__(self, trans):
+        self.trans = trans
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def isOpen(self):
+        return self.trans.isOpen()
+
+    def open(self):
+        return self.trans.open()
+
+    def close(self):
+        return self.trans.close()
+
+    def read(self, sz):
+        buf = self.trans.read(sz)
+        self.bytes_read += len(buf)
+        return buf
+
+    def write(self, buf):
+        self.bytes_written += len(buf)
+        self.trans.write(buf)
+
+    def flush(self):
+        self.trans.flush()
+
+
+def counting_transport(client):
+    """Installs a CountingTransport under the buffered transport of client,
+    or returns None if the client doesn't use a TBufferedTransport. Bytes
+    are counted below the buffer, so that fastbinary decoding, which reads
+    the buffer directly, is accounted for too."""
+    trans = client._oprot.trans
+    if not isinstance(trans, TTransport.TBufferedTransport):
+        return None
+    # TBufferedTransport keeps the transport it wraps in a private attribute
+    inner = trans._TBufferedTransport__trans
+    if not isinstance(inner, CountingTransport):
+        inner = trans._TBufferedTransport__trans = CountingTransport(inner)
+    return inner
+
+
+class InstrumentedClient(object):
+    """Forwards calls to client and records them in stats. Clients sharing
+    a connection (several services multiplexed on one socket) share the
+    byte counters, which works since calls on a connection don't overlap."""
+
+    def __init__(self, client, stats, service=None):
+        self.client = client
+        self.stats = stats
+        self.service = service or type(client).__module__.rsplit(".", 1)[-1]
+        self.counter = counting_transport(client)
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not name.startswith("bm_") or not callable(attr):
+            return attr
+        stats = self.stats
+        counter = self.counter
+        service = self.service
+
+        def method(*args):
+            if not stats.enabled:
+                return attr(*args)
+            if counter is not None:
+                sent, received = counter.bytes_written, counter.bytes_read
+            error = False
+            start = time.perf_counter()
+            try:
+                return attr(*args)
+            except Thrift.TException:
+                error = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                if counter is not None:
+                    sent = counter.bytes_written - sent
+                    received = counter.bytes_read - received
+                else:
+                    sent = received = 0
+                stats.get(service, name).record(elapsed, sent, received,
+                                                error)
+        method.__name__ = name
+        # cached on the instance, __getattr__ is only called once per method
+        setattr(self, name, method)
+        return method
+
+
+def instrument(client, stats, service=None):
+    if stats is None:
+        return client
+    return InstrumentedClient(client, stats, service)
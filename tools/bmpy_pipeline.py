@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+#
+# Pipelined calls over the generated Thrift clients.
+#
+# The generated clients split every call into send_<method> and
+# recv_<method>. bmv2 answers the requests of a connection in order, so up to
+# `window` requests can be sent before reading the oldest reply, and bulk
+# operations are bound by bandwidth instead of one round trip per call.
+#
+
+import collections
+
+from thrift import Thrift
+from thrift.transport import TTransport
+
+
+class CorkedTransport(TTransport.TTransportBase):
+    """Lets the send_* methods write without flushing after every request;
+    the requests are kept until uncork(), which the pipeline calls before it
+    waits for a reply, so that a request which failed to encode halfway can
+    be discarded. Reads go straight to the wrapped transport, since the
+    generated clients use the same protocol for both directions."""
+
+    def __init__(self, trans):
+        self.trans = trans
+        self.wbuf = bytearray()
+
+    def isOpen(self):
+        return self.trans.isOpen()
+
+    def read(self, sz):
+        return self.trans.read(sz)
+
+    def write(self, buf):
+        self.wbuf += buf
+
+    def flush(self):
+        pass
+
+    def discard(self, mark):
+        """Drops what was written after len(wbuf) was mark."""
+        del self.wbuf[mark:]
+
+    def uncork(self):
+        if self.wbuf:
+            self.trans.write(self.wbuf)
+            self.wbuf = bytearray()
+        self.trans.flush()
+
+
+class CorkedCReadableTransport(CorkedTransport, TTransport.CReadableTransport):
+    """Keeps the fastbinary decoding path of a CReadableTransport."""
+
+    @property
+    def cstringio_buf(self):
+        return self.trans.cstringio_buf
+
+    def cstringio_refill(self, partialread, reqlen):
+        return self.trans.cstringio_refill(partialread, reqlen)
+
+
+def cork(trans):
+    if isinstance(trans, TTransport.CReadableTransport):
+        return CorkedCReadableTransport(trans)
+    return CorkedTransport(trans)
+
+
+class PipelinedCall(object):
+    """A request sent through a Pipeline. Once done, either result or error
+    (the exception raised by the switch, e.g. InvalidTableOperation) is set.
+    """
+
+    def __init__(self, index, name, args):
+        self.index = index
+        self.name = name
+        self.args = args
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def get(self):
+        assert self.done
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def __repr__(self):
+        return "PipelinedCall({}, {}, result={!r}, error={!r})".format(
+            self.index, self.name, self.result, self.error)
+
+
+class Pipeline(object):
+    """Sends calls on client while at most window of them are waiting for
+    their reply. Replies are matched to their calls in order; on_result, if
+    given, is called with each call as it completes. Transport errors are
+    raised, since they leave the stream in an unknown state.
+
+        with Pipeline(client, window=256) as pipeline:
+            for key, data in routes:
+                pipeline.call("bm_mt_add_entry", 0, "MyIngress.ipv4_lpm",
+                              key, "MyIngress.ipv4_forward", data, options)
+        failed = [c for c in pipeline.calls if c.error is not None]
+    """
+
+    def __init__(self, client, window=128, on_result=None, keep_calls=True):
+        assert window > 0
+        self.client = client
+        self.window = window
+        self.on_result = on_result
+        self.keep_calls = keep_calls
+        self.calls = []
+        self.inflight = collections.deque()
+        self.nb_calls = 0
+        self.trans = None
+        self.corked = None
+        self.unflushed = False
+
+    def __enter__(self):
+        self.trans = self.client._oprot.trans
+        self.corked = self.client._oprot.trans = cork(self.trans)
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                self.drain()
+        finally:
+            self.client._oprot.trans = self.trans
+
+    def call(self, name, *args):
+        assert self.trans is not None, "Pipeline used outside of a with block"
+        if len(self.inflight) >= self.window:
+            self.recv_one()
+        mark = len(self.corked.wbuf)
+        try:
+            getattr(self.client, "send_" + name)(*args)
+        except Exception:
+            # e.g. an argument of the wrong type: the message header may
+            # already be written, and would corrupt the stream
+            self.corked.discard(mark)
+            raise
+        self.unflushed = True
+        call = PipelinedCall(self.nb_calls, name, args)
+        self.nb_calls += 1
+        self.inflight.append(call)
+        if self.keep_calls:
+            self.calls.append(call)
+        return call
+
+    def call_encoded(self, name, data, count=1):
+        """Sends count calls to name already encoded in data, e.g. by
+        bmpy_encode, for the protocol of client. Returns their
+        PipelinedCalls, whose args are empty."""
+        assert self.trans is not None, "Pipeline used outside of a with block"
+        assert count <= self.window
+        while len(self.inflight) + count > self.window:
+            self.recv_one()
+        self.corked.write(data)
+        self.unflushed = True
+        calls = []
+        for _ in range(count):
+            call = PipelinedCall(self.nb_calls, name, ())
+            self.nb_calls += 1
+            self.inflight.append(call)
+            calls.append(call)
+        if self.keep_calls:
+            self.calls.extend(calls)
+        return calls
+
+    def flush(self):
+        if self.unflushed:
+            self.corked.uncork()
+            self.unflushed = False
+
+    def recv_one(self):
+        self.flush()
+        call = self.inflight.popleft()
+        try:
+            call.result = getattr(self.client, "recv_" + call.name)()
+        except TTransport.TTransportException:
+            raise
+        except Thrift.TException as e:
+            call.error = e
+        call.done = True
+        if self.on_result is not None:
+            self.on_result(call)
+        return call
+
+    def drain(self):
+        """Waits for the replies of all the calls sent so far."""
+        while self.inflight:
+            self.recv_one()
+
+
+def add_entries(client, table_name, entries, window=128, cxt_id=0):
+    """Adds (match_key, action_name, action_data, options) entries to a table
+    through a Pipeline and returns the PipelinedCall of each entry, whose
+    result is the entry handle."""
+    with Pipeline(client, window) as pipeline:
+        for match_key, action_name, action_data, options in entries:
+            pipeline.call("bm_mt_add_entry", cxt_id, table_name, match_key,
+                          action_name, action_data, options)
+    return pipeline.calls
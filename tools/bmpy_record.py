@@ -0,0 +1,626 @@
+#!/usr/bin/env python3
+
+#
+# Record and replay of Thrift control sessions, to benchmark controller
+# versions against the exact same RPCs.
+#
+#   recorder = bmpy_record.Recorder.open("session.jsonl")
+#   client = bmpy_utils.thrift_connect_standard(ip, port, recorder=recorder)
+#   ...
+#   recorder.close()
+#
+# logs every request and reply going through the socket, one message per
+# line with its connection, direction and time since the recording started.
+# The recording can then be replayed:
+#
+#   ./tools/bmpy_record.py replay session.jsonl --thrift-port 9090 --speed 1
+#
+# sends the recorded requests to a switch (or bm_mock_switch), at their
+# original pace or as fast as possible (--speed 0, the default), keeping the
+# order of requests and replies of each connection, and prints the install
+# rate and the latencies of the replies;
+#
+#   ./tools/bmpy_record.py serve session.jsonl --thrift-port 9090
+#
+# acts as the switch instead, answering each request with its recorded
+# reply, to benchmark a controller without a switch.
+#
+# Messages are split from the byte stream assuming the binary protocol used
+# by bmv2.
+#
+
+import argparse
+import base64
+import collections
+import json
+import struct
+import sys
+import threading
+import time
+
+from thrift.Thrift import TApplicationException, TMessageType, TType
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import TSocket
+from thrift.transport import TTransport
+
+from bm_mock_switch import ServerSocket
+from bmpy_metrics import RpcStats
+
+FORMAT = "bmpy-record"
+VERSION = 1
+
+_I16 = struct.Struct("!h")
+_I32 = struct.Struct("!i")
+
+_FIXED_SIZES = {
+    TType.BOOL: 1, TType.BYTE: 1, TType.DOUBLE: 8,
+    TType.I16: 2, TType.I32: 4, TType.I64: 8,
+}
+
+
+Message = collections.namedtuple("Message", "name type end body")
+
+
+def is_error(reply):
+    """Whether a recorded reply is an exception, either a
+    TApplicationException or one declared by the method (e.g.
+    InvalidTableOperation), whose field id isn't 0. A reply which can't be
+    parsed, e.g. one truncated by a closed connection, counts as an
+    error."""
+    messages = MessageSplitter().feed(reply)
+    if not messages:
+        return True
+    message = messages[0][0]
+    if message.type == TMessageType.EXCEPTION:
+        return True
+    if reply[message.body] == TType.STOP:
+        return False
+    return _I16.unpack_from(reply, message.body + 1)[0] != 0
+
+
+def split_name(name):
+    """(service, method) of a message name; requests on a multiplexed
+    connection are prefixed with their service, replies aren't."""
+    service, _, method = name.rpartition(":")
+    return service, method
+
+
+class MessageSplitter(object):
+    """Accumulates the bytes of one direction of a connection and returns
+    the messages they complete. The message being received is parsed
+    incrementally, so that a large reply arriving in small reads is parsed
+    once rather than from its start on every read."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        # position in buf up to which the current message is parsed
+        self.pos = 0
+        self.parser = None
+
+    def feed(self, data):
+        self.buf += data
+        messages = []
+        while True:
+            if self.parser is None:
+                self.parser = self._parse_message()
+            try:
+                next(self.parser)
+            except StopIteration as e:
+                message = e.value
+                messages.append((message, bytes(self.buf[:message.end])))
+                del self.buf[:message.end]
+                self.pos = 0
+                self.parser = None
+            else:
+                # waiting for more bytes
+                break
+        return messages
+
+    def _parse_message(self):
+        """Generator parsing the message at the start of buf from pos,
+        which yields whenever it needs more bytes and returns the
+        Message."""
+        buf = self.buf
+        while len(buf) < 8:
+            yield
+        version, n = struct.unpack_from("!ii", buf)
+        if version & TBinaryProtocol.TBinaryProtocol.VERSION_MASK != \
+                TBinaryProtocol.TBinaryProtocol.VERSION_1:
+            raise ValueError("Not a strict binary protocol message")
+        # + seqid
+        body = self.pos = 12 + n
+        while len(buf) < body:
+            yield
+        name = bytes(buf[8:8 + n]).decode("utf-8")
+        yield from self._parse_value(TType.STRUCT)
+        while len(buf) < self.pos:
+            yield
+        return Message(name, version & 0xff, self.pos, body)
+
+    def _parse_value(self, ttype):
+        # Fixed-size values and string contents are skipped without waiting
+        # for their bytes: only the bytes which are read are waited for.
+        buf = self.buf
+        size = _FIXED_SIZES.get(ttype)
+        if size is not None:
+            self.pos += size
+        elif ttype == TType.STRING:
+            while len(buf) < self.pos + 4:
+                yield
+            self.pos += 4 + _I32.unpack_from(buf, self.pos)[0]
+        elif ttype == TType.STRUCT:
+            while True:
+                while len(buf) <= self.pos:
+                    yield
+                ftype = buf[self.pos]
+                if ftype == TType.STOP:
+                    self.pos += 1
+                    break
+                self.pos += 3
+                yield from self._parse_value(ftype)
+        elif ttype == TType.MAP:
+            while len(buf) < self.pos + 6:
+                yield
+            ktype, vtype = buf[self.pos], buf[self.pos + 1]
+            n = _I32.unpack_from(buf, self.pos + 2)[0]
+            self.pos += 6
+            for _ in range(n):
+                yield from self._parse_value(ktype)
+                yield from self._parse_value(vtype)
+        elif ttype in (TType.SET, TType.LIST):
+            while len(buf) < self.pos + 5:
+                yield
+            etype = buf[self.pos]
+            n = _I32.unpack_from(buf, self.pos + 1)[0]
+            self.pos += 5
+            size = _FIXED_SIZES.get(etype)
+            if size is not None:
+                self.pos += n * size
+            else:
+                for _ in range(n):
+                    yield from self._parse_value(etype)
+        else:
+            raise ValueError("Unknown Thrift type {}".format(ttype))
+
+
+class RecordingTransport(TTransport.TTransportBase):
+    """Records the messages going through a socket transport. Like
+    bmpy_metrics.CountingTransport, it goes under the buffered transport,
+    so that fastbinary decoding still reads the buffer directly."""
+
+    def __init__(self, trans, recorder, conn):
+        self.trans = trans
+        self.recorder = recorder
+        self.conn = conn
+        self.sent = MessageSplitter()
+        self.received = MessageSplitter()
+
+    def isOpen(self):
+        return self.trans.isOpen()
+
+    def open(self):
+        return self.trans.open()
+
+    def close(self):
+        return self.trans.close()
+
+    def read(self, sz):
+        buf = self.trans.read(sz)
+        for message, data in self.received.feed(buf):
+            self.recorder.record(self.conn, "reply", message.name, data)
+        return buf
+
+    def write(self, buf):
+        self.trans.write(buf)
+        for message, data in self.sent.feed(buf):
+            self.recorder.record(self.conn, "call", message.name, data)
+
+    def flush(self):
+        self.trans.flush()
+
+
+class Recorder(object):
+    """Writes the messages of the connections it wraps to out, a text file,
+    one JSON object per line after a header line:
+
+        {"t": 0.0012, "conn": 0, "dir": "call",
+         "name": "standard:bm_mt_add_entry", "data": "<base64>"}
+
+    t is in seconds since the recorder was created. Connections can be
+    used from different threads."""
+
+    def __init__(self, out):
+        self.out = out
+        self.lock = threading.Lock()
+        self.nb_conns = 0
+        self.nb_messages = 0
+        self.start = time.perf_counter()
+        self.out.write(json.dumps({"format": FORMAT, "version": VERSION,
+                                   "time": time.time()}) + "\n")
+
+    @classmethod
+    def open(cls, path):
+        return cls(open(path, "w"))
+
+    def wrap(self, trans):
+        """RecordingTransport around trans, e.g. the TSocket of a
+        connection, as a new connection of the recording."""
+        with self.lock:
+            conn = self.nb_conns
+            self.nb_conns += 1
+        return RecordingTransport(trans, self, conn)
+
+    def record(self, conn, direction, name, data):
+        line = json.dumps({
+            "t": round(time.perf_counter() - self.start, 6), "conn": conn,
+            "dir": direction, "name": name,
+            "data": base64.b64encode(data).decode("ascii")})
+        with self.lock:
+            self.out.write(line + "\n")
+            self.nb_messages += 1
+
+    def close(self):
+        with self.lock:
+            self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def record_client(client, recorder):
+    """Installs a RecordingTransport under the buffered transport of an
+    existing client, or returns None if the client doesn't use a
+    TBufferedTransport. Clients sharing the connection are recorded too."""
+    trans = client._oprot.trans
+    if not isinstance(trans, TTransport.TBufferedTransport):
+        return None
+    # TBufferedTransport keeps the transport it wraps in a private attribute
+    inner = trans._TBufferedTransport__trans
+    if not isinstance(inner, RecordingTransport):
+        inner = trans._TBufferedTransport__trans = recorder.wrap(inner)
+    return inner
+
+
+Event = collections.namedtuple("Event", "t conn dir name data")
+
+
+class Recording(object):
+    """Messages of a recording, in the order they were recorded, and by
+    connection."""
+
+    def __init__(self, events, time_=None):
+        self.events = events
+        self.time = time_
+        self.connections = collections.OrderedDict()
+        for event in events:
+            self.connections.setdefault(event.conn, []).append(event)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            header = json.loads(f.readline())
+            if header.get("format") != FORMAT:
+                raise ValueError("{} is not a recording".format(path))
+            if header.get("version") != VERSION:
+                raise ValueError("Unsupported recording version {}".format(
+                    header.get("version")))
+            events = []
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                events.append(Event(record["t"], record["conn"],
+                                    record["dir"], record["name"],
+                                    base64.b64decode(record["data"])))
+        return cls(events, header.get("time"))
+
+    def duration(self):
+        return self.events[-1].t - self.events[0].t if self.events else 0.0
+
+    def summary(self):
+        """Number of calls by method and duration of the recording."""
+        calls = collections.Counter(
+            event.name for event in self.events if event.dir == "call")
+        return {"connections": len(self.connections),
+                "duration": round(self.duration(), 6),
+                "calls": sum(calls.values()),
+                "methods": dict(sorted(calls.items()))}
+
+
+def _is_oneway(request):
+    return request[3] == TMessageType.ONEWAY
+
+
+class Pacer(object):
+    """Sleeps until the time of an event, scaled by 1 / speed, since
+    start; speed=None (or 0) doesn't wait."""
+
+    def __init__(self, speed, start, origin):
+        self.speed = speed
+        self.start = start
+        self.origin = origin
+
+    def delay(self, t):
+        if not self.speed:
+            return 0.0
+        return self.start + (t - self.origin) / self.speed - \
+            time.perf_counter()
+
+
+class ReplayResult(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = RpcStats()
+        self.calls = 0
+        self.mismatches = collections.Counter()
+        self.elapsed = 0.0
+        self.errors = []
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "elapsed": self.elapsed,
+            "calls_per_second": (self.calls / self.elapsed
+                                 if self.elapsed else 0.0),
+            "mismatched_replies": dict(self.mismatches),
+            "errors": self.errors,
+            "methods": self.stats.to_dict(),
+        }
+
+
+def _replay_connection(events, thrift_ip, thrift_port, pacer, check, result):
+    sock = TSocket.TSocket(thrift_ip, thrift_port)
+    trans = TTransport.TBufferedTransport(sock)
+    trans.open()
+    splitter = MessageSplitter()
+    replies = collections.deque()
+    # requests waiting for their reply: (event, time sent)
+    pending = collections.deque()
+    try:
+        for event in events:
+            if event.dir == "call":
+                # replies are read as soon as they arrive, so that the
+                # recorded latencies don't bound the measured ones
+                delay = pacer.delay(event.t)
+                if delay > 0:
+                    trans.flush()
+                    time.sleep(delay)
+                trans.write(event.data)
+                if not _is_oneway(event.data):
+                    pending.append((event, time.perf_counter()))
+                continue
+            trans.flush()
+            while not replies:
+                data = sock.read(65536)
+                if not data:
+                    raise TTransport.TTransportException(
+                        TTransport.TTransportException.END_OF_FILE,
+                        "Connection closed by the switch")
+                replies.extend(splitter.feed(data))
+            now = time.perf_counter()
+            _, reply = replies.popleft()
+            request, sent = pending.popleft()
+            service, method = split_name(request.name)
+            with result.lock:
+                result.calls += 1
+                result.stats.get(service, method).record(
+                    now - sent, len(request.data), len(reply),
+                    is_error(reply))
+                if check and reply != event.data:
+                    result.mismatches[method] += 1
+        trans.flush()
+    finally:
+        trans.close()
+
+
+def replay(recording, thrift_ip, thrift_port, speed=None, check=True):
+    """Sends the requests of recording to the switch at thrift_ip:port, each
+    recorded connection over its own connection and thread, and returns a
+    ReplayResult. Requests and replies of a connection are sent and read in
+    the recorded order, so that pipelined requests stay pipelined. With
+    speed, requests are sent at the recorded times divided by speed; with
+    check, replies which differ from the recorded ones (e.g. other entry
+    handles) are counted by method."""
+    result = ReplayResult()
+    origin = recording.events[0].t if recording.events else 0.0
+    pacer = Pacer(speed, time.perf_counter(), origin)
+
+    def run(events):
+        try:
+            _replay_connection(events, thrift_ip, thrift_port, pacer, check,
+                               result)
+        except Exception as e:
+            with result.lock:
+                result.errors.append("connection {}: {}".format(
+                    events[0].conn, e))
+
+    threads = [threading.Thread(target=run, args=(events,), daemon=True)
+               for events in recording.connections.values()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - pacer.start
+    return result
+
+
+def _exception_reply(name, message):
+    buf = TTransport.TMemoryBuffer()
+    protocol = TBinaryProtocol.TBinaryProtocol(buf)
+    protocol.writeMessageBegin(split_name(name)[1], TMessageType.EXCEPTION, 0)
+    TApplicationException(TApplicationException.INTERNAL_ERROR,
+                          message).write(protocol)
+    protocol.writeMessageEnd()
+    return buf.getvalue()
+
+
+class ReplayServer(object):
+    """Serves the replies of recording: the n-th connection accepted gets
+    the replies of the n-th recorded connection, in order. A request which
+    isn't the next recorded one of its connection gets a
+    TApplicationException and is counted in mismatches. With speed, replies
+    are sent no earlier than their recorded time since the first request of
+    the connection, divided by speed."""
+
+    def __init__(self, recording, host="localhost", port=9090, speed=None):
+        self.recording = recording
+        self.speed = speed
+        self.server_socket = ServerSocket(host=host, port=port)
+        self.server_socket.listen()
+        self.port = self.server_socket.bound_port
+        self.lock = threading.Lock()
+        self.mismatches = 0
+        self.nb_conns = 0
+        self.thread = None
+
+    def exchanges(self, events):
+        """[(call, reply or None)] of the events of a connection."""
+        exchanges = []
+        pending = collections.deque()
+        for event in events:
+            if event.dir == "call":
+                exchange = [event, None]
+                exchanges.append(exchange)
+                if not _is_oneway(event.data):
+                    pending.append(exchange)
+            elif pending:
+                pending.popleft()[1] = event
+        return collections.deque(exchanges)
+
+    def handle(self, client, events):
+        exchanges = self.exchanges(events)
+        splitter = MessageSplitter()
+        pacer = None
+        try:
+            while True:
+                data = client.read(65536)
+                if not data:
+                    return
+                for message, request in splitter.feed(data):
+                    if exchanges and exchanges[0][0].name == message.name:
+                        call, reply = exchanges.popleft()
+                    else:
+                        with self.lock:
+                            self.mismatches += 1
+                        client.write(_exception_reply(
+                            message.name, "Not the recorded request"))
+                        continue
+                    if reply is None:
+                        continue
+                    if pacer is None:
+                        pacer = Pacer(self.speed, time.perf_counter(),
+                                      call.t)
+                    delay = pacer.delay(reply.t)
+                    if delay > 0:
+                        time.sleep(delay)
+                    client.write(reply.data)
+        except (TTransport.TTransportException, OSError):
+            pass
+        finally:
+            client.close()
+
+    def serve_forever(self):
+        connections = list(self.recording.connections.values())
+        while True:
+            try:
+                client = self.server_socket.accept()
+            except TTransport.TTransportException:
+                if self.server_socket.handle is None:
+                    return
+                raise
+            if not client:
+                continue
+            with self.lock:
+                n = self.nb_conns
+                self.nb_conns += 1
+            events = connections[n] if n < len(connections) else []
+            threading.Thread(target=self.handle, args=(client, events),
+                             daemon=True).start()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       name="ReplayServer", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server_socket.close()
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay of recorded Thrift sessions')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    info = subparsers.add_parser('info', help='Summary of a recording')
+    info.add_argument('recording', help='Recording file')
+
+    replay_parser = subparsers.add_parser(
+        'replay', help='Send the recorded requests to a switch')
+    replay_parser.add_argument('recording', help='Recording file')
+    replay_parser.add_argument('--thrift-port', help='Thrift server port',
+                               type=int, action="store", default=9090)
+    replay_parser.add_argument('--thrift-ip', help='Thrift IP address',
+                               type=str, action="store", default='localhost')
+    replay_parser.add_argument('--speed',
+                               help='Pace relative to the recording, '
+                               '0 for as fast as possible',
+                               type=float, action="store", default=0)
+    replay_parser.add_argument('--no-check', help="Don't compare the replies "
+                               'with the recorded ones',
+                               action="store_true", default=False)
+
+    serve = subparsers.add_parser(
+        'serve', help='Answer a controller with the recorded replies')
+    serve.add_argument('recording', help='Recording file')
+    serve.add_argument('--thrift-port', help='Thrift server port',
+                       type=int, action="store", default=9090)
+    serve.add_argument('--thrift-ip', help='Thrift IP address',
+                       type=str, action="store", default='localhost')
+    serve.add_argument('--speed', help='Pace relative to the recording, '
+                       '0 for as fast as possible',
+                       type=float, action="store", default=0)
+
+    args = parser.parse_args()
+    recording = Recording.load(args.recording)
+
+    if args.command == 'info':
+        json.dump(recording.summary(), sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0
+
+    if args.command == 'replay':
+        result = replay(recording, args.thrift_ip, args.thrift_port,
+                        args.speed, not args.no_check)
+        json.dump(result.to_dict(), sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+        return 1 if result.errors else 0
+
+    server = ReplayServer(recording, args.thrift_ip, args.thrift_port,
+                          args.speed)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if server.mismatches:
+            sys.stderr.write("{} requests weren't in the recording\n".format(
+                server.mismatches))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
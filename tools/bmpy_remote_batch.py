@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+#
+# Batch mode of the generated *-remote scripts: many calls over one
+# connection, instead of one process and one connection per call.
+#
+#   ./tools/bm_runtime/standard/Standard-remote -h localhost:9090 \
+#       -service standard -batch calls.txt
+#
+# Each line of the file (or of stdin, with "-" or no file) is a call, written
+# like the arguments of the script: the function name then its arguments,
+# split like a shell would, strings as is and everything else as a Python
+# expression over the types of the service.
+#
+#   bm_mt_get_num_entries 0 MyIngress.ipv4_lpm
+#   bm_mt_add_entry 0 MyIngress.ipv4_lpm "[BmMatchParam(type=BmMatchParamType.LPM, lpm=BmMatchParamLPM(b'\n\0\0\1', 32))]" MyIngress.drop [] None
+#
+# Blank lines and lines starting with # are skipped. One JSON object per call
+# is printed, in order, with either its "result" or its "error". With
+# --window N, up to N calls are sent before their replies are read (see
+# bmpy_pipeline).
+#
+
+import argparse
+import json
+import shlex
+import sys
+
+from thrift.Thrift import TType
+from thrift.transport import TTransport
+
+from bmpy_pipeline import Pipeline
+
+
+class BadCall(Exception):
+    pass
+
+
+def parse_call(service, line):
+    """(method, args) of a line, converted like the *-remote scripts do."""
+    try:
+        words = shlex.split(line)
+    except ValueError as e:
+        raise BadCall(str(e))
+    method, words = words[0], words[1:]
+    args_cls = getattr(service, method + "_args", None)
+    if args_cls is None or not hasattr(service.Client, method):
+        raise BadCall("Unrecognized method {}".format(method))
+    fields = [f for f in args_cls.thrift_spec if f is not None]
+    if len(words) != len(fields):
+        raise BadCall("{} requires {} args".format(method, len(fields)))
+    namespace = vars(sys.modules[args_cls.__module__])
+    args = []
+    for field, word in zip(fields, words):
+        if field[1] == TType.STRING and field[3] == "UTF8":
+            args.append(word)
+            continue
+        try:
+            args.append(eval(word, namespace))
+        except Exception as e:
+            raise BadCall("Bad value for {}: {}".format(field[2], e))
+    return method, args
+
+
+def to_json(value):
+    """JSON friendly form of a Thrift value, bytes being hex strings."""
+    if hasattr(value, "thrift_spec"):
+        return {f[2]: to_json(getattr(value, f[2], None))
+                for f in value.thrift_spec if f is not None}
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): to_json(v) for k, v in value.items()}
+    return value
+
+
+def error_to_json(error):
+    """The fields of error, plus the name of its error code, e.g.
+    {"type": "InvalidTableOperation", "code": 7,
+     "code_name": "INVALID_TABLE_NAME"}."""
+    result = {"type": error.__class__.__name__}
+    if hasattr(error, "thrift_spec"):
+        result.update(to_json(error))
+    else:
+        result["message"] = str(error)
+    code = getattr(error, "code", None)
+    if code is not None:
+        # Invalid<X>Operation -> <X>OperationErrorCode or <X>ErrorCode
+        name = error.__class__.__name__
+        if name.startswith("Invalid"):
+            name = name[len("Invalid"):]
+        namespace = sys.modules[error.__class__.__module__]
+        for enum_name in (name + "ErrorCode",
+                          name.replace("Operation", "") + "ErrorCode"):
+            enum = getattr(namespace, enum_name, None)
+            if enum is not None:
+                result["code_name"] = enum._VALUES_TO_NAMES.get(code)
+                break
+    return result
+
+
+CONNECTION_ERRORS = (TTransport.TTransportException, EOFError, OSError)
+
+
+def run_batch(client, service, lines, out=sys.stdout, window=1):
+    """Calls the lines on client and writes one JSON object per line to out.
+    Returns the number of failed calls."""
+    failures = [0]
+    # call.index -> line number
+    linenos = {}
+
+    def emit(record):
+        out.write(json.dumps(record) + "\n")
+
+    def on_result(call):
+        lineno = linenos.pop(call.index)
+        if call.error is not None:
+            failures[0] += 1
+            emit({"line": lineno, "method": call.name,
+                  "error": error_to_json(call.error)})
+        else:
+            emit({"line": lineno, "method": call.name,
+                  "result": to_json(call.result)})
+
+    with Pipeline(client, window, on_result, keep_calls=False) as pipeline:
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                method, args = parse_call(service, line)
+            except BadCall as e:
+                # after the replies of the previous calls, to keep the order
+                pipeline.drain()
+                failures[0] += 1
+                emit({"line": lineno, "error": {"type": "BadCall",
+                                                "message": str(e)}})
+                continue
+            linenos[pipeline.nb_calls] = lineno
+            try:
+                pipeline.call(method, *args)
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                # e.g. 'x' for an i32: the call can't be encoded and isn't
+                # sent, the calls before it are
+                del linenos[pipeline.nb_calls]
+                pipeline.drain()
+                failures[0] += 1
+                emit({"line": lineno, "method": method,
+                      "error": error_to_json(e)})
+    return failures[0]
+
+
+def main(client, service, argv):
+    """Entry point of the -batch option of the *-remote scripts; returns
+    their exit status, 1 if a call failed."""
+    parser = argparse.ArgumentParser(prog="-batch",
+                                     description="Batch of calls")
+    parser.add_argument('file', help='File of calls, one per line '
+                        '(default: stdin)', nargs='?', default='-')
+    parser.add_argument('--window', help='Calls sent ahead of their replies',
+                        type=int, action="store", default=1)
+    args = parser.parse_args(argv)
+
+    f = sys.stdin if args.file == '-' else open(args.file)
+    try:
+        failures = run_batch(client, service, f, sys.stdout, args.window)
+    except CONNECTION_ERRORS as e:
+        sys.stderr.write("Connection lost: {}\n".format(e))
+        return 2
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return 1 if failures else 0
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+#
+# Receiving large RPC results without materializing them the way the
+# generated clients do.
+#
+# bm_get_config and bm_serialize_state return one string which the generated
+# recv_* methods read through TBufferedTransport (one copy per socket read,
+# concatenated into another) and then decode to str (one more copy). The
+# functions below read the payload straight from the socket into a bytearray,
+# or stream it to a file through a fixed size buffer.
+#
+#   config = bmpy_stream.get_config_into(client)        # memoryview
+#   with open("state.bin", "wb") as f:
+#       bmpy_stream.serialize_state_to_file(client, f)
+#
+# iter_entries decodes the result of bm_mt_get_entries one entry at a time, as
+# the reply is read from the socket, instead of building the whole list.
+#
+#   for entry in bmpy_stream.iter_entries(client, 0, "MyIngress.ipv4_lpm"):
+#       ...
+#
+
+import json
+import socket
+
+from thrift.Thrift import TApplicationException, TMessageType, TType
+from thrift.transport import TTransport
+
+from bm_runtime.standard import ttypes
+
+
+CHUNK_SIZE = 1 << 20
+
+
+def _raw_transport(trans):
+    """Returns (buffered transport, transport it wraps), the second one being
+    None if trans isn't a TBufferedTransport."""
+    if isinstance(trans, TTransport.TBufferedTransport):
+        # TBufferedTransport keeps the transport it wraps in a private
+        # attribute
+        return trans, trans._TBufferedTransport__trans
+    return trans, None
+
+
+def _readinto(trans, raw, view):
+    """Fills view from trans, using what the buffered transport already read
+    from the socket first."""
+    pos = 0
+    if raw is not None:
+        pos = trans.cstringio_buf.readinto(view)
+        handle = getattr(raw, "handle", None)
+        # bmpy_utils.TimeoutSocket sets the time left before each read
+        if getattr(raw, "deadline", None) is not None:
+            handle = None
+        while pos < len(view):
+            if handle is not None:
+                try:
+                    n = handle.recv_into(view[pos:])
+                except (socket.timeout, TimeoutError):
+                    # like TSocket.read; the rest of the reply would be read
+                    # as the next one, so the connection is closed
+                    raw.close()
+                    raise TTransport.TTransportException(
+                        TTransport.TTransportException.TIMED_OUT,
+                        "read timeout")
+                except OSError as e:
+                    raw.close()
+                    raise TTransport.TTransportException(
+                        TTransport.TTransportException.UNKNOWN, str(e))
+            else:
+                chunk = raw.read(len(view) - pos)
+                n = len(chunk)
+                view[pos:pos + n] = chunk
+            if n == 0:
+                raw.close()
+                raise TTransport.TTransportException(
+                    TTransport.TTransportException.END_OF_FILE,
+                    "TSocket read 0 bytes")
+            pos += n
+    else:
+        while pos < len(view):
+            chunk = trans.read(len(view) - pos)
+            if not chunk:
+                raise TTransport.TTransportException(
+                    TTransport.TTransportException.END_OF_FILE,
+                    "Transport read 0 bytes")
+            view[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+
+
+def skip(iprot, ttype):
+    """TProtocolBase.skip, except that strings are read as binary: skip()
+    decodes them as UTF-8, which fails on match keys and action data."""
+    if ttype == TType.STRING:
+        iprot.readBinary()
+    elif ttype == TType.STRUCT:
+        iprot.readStructBegin()
+        while True:
+            _, ftype, _ = iprot.readFieldBegin()
+            if ftype == TType.STOP:
+                break
+            skip(iprot, ftype)
+            iprot.readFieldEnd()
+        iprot.readStructEnd()
+    elif ttype == TType.MAP:
+        ktype, vtype, size = iprot.readMapBegin()
+        for _ in range(size):
+            skip(iprot, ktype)
+            skip(iprot, vtype)
+        iprot.readMapEnd()
+    elif ttype == TType.SET:
+        etype, size = iprot.readSetBegin()
+        for _ in range(size):
+            skip(iprot, etype)
+        iprot.readSetEnd()
+    elif ttype == TType.LIST:
+        etype, size = iprot.readListBegin()
+        for _ in range(size):
+            skip(iprot, etype)
+        iprot.readListEnd()
+    else:
+        iprot.skip(ttype)
+
+
+def recv_binary_reply(client, method, sink):
+    """Reads the reply of method, which returns a string as field 0 of its
+    result, after client.send_<method> was called. sink(size) is called
+    with the length of the string and returns a writable memoryview of at
+    most size bytes to read into, then is called again for the rest until
+    size bytes were read. Returns size."""
+    iprot = client._iprot
+    fname, mtype, rseqid = iprot.readMessageBegin()
+    if mtype == TMessageType.EXCEPTION:
+        x = TApplicationException()
+        x.read(iprot)
+        iprot.readMessageEnd()
+        raise x
+    trans, raw = _raw_transport(iprot.trans)
+    size = None
+    iprot.readStructBegin()
+    while True:
+        _, ftype, fid = iprot.readFieldBegin()
+        if ftype == TType.STOP:
+            break
+        if fid == 0 and ftype == TType.STRING and size is None:
+            size = iprot.readI32()
+            remaining = size
+            while remaining:
+                view = sink(remaining)
+                _readinto(trans, raw, view)
+                remaining -= len(view)
+        else:
+            skip(iprot, ftype)
+        iprot.readFieldEnd()
+    iprot.readStructEnd()
+    iprot.readMessageEnd()
+    if size is None:
+        raise TApplicationException(TApplicationException.MISSING_RESULT,
+                                    "{} failed: unknown result".format(method))
+    return size
+
+
+def call_into(client, method, buf=None):
+    """Calls method and reads its result into buf, a bytearray which is
+    allocated if None or too small. Returns a memoryview of the result."""
+    getattr(client, "send_" + method)()
+    holder = [buf]
+
+    def sink(size):
+        if holder[0] is None or len(holder[0]) < size:
+            holder[0] = bytearray(size)
+        return memoryview(holder[0])[:size]
+    size = recv_binary_reply(client, method, sink)
+    if holder[0] is None:
+        holder[0] = bytearray()
+    return memoryview(holder[0])[:size]
+
+
+def call_to_file(client, method, f, chunk_size=CHUNK_SIZE):
+    """Calls method and writes its result to f, a binary file, through a
+    buffer of chunk_size bytes. Returns the number of bytes written."""
+    getattr(client, "send_" + method)()
+    buf = memoryview(bytearray(chunk_size))
+    state = {"pending": None}
+
+    def sink(remaining):
+        # writes the chunk read by the previous call before reusing buf
+        if state["pending"] is not None:
+            f.write(state["pending"])
+        state["pending"] = buf[:min(remaining, chunk_size)]
+        return state["pending"]
+    size = recv_binary_reply(client, method, sink)
+    if state["pending"] is not None:
+        f.write(state["pending"])
+    return size
+
+
+def get_config_into(client, buf=None):
+    return call_into(client, "bm_get_config", buf)
+
+
+def get_config_to_file(client, f, chunk_size=CHUNK_SIZE):
+    return call_to_file(client, "bm_get_config", f, chunk_size)
+
+
+def serialize_state_into(client, buf=None):
+    return call_into(client, "bm_serialize_state", buf)
+
+
+def serialize_state_to_file(client, f, chunk_size=CHUNK_SIZE):
+    return call_to_file(client, "bm_serialize_state", f, chunk_size)
+
+
+def load_json_config(client):
+    """Parsed JSON config of the switch."""
+    return json.loads(get_config_into(client).obj)
+
+
+def iter_entries(client, cxt_id, table_name, entry_cls=ttypes.BmMtEntry):
+    """Yields the entries of a table as they are decoded, entry_cls being
+    BmMtEntry or bmpy_compact.BmMtEntry. The client can't be used for other
+    calls until the iteration is over; if it is stopped early, the rest of
+    the reply is skipped without being decoded into entries. Raises
+    InvalidTableOperation like bm_mt_get_entries."""
+    client.send_bm_mt_get_entries(cxt_id, table_name)
+    iprot = client._iprot
+    fname, mtype, rseqid = iprot.readMessageBegin()
+    if mtype == TMessageType.EXCEPTION:
+        x = TApplicationException()
+        x.read(iprot)
+        iprot.readMessageEnd()
+        raise x
+    error = None
+    got_entries = False
+    iprot.readStructBegin()
+    while True:
+        _, ftype, fid = iprot.readFieldBegin()
+        if ftype == TType.STOP:
+            break
+        if fid == 0 and ftype == TType.LIST:
+            got_entries = True
+            etype, size = iprot.readListBegin()
+            for i in range(size):
+                entry = entry_cls()
+                entry.read(iprot)
+                try:
+                    yield entry
+                except GeneratorExit:
+                    # the consumer stopped early, the rest of the reply must
+                    # still be read off the connection
+                    for _ in range(i + 1, size):
+                        skip(iprot, etype)
+                    iprot.readListEnd()
+                    iprot.readFieldEnd()
+                    # the remaining fields of the result
+                    skip(iprot, TType.STRUCT)
+                    iprot.readMessageEnd()
+                    raise
+            iprot.readListEnd()
+        elif fid == 1 and ftype == TType.STRUCT:
+            error = ttypes.InvalidTableOperation()
+            error.read(iprot)
+        else:
+            skip(iprot, ftype)
+        iprot.readFieldEnd()
+    iprot.readStructEnd()
+    iprot.readMessageEnd()
+    if error is not None:
+        raise error
+    if not got_entries:
+        raise TApplicationException(
+            TApplicationException.MISSING_RESULT,
+            "bm_mt_get_entries failed: unknown result")
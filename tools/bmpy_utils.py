@@ -20,8 +20,19 @@
 #
 #
 
+import os
 import sys
+import json
+import time
+import atexit
+import collections
 import hashlib
+import importlib
+import threading
+import pickle
+import random
+import socket
+import weakref
 
 from thrift import Thrift
 from thrift.transport import TSocket
@@ -29,20 +40,107 @@ from thrift.transport import TTransport
 from thrift.protocol import TBinaryProtocol
 from thrift.protocol import TMultiplexedProtocol
 
+# C extension used by TBinaryProtocolAccelerated to encode and decode whole
+# structs; without it every field goes through the pure Python protocol
+try:
+    from thrift.protocol import fastbinary
+except ImportError:
+    fastbinary = None
 
-def check_JSON_md5(client, json_src, out=sys.stdout):
-    with open(json_src, 'rb') as f:
-        m = hashlib.md5()
-        for L in f:
-            m.update(L)
-        md5sum = m.digest()
+
+def cache_dir():
+    """Directory of the caches kept by the tools across runs."""
+    path = os.environ.get("BMPY_CACHE_DIR")
+    if path is None:
+        path = os.path.join(os.environ.get("XDG_CACHE_HOME") or
+                            os.path.expanduser("~/.cache"), "bmpy")
+    return path
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# Size of the reads when hashing a file
+HASH_CHUNK_SIZE = 1 << 20
+
+# md5 of files, keyed by realpath: [size, mtime_ns, hexdigest]
+_md5_cache = None
+
+
+def _md5_cache_path():
+    return os.path.join(cache_dir(), "md5.json")
+
+
+def _hash_file(path):
+    m = hashlib.md5()
+    buf = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            m.update(view[:n])
+    return m.digest()
+
+
+def file_md5(path):
+    """md5 digest of the file, from the on-disk cache when its size and
+    mtime didn't change since it was last hashed."""
+    global _md5_cache
+    if _md5_cache is None:
+        try:
+            with open(_md5_cache_path(), encoding="utf-8") as f:
+                _md5_cache = json.load(f)
+        except (OSError, ValueError):
+            _md5_cache = {}
+
+    st = os.stat(path)
+    key = os.path.realpath(path)
+    entry = _md5_cache.get(key)
+    if entry is not None and entry[:2] == [st.st_size, st.st_mtime_ns]:
+        return bytes.fromhex(entry[2])
+
+    md5sum = _hash_file(path)
+    # a file modified again within the mtime granularity would keep the
+    # same key, so only files which have been stable for a while are cached
+    if time.time_ns() - st.st_mtime_ns > 2 * 10**9:
+        _md5_cache[key] = [st.st_size, st.st_mtime_ns, md5sum.hex()]
+        try:
+            write_atomic(_md5_cache_path(),
+                         json.dumps(_md5_cache).encode())
+        except OSError:
+            pass
+    return md5sum
+
+
+# md5 of the config loaded on the switch, requested once per client
+_switch_md5 = weakref.WeakKeyDictionary()
+
+
+def switch_config_md5(client):
+    md5sum = _switch_md5.get(client)
+    if md5sum is None:
+        md5sum = _switch_md5[client] = client.bm_get_config_md5()
+    return md5sum
+
+
+def check_JSON_md5(client, json_src, out=sys.stdout, exit_on_error=True):
+    md5sum = file_md5(json_src)
 
     def my_print(s):
         out.write(s)
 
     try:
-        bm_md5sum = client.bm_get_config_md5()
+        bm_md5sum = switch_config_md5(client)
     except:
+        if not exit_on_error:
+            raise
         my_print("Error when requesting config md5 sum from switch\n")
         sys.exit(1)
 
@@ -51,46 +149,195 @@ def check_JSON_md5(client, json_src, out=sys.stdout):
         my_print("WARNING: the JSON files loaded into the switch and the one ")
         my_print("you just provided to this CLI don't have the same md5 sum. ")
         my_print("Are you sure they describe the same program?\n")
-        bm_md5sum_str = "".join("{:02x}".format(ord(c)) for c in bm_md5sum)
-        md5sum_str = "".join("{:02x}".format(ord(c)) for c in md5sum)
-        my_print("{:<15}: {}\n".format("switch md5", bm_md5sum_str))
-        my_print("{:<15}: {}\n".format("CLI input md5", md5sum_str))
+        my_print("{:<15}: {}\n".format("switch md5", bm_md5sum.hex()))
+        my_print("{:<15}: {}\n".format("CLI input md5", md5sum.hex()))
         my_print("**********\n")
 
 
-def get_json_config(standard_client=None, json_path=None, out=sys.stdout):
+def _config_cache_path(md5sum, ext):
+    return os.path.join(cache_dir(), "configs", md5sum.hex() + ext)
+
+
+def _fresh_config_md5(client):
+    # the config is requested after a config change, so its md5 can't come
+    # from the per-client memo; the memo is refreshed instead
+    try:
+        md5sum = _switch_md5[client] = client.bm_get_config_md5()
+    except Thrift.TException:
+        return None
+    return md5sum
+
+
+def get_json_config(standard_client=None, json_path=None, out=sys.stdout,
+                    use_cache=True, exit_on_error=True, md5sum=None):
+    """Without json_path, the JSON config is looked up in a cache directory
+    keyed by the md5 the switch reports for it, and only downloaded from the
+    switch on a miss. Switches running the same program share the entry.
+    md5sum is that md5 when the caller already requested it. With
+    exit_on_error=False, RPC errors are raised instead of exiting."""
     def my_print(s):
         out.write(s)
 
     if json_path:
         if standard_client is not None:
-            check_JSON_md5(standard_client, json_path)
+            check_JSON_md5(standard_client, json_path,
+                           exit_on_error=exit_on_error)
         with open(json_path, encoding="utf-8") as f:
             return f.read()
     else:
         assert(standard_client is not None)
+        if not use_cache:
+            md5sum = None
+        elif md5sum is None:
+            md5sum = _fresh_config_md5(standard_client)
+        if md5sum is not None:
+            path = _config_cache_path(md5sum, ".json")
+            try:
+                with open(path, encoding="utf-8") as f:
+                    json_cfg = f.read()
+                my_print("Using JSON from cache ({})\n".format(md5sum.hex()))
+                return json_cfg
+            except OSError:
+                pass
         try:
             my_print("Obtaining JSON from switch...\n")
             json_cfg = standard_client.bm_get_config()
             my_print("Done\n")
         except:
+            if not exit_on_error:
+                raise
             my_print("Error when requesting JSON config from switch\n")
             sys.exit(1)
+        # the config may have been swapped since its md5 was requested
+        if md5sum is not None and \
+                hashlib.md5(json_cfg.encode("utf-8")).digest() == md5sum:
+            try:
+                write_atomic(path, json_cfg.encode("utf-8"))
+            except OSError:
+                pass
         return json_cfg
 
-# services is [(service_name, client_class), ...]
 
+def get_parsed_json_config(standard_client, out=sys.stdout, use_cache=True):
+    """Same as get_json_config, but returns the parsed JSON, itself cached as
+    a pickle next to the JSON entry."""
+    md5sum = _fresh_config_md5(standard_client) if use_cache else None
+    if md5sum is not None:
+        try:
+            with open(_config_cache_path(md5sum, ".pickle"), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+    json_cfg = get_json_config(standard_client, out=out, use_cache=use_cache,
+                               md5sum=md5sum)
+    json_ = json.loads(json_cfg)
+    if use_cache:
+        # keyed by the config actually returned, which may have been swapped
+        # since md5sum was requested
+        try:
+            write_atomic(_config_cache_path(
+                hashlib.md5(json_cfg.encode("utf-8")).digest(), ".pickle"),
+                pickle.dumps(json_, pickle.HIGHEST_PROTOCOL))
+        except OSError:
+            pass
+    return json_
 
-def thrift_connect(thrift_ip, thrift_port, services, out=sys.stdout):
-    def my_print(s):
-        out.write(s)
 
+def codec_path(accelerated=None):
+    """Name of the codec used by the protocols built by make_protocol."""
+    if accelerated is None:
+        accelerated = fastbinary is not None
+    return "accelerated (fastbinary)" if accelerated else "pure Python"
+
+
+def make_binary_protocol(transport, accelerated=None):
+    """The generated structs only use fastbinary with an accelerated protocol
+    over a CReadableTransport (e.g. TBufferedTransport). accelerated=None
+    picks it when the C extension is available; True requires it."""
+    if accelerated is None:
+        accelerated = fastbinary is not None
+    if accelerated:
+        return TBinaryProtocol.TBinaryProtocolAccelerated(transport,
+                                                         fallback=False)
+    return TBinaryProtocol.TBinaryProtocol(transport)
+
+
+def make_protocol(thrift_ip, thrift_port, accelerated=None, recorder=None,
+                  timeouts=None):
+    """With a recorder (bmpy_record.Recorder), the messages going through
+    the socket are recorded. With Timeouts, connecting and the socket
+    operations are bounded."""
     # Make socket
-    transport = TSocket.TSocket(thrift_ip, thrift_port)
+    if timeouts is None:
+        transport = TSocket.TSocket(thrift_ip, thrift_port)
+    else:
+        transport = TimeoutSocket(thrift_ip, thrift_port, timeouts)
+    if recorder is not None:
+        transport = recorder.wrap(transport)
     # Buffering is critical. Raw sockets are very slow
     transport = TTransport.TBufferedTransport(transport)
     # Wrap in a protocol
-    bprotocol = TBinaryProtocol.TBinaryProtocol(transport)
+    bprotocol = make_binary_protocol(transport, accelerated)
+    return transport, bprotocol
+
+
+# Errors after which the connection to a switch has to be re-established
+CONNECTION_ERRORS = (TTransport.TTransportException, EOFError, socket.error)
+
+
+class Backoff(object):
+    """Jittered exponential backoff: the n-th delay is drawn uniformly in
+    [0, min(maximum, initial * multiplier ** n)], so that clients which lost
+    the same switch don't reconnect in lockstep. max_attempts=None retries
+    forever."""
+
+    def __init__(self, initial=0.1, maximum=10.0, multiplier=2.0,
+                 max_attempts=None):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.max_attempts = max_attempts
+
+    def delays(self):
+        n = 0
+        while self.max_attempts is None or n < self.max_attempts - 1:
+            yield random.uniform(
+                0, min(self.maximum, self.initial * self.multiplier ** n))
+            n += 1
+
+
+def retry_with_backoff(fn, backoff, errors=CONNECTION_ERRORS,
+                       on_retry=None):
+    """Calls fn until it doesn't raise one of errors; the last error is
+    raised once backoff is exhausted."""
+    delays = backoff.delays()
+    while True:
+        try:
+            return fn()
+        except errors as e:
+            delay = next(delays, None)
+            if delay is None:
+                raise
+            if on_retry is not None:
+                on_retry(e, delay)
+            time.sleep(delay)
+
+# services is [(service_name, client_class), ...]
+
+
+def thrift_connect(thrift_ip, thrift_port, services, out=sys.stdout,
+                   accelerated=None, backoff=None, recorder=None,
+                   timeouts=None):
+    """With a Backoff, connection attempts are retried and the last
+    TTransportException is raised once they are exhausted, instead of
+    exiting. With a bmpy_record.Recorder, the session is recorded. With
+    Timeouts, a switch which doesn't answer makes the call raise
+    TTransportException (TIMED_OUT) and closes the connection."""
+    def my_print(s):
+        out.write(s)
+
+    transport, bprotocol = make_protocol(thrift_ip, thrift_port, accelerated,
+                                         recorder, timeouts)
 
     clients = []
 
@@ -105,8 +352,13 @@ def thrift_connect(thrift_ip, thrift_port, services, out=sys.stdout):
 
     # Connect!
     try:
-        transport.open()
+        if backoff is None:
+            transport.open()
+        else:
+            retry_with_backoff(transport.open, backoff)
     except TTransport.TTransportException:
+        if backoff is not None:
+            raise
         my_print("Could not connect to thrift client on port {}\n".format(
             thrift_port))
         my_print("Make sure the switch is running ")
@@ -116,7 +368,567 @@ def thrift_connect(thrift_ip, thrift_port, services, out=sys.stdout):
     return clients
 
 
-def thrift_connect_standard(thrift_ip, thrift_port, out=sys.stdout):
-    from bm_runtime.standard import Standard
+def thrift_connect_standard(thrift_ip, thrift_port, out=sys.stdout,
+                            lazy=False, recorder=None, timeouts=None):
+    """With lazy, the client comes from StandardLazy, which imports faster
+    and creates the code of each method when it is first called."""
+    if lazy:
+        from bm_runtime.standard import StandardLazy as Standard
+    else:
+        from bm_runtime.standard import Standard
     return thrift_connect(thrift_ip, thrift_port,
-                          [("standard", Standard.Client)], out)[0]
+                          [("standard", Standard.Client)], out,
+                          recorder=recorder, timeouts=timeouts)[0]
+
+
+# service_name -> (module, client class) of the services exposed by bmv2
+SERVICES = {
+    "standard": ("bm_runtime.standard.Standard", "Client"),
+    "simple_pre": ("bm_runtime.simple_pre.SimplePre", "Client"),
+    "simple_pre_lag": ("bm_runtime.simple_pre_lag.SimplePreLAG", "Client"),
+}
+
+
+class Timeouts(object):
+    """Socket timeouts in seconds, None meaning no timeout. read applies to
+    the reply of a call and can be set per method with per_method, which
+    replaces it; heavy methods otherwise get at least their SLOW_METHODS
+    timeout. Per-method timeouts only apply to calls made through
+    ThriftSession.call; the clients of thrift_connect use read for every
+    socket operation."""
+
+    SLOW_METHODS = {
+        "bm_get_config": 60.0,
+        "bm_mt_get_entries": 60.0,
+        "bm_serialize_state": 120.0,
+        "bm_load_new_config": 120.0,
+    }
+
+    def __init__(self, connect=5.0, read=10.0, write=10.0, per_method=None):
+        self.connect = connect
+        self.read = read
+        self.write = write
+        self.per_method = dict(per_method or {})
+
+    def read_timeout(self, method):
+        if method in self.per_method:
+            return self.per_method[method]
+        slow = self.SLOW_METHODS.get(method)
+        if slow is None or self.read is None:
+            return self.read
+        return max(slow, self.read)
+
+
+NO_TIMEOUTS = Timeouts(None, None, None)
+
+
+def _ms(timeout):
+    return None if timeout is None else timeout * 1000
+
+
+class TimeoutSocket(TSocket.TSocket):
+    """TSocket which closes itself when a read or write fails, e.g. on a
+    timeout: the late reply would otherwise be read as the reply of the next
+    call. Whoever holds the connection (e.g. a ThriftSessionPool) then sees
+    it closed and reconnects. With timeouts, connecting is bounded by
+    timeouts.connect and the socket operations by timeouts.read. With a
+    deadline (a time.monotonic() time), each operation gets the time left
+    until it instead, so that a reply read in many chunks can't take longer
+    than the deadline."""
+
+    def __init__(self, host, port, timeouts=None):
+        TSocket.TSocket.__init__(self, host, port)
+        self.timeouts = timeouts
+        self.deadline = None
+        if timeouts is not None:
+            self.setTimeout(_ms(timeouts.connect))
+
+    def open(self):
+        TSocket.TSocket.open(self)
+        if self.timeouts is not None:
+            self.setTimeout(_ms(self.timeouts.read))
+
+    def _time_left(self):
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            self.close()
+            raise TTransport.TTransportException(
+                TTransport.TTransportException.TIMED_OUT, "deadline exceeded")
+        self.setTimeout(_ms(left))
+
+    def read(self, sz):
+        if self.deadline is not None:
+            self._time_left()
+        try:
+            return TSocket.TSocket.read(self, sz)
+        except socket.timeout:
+            self.close()
+            raise TTransport.TTransportException(
+                TTransport.TTransportException.TIMED_OUT, "read timeout")
+        except TTransport.TTransportException:
+            self.close()
+            raise
+
+    def write(self, buff):
+        if self.deadline is not None:
+            self._time_left()
+        try:
+            TSocket.TSocket.write(self, buff)
+        except socket.timeout:
+            self.close()
+            raise TTransport.TTransportException(
+                TTransport.TTransportException.TIMED_OUT, "write timeout")
+        except TTransport.TTransportException:
+            self.close()
+            raise
+
+
+class ThriftSession(object):
+    """One connection to a switch, shared by the clients of all services
+    through TMultiplexedProtocol. The transport is opened on first use and
+    clients are created the first time their service is requested.
+
+    With timeouts, connecting and every socket operation are bounded, and a
+    connection which timed out is dropped and reopened on next use. Calls
+    made through call() or timed() also get per-method read timeouts and
+    per-call deadlines."""
+
+    def __init__(self, thrift_ip, thrift_port, accelerated=None,
+                 timeouts=None):
+        self.thrift_ip = thrift_ip
+        self.thrift_port = thrift_port
+        self.accelerated = accelerated
+        self.codec = codec_path(accelerated)
+        self.timeouts = timeouts
+        self.tsocket = None
+        self.transport = None
+        self.bprotocol = None
+        self.clients = {}
+        self.last_used = None
+
+    def is_open(self):
+        return self.transport is not None and self.transport.isOpen()
+
+    def open(self):
+        """Raises TTransport.TTransportException if the switch can't be
+        reached."""
+        if self.is_open():
+            return
+        self.close()
+        tsocket = TimeoutSocket(self.thrift_ip, self.thrift_port,
+                                self.timeouts or NO_TIMEOUTS)
+        transport = TTransport.TBufferedTransport(tsocket)
+        bprotocol = make_binary_protocol(transport, self.accelerated)
+        transport.open()
+        self.tsocket, self.transport, self.bprotocol = \
+            tsocket, transport, bprotocol
+        self.last_used = time.monotonic()
+
+    def client(self, service_name):
+        self.open()
+        client = self.clients.get(service_name)
+        if client is None:
+            module_name, cls_name = SERVICES[service_name]
+            service_cls = getattr(importlib.import_module(module_name),
+                                  cls_name)
+            protocol = TMultiplexedProtocol.TMultiplexedProtocol(
+                self.bprotocol, service_name)
+            client = self.clients[service_name] = service_cls(protocol)
+        self.last_used = time.monotonic()
+        return client
+
+    def call(self, service_name, method, *args, **kwargs):
+        """Calls method of service_name. deadline=<seconds> bounds the whole
+        call, sending and every read of the reply together, overriding the
+        configured write and read timeouts."""
+        deadline = kwargs.pop("deadline", None)
+        assert not kwargs
+        client = self.client(service_name)
+        timeouts = self.timeouts
+        if timeouts is None:
+            if deadline is None:
+                return getattr(client, method)(*args)
+            timeouts = NO_TIMEOUTS
+        tsocket = self.tsocket
+        try:
+            if deadline is not None:
+                tsocket.deadline = time.monotonic() + deadline
+            else:
+                tsocket.setTimeout(_ms(timeouts.write))
+            getattr(client, "send_" + method)(*args)
+            if deadline is None:
+                tsocket.setTimeout(_ms(timeouts.read_timeout(method)))
+            return getattr(client, "recv_" + method)()
+        finally:
+            tsocket.deadline = None
+            tsocket.setTimeout(_ms(timeouts.read))
+
+    def timed(self, service_name="standard"):
+        return TimedClient(self, service_name)
+
+    @property
+    def standard(self):
+        return self.client("standard")
+
+    @property
+    def simple_pre(self):
+        return self.client("simple_pre")
+
+    @property
+    def simple_pre_lag(self):
+        return self.client("simple_pre_lag")
+
+    def is_alive(self):
+        if not self.is_open():
+            return False
+        try:
+            self.client("standard").bm_mgmt_get_info()
+        except Thrift.TException:
+            return False
+        return True
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        self.tsocket = None
+        self.transport = None
+        self.bprotocol = None
+        self.clients = {}
+
+
+class TimedClient(object):
+    """Client of one service of a ThriftSession whose bm_* methods go through
+    ThriftSession.call, and accept a deadline=<seconds> keyword argument."""
+
+    def __init__(self, session, service_name):
+        self.session = session
+        self.service_name = service_name
+
+    def __getattr__(self, name):
+        if not name.startswith("bm_"):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return self.session.call(self.service_name, name, *args, **kwargs)
+        return method
+
+
+class ThriftSessionPool(object):
+    """Sessions keyed by (thrift_ip, thrift_port), so that tools talking to
+    several switches open one connection per switch for their whole run.
+    A session idle for more than check_interval seconds is checked with
+    bm_mgmt_get_info before being handed out again, and reopened if the
+    switch stopped answering. All sessions are closed on exit."""
+
+    def __init__(self, check_interval=5.0, timeouts=None):
+        self.check_interval = check_interval
+        self.timeouts = timeouts
+        self.sessions = {}
+        self.lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    def session(self, thrift_ip, thrift_port):
+        key = (thrift_ip, thrift_port)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.sessions[key] = ThriftSession(
+                    thrift_ip, thrift_port, timeouts=self.timeouts)
+        if session.last_used is not None and \
+                time.monotonic() - session.last_used >= self.check_interval \
+                and not session.is_alive():
+            session.close()
+        session.open()
+        return session
+
+    def client(self, thrift_ip, thrift_port, service_name="standard"):
+        return self.session(thrift_ip, thrift_port).client(service_name)
+
+    def close(self, thrift_ip, thrift_port):
+        with self.lock:
+            session = self.sessions.pop((thrift_ip, thrift_port), None)
+        if session is not None:
+            session.close()
+
+    def close_all(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions = {}
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close_all()
+
+
+_session_pool = None
+
+
+def get_session_pool():
+    """Process-wide pool shared by the tools."""
+    global _session_pool
+    if _session_pool is None:
+        _session_pool = ThriftSessionPool()
+    return _session_pool
+
+
+# Methods which don't modify the switch, so they can be replayed when the
+# connection is lost before their reply arrives
+IDEMPOTENT_METHODS = frozenset([
+    "bm_mt_get_num_entries", "bm_mt_act_prof_get_members",
+    "bm_mt_act_prof_get_member", "bm_mt_act_prof_get_groups",
+    "bm_mt_act_prof_get_group", "bm_mt_read_counter", "bm_mt_get_meter_rates",
+    "bm_mt_get_entries", "bm_mt_get_entry", "bm_mt_get_default_entry",
+    "bm_mt_get_entry_from_key", "bm_counter_read", "bm_meter_get_rates",
+    "bm_register_read", "bm_register_read_all", "bm_parse_vset_get",
+    "bm_dev_mgr_show_ports", "bm_mgmt_get_info", "bm_get_config",
+    "bm_get_config_md5", "bm_get_id_from_name", "bm_serialize_state",
+    "bm_mc_get_entries",
+])
+
+
+class ResilientClient(object):
+    """Client of one service of a switch which survives switch restarts.
+
+    Calls are forwarded to the client of a ThriftSession. When the
+    connection is lost, the session is re-established with backoff on the
+    next call; calls to IDEMPOTENT_METHODS are replayed, with the delays of
+    backoff between replays and at most backoff.max_attempts times, other
+    calls raise the transport error since they may or may not have been
+    applied. Callbacks registered with add_state_callback are called with
+    (client, state), state being "connected" (first connection),
+    "disconnected" or "reconnected", e.g. to re-sync tables after a restart.
+
+    A call which timed out raises, without replay: the switch is slow, not
+    gone, so the connection (dropped so that the late reply isn't read as
+    the reply of the next call) is reopened without notifying the
+    callbacks.
+    """
+
+    def __init__(self, thrift_ip, thrift_port, service_name="standard",
+                 backoff=None, accelerated=None, timeouts=None):
+        self.session = ThriftSession(thrift_ip, thrift_port, accelerated,
+                                     timeouts)
+        self.service_name = service_name
+        self.backoff = backoff or Backoff()
+        self.state = None
+        self.callbacks = []
+        self.timed_out = False
+
+    def add_state_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def set_state(self, state):
+        self.state = state
+        for callback in self.callbacks:
+            callback(self, state)
+
+    def connect(self):
+        if self.state == "connected" or self.state == "reconnected":
+            if self.session.is_open():
+                return
+            if self.timed_out:
+                self.timed_out = False
+                retry_with_backoff(self.session.open, self.backoff)
+                return
+            # the switch went away since the last call, e.g. it restarted
+            # while the client was idle
+            self.disconnect()
+        retry_with_backoff(self.session.open, self.backoff)
+        self.set_state("connected" if self.state is None else "reconnected")
+
+    def disconnect(self):
+        self.session.close()
+        self.set_state("disconnected")
+
+    def call(self, name, *args, **kwargs):
+        delays = self.backoff.delays()
+        while True:
+            self.connect()
+            try:
+                return self.session.call(self.service_name, name, *args,
+                                         **kwargs)
+            except TTransport.TTransportException as e:
+                if e.type == TTransport.TTransportException.TIMED_OUT:
+                    self.timed_out = True
+                    raise
+                error = e
+            except CONNECTION_ERRORS as e:
+                error = e
+            self.disconnect()
+            if name not in IDEMPOTENT_METHODS:
+                raise error
+            delay = next(delays, None)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+
+    def __getattr__(self, name):
+        if not name.startswith("bm_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class ContentionStats(object):
+    """Counters of a ThreadSafeClient: waits counts the calls which found
+    all max_connections connections busy, handoffs the calls made on a
+    connection last used by another thread."""
+
+    def __init__(self):
+        self.calls = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.handoffs = 0
+        self.connections = 0
+        self.peak_in_use = 0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class ThreadSafeClient(object):
+    """Client of one service of a switch which can be called from any
+    number of threads. The generated clients can't: their requests and
+    replies would interleave on the shared connection.
+
+    Each thread gets its own ThriftSession, opened on its first call, so
+    that independent workloads run in parallel. At most max_connections
+    sessions are opened; past that, threads borrow the idle session of
+    another thread (preferably one which exited), or wait for one. A
+    session whose call failed with a connection error is closed and
+    reopened on next use, and the error is raised."""
+
+    def __init__(self, thrift_ip, thrift_port, service_name="standard",
+                 max_connections=8, accelerated=None, timeouts=None):
+        assert max_connections > 0
+        self.thrift_ip = thrift_ip
+        self.thrift_port = thrift_port
+        self.service_name = service_name
+        self.max_connections = max_connections
+        self.accelerated = accelerated
+        self.timeouts = timeouts
+        self.cond = threading.Condition()
+        # session -> thread which used it last
+        self.owners = {}
+        self.idle = set()
+        # threads waiting for a session, in arrival order
+        self.waiters = collections.deque()
+        self.local = threading.local()
+        self.stats = ContentionStats()
+        self.closed = False
+
+    def pick_idle(self):
+        """Idle session of a thread which exited, else any."""
+        for session in self.idle:
+            if not self.owners[session].is_alive():
+                return session
+        return next(iter(self.idle))
+
+    def acquire(self):
+        thread = threading.current_thread()
+        own = getattr(self.local, "session", None)
+        stats = self.stats
+        with self.cond:
+            stats.calls += 1
+            start = None
+            while True:
+                if self.closed:
+                    if start is not None:
+                        self.waiters.remove(thread)
+                    raise RuntimeError("ThreadSafeClient is closed")
+                # first come, first served once threads are waiting
+                if not self.waiters or self.waiters[0] is thread:
+                    if own is not None and own in self.idle:
+                        session = own
+                        self.idle.remove(session)
+                        break
+                    if len(self.owners) < self.max_connections:
+                        session = ThriftSession(
+                            self.thrift_ip, self.thrift_port,
+                            self.accelerated, self.timeouts)
+                        stats.connections += 1
+                        break
+                    if self.idle:
+                        session = self.pick_idle()
+                        self.idle.remove(session)
+                        break
+                if start is None:
+                    start = time.monotonic()
+                    stats.waits += 1
+                    self.waiters.append(thread)
+                self.cond.wait()
+            if start is not None:
+                self.waiters.popleft()
+                # the next waiter may be served too
+                self.cond.notify_all()
+                waited = time.monotonic() - start
+                stats.wait_time += waited
+                stats.max_wait = max(stats.max_wait, waited)
+            if self.owners.get(session, thread) is not thread:
+                stats.handoffs += 1
+            self.owners[session] = thread
+            stats.peak_in_use = max(stats.peak_in_use,
+                                    len(self.owners) - len(self.idle))
+        self.local.session = session
+        return session
+
+    def release(self, session):
+        with self.cond:
+            if self.closed:
+                session.close()
+                return
+            self.idle.add(session)
+            if self.waiters:
+                self.cond.notify_all()
+
+    def call(self, name, *args, **kwargs):
+        session = self.acquire()
+        try:
+            return session.call(self.service_name, name, *args, **kwargs)
+        except CONNECTION_ERRORS:
+            session.close()
+            raise
+        finally:
+            self.release(session)
+
+    def __getattr__(self, name):
+        if not name.startswith("bm_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def close(self):
+        """Closes the idle sessions now and the busy ones when their call
+        returns."""
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, set()
+            self.cond.notify_all()
+        for session in idle:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def thrift_connect_resilient(thrift_ip, thrift_port, service_name="standard",
+                             backoff=None, timeouts=None):
+    client = ResilientClient(thrift_ip, thrift_port, service_name, backoff,
+                             timeouts=timeouts)
+    client.connect()
+    return client
+
+
+def thrift_connect_threadsafe(thrift_ip, thrift_port, service_name="standard",
+                              max_connections=8, timeouts=None):
+    return ThreadSafeClient(thrift_ip, thrift_port, service_name,
+                            max_connections, timeouts=timeouts)
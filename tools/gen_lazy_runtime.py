@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+#
+# Generates the *Lazy variant of the service modules of bm_runtime (see
+# bm_runtime/lazy_service.py), e.g. bm_runtime/standard/StandardLazy.py from
+# bm_runtime/standard/Standard.py. To be run again whenever the service
+# modules are regenerated by the Thrift compiler.
+#
+
+import argparse
+import importlib
+import os
+
+
+# (package, service module) of the services of bm_runtime
+SERVICES = [
+    ("bm_runtime.standard", "Standard"),
+    ("bm_runtime.simple_pre", "SimplePre"),
+    ("bm_runtime.simple_pre_lag", "SimplePreLAG"),
+]
+
+HEADER = """\
+#
+# Autogenerated by tools/gen_lazy_runtime.py from {service}.py
+#
+# DO NOT EDIT, run tools/gen_lazy_runtime.py again instead
+#
+
+from ..lazy_service import LazyService
+
+"""
+
+FOOTER = """
+_service = LazyService(__name__, __package__ + ".ttypes", METHODS)
+Client = _service.Client
+__getattr__ = _service.module_getattr
+"""
+
+
+def spec_source(spec, ttypes):
+    """Source of a thrift_spec, with structs replaced by "@<class name>" so
+    that the whole table is a constant."""
+    if isinstance(spec, list):
+        cls = spec[0]
+        assert cls.__module__ == ttypes.__name__, cls
+        return repr("@" + cls.__name__)
+    if isinstance(spec, tuple):
+        items = [spec_source(s, ttypes) for s in spec]
+        return "(" + ", ".join(items) + ("," if len(items) == 1 else "") + ")"
+    assert spec is None or isinstance(spec, (bool, int, float, str)), spec
+    return repr(spec)
+
+
+def generate(package, service):
+    module = importlib.import_module(package + "." + service)
+    ttypes = importlib.import_module(package + ".ttypes")
+    lines = [HEADER.format(service=service), "METHODS = {\n"]
+    for name in vars(module.Iface):
+        if name.startswith("_"):
+            continue
+        args = getattr(module, name + "_args").thrift_spec
+        result = getattr(module, name + "_result", None)
+        lines.append("    {!r}: (\n".format(name))
+        lines.append("        {},\n".format(spec_source(args, ttypes)))
+        lines.append("        {},\n".format(
+            None if result is None else spec_source(result.thrift_spec,
+                                                    ttypes)))
+        lines.append("    ),\n")
+    lines.append("}\n")
+    lines.append(FOOTER)
+    return "".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generates the lazy service modules of bm_runtime')
+    parser.add_argument('--check', action="store_true",
+                        help='Fail if a generated module is out of date')
+    args = parser.parse_args()
+
+    tools_dir = os.path.dirname(os.path.abspath(__file__))
+    stale = []
+    for package, service in SERVICES:
+        path = os.path.join(tools_dir, *package.split(".")) + \
+            "/{}Lazy.py".format(service)
+        source = generate(package, service)
+        if args.check:
+            with open(path) as f:
+                if f.read() != source:
+                    stale.append(path)
+            continue
+        with open(path, "w") as f:
+            f.write(source)
+        print("Generated {}".format(path))
+    if stale:
+        raise SystemExit("Out of date: {}".format(", ".join(stale)))
+
+
+if __name__ == '__main__':
+    main()
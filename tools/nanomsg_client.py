@@ -22,8 +22,15 @@
 import nnpy
 import struct
 import sys
+import os
+import time
+import errno
+import glob
+import math
+import io
 import json
 import argparse
+from operator import attrgetter
 
 
 parser = argparse.ArgumentParser(description='BM nanomsg event logger client')
@@ -35,6 +42,38 @@ parser.add_argument('--thrift-port', help='Thrift server port for table updates'
                     type=int, action="store", default=9090)
 parser.add_argument('--thrift-ip', help='Thrift IP address for table updates. If both --socket and --json are provided, then Thrift will not be used.',
                     type=str, action="store", default='localhost')
+parser.add_argument('--format', help='Output format for decoded events',
+                    choices=['text', 'jsonl'], action="store", default='text')
+parser.add_argument('--output', help='File or FIFO to which decoded events are written, \'-\' for stdout',
+                    type=str, action="store", default='-')
+parser.add_argument('--buffer-size', help='Size in bytes of the output buffer',
+                    type=int, action="store", default=1 << 20)
+parser.add_argument('--flush-interval', help='Maximum time in seconds events can stay in the output buffer',
+                    type=float, action="store", default=1.0)
+parser.add_argument('--benchmark', help='Decode and format N synthetic events with the text printer and the selected sink, then exit',
+                    type=int, action="store", metavar='N', required=False)
+parser.add_argument('--discover', help='Subscribe to the event sockets of every switch found by --discover-glob, attaching and detaching switches as they come and go',
+                    action="store_true", default=False)
+parser.add_argument('--discover-glob', help='Files scanned for event sockets in discovery mode',
+                    type=str, action="store", default='/tmp/bm-*-log.ipc')
+parser.add_argument('--discover-ports', help='Thrift ports probed to match discovered sockets to switches, e.g. 9090-9099 or 9090,9091',
+                    type=str, action="store", default='9090-9099')
+parser.add_argument('--discover-interval', help='Time in seconds between two scans in discovery mode',
+                    type=float, action="store", default=2.0)
+parser.add_argument('--detect', help='Raise alerts when the miss ratio of a table or the packet rate of a port deviates from its moving average',
+                    action="store_true", default=False)
+parser.add_argument('--detect-interval', help='Length in seconds of the windows the detector statistics are computed on',
+                    type=float, action="store", default=5.0)
+parser.add_argument('--detect-alpha', help='Weight of the latest window in the moving averages',
+                    type=float, action="store", default=0.1)
+parser.add_argument('--detect-threshold', help='Z-score above which an alert is raised',
+                    type=float, action="store", default=4.0)
+parser.add_argument('--detect-warmup', help='Number of windows observed before alerts are raised',
+                    type=int, action="store", default=10)
+parser.add_argument('--flamegraph', help='File to which the number of packets taking each path through the pipelines is written, in folded stack format',
+                    type=str, action="store", required=False)
+parser.add_argument('--flamegraph-interval', help='Time in seconds between two writes of the --flamegraph file',
+                    type=float, action="store", default=5.0)
 
 args = parser.parse_args()
 
@@ -448,54 +487,782 @@ class ConfigChange(Msg):
         return "type: %s, switch_id: %d" % (self.type_str, self.switch_id)
 
 
-def json_init(client):
+# Payload fields of each message type, in the order they appear in the JSON
+# lines output. The second element is the type of object the field refers to
+# (its name is looked up once per config), 'bool' for flags, or None.
+JSONL_FIELDS = {
+    MSG_TYPES.PACKET_IN: (("port_in", None),),
+    MSG_TYPES.PACKET_OUT: (("port_out", None),),
+    MSG_TYPES.PARSER_START: (("parser_id", "parser"),),
+    MSG_TYPES.PARSER_DONE: (("parser_id", "parser"),),
+    MSG_TYPES.PARSER_EXTRACT: (("header_id", "header"),),
+    MSG_TYPES.DEPARSER_START: (("deparser_id", "deparser"),),
+    MSG_TYPES.DEPARSER_DONE: (("deparser_id", "deparser"),),
+    MSG_TYPES.DEPARSER_EMIT: (("header_id", "header"),),
+    MSG_TYPES.CHECKSUM_UPDATE: (("cksum_id", "checksum"),),
+    MSG_TYPES.PIPELINE_START: (("pipeline_id", "pipeline"),),
+    MSG_TYPES.PIPELINE_DONE: (("pipeline_id", "pipeline"),),
+    MSG_TYPES.CONDITION_EVAL: (("condition_id", "condition"),
+                               ("result", "bool")),
+    MSG_TYPES.TABLE_HIT: (("table_id", "table"), ("entry_hdl", None)),
+    MSG_TYPES.TABLE_MISS: (("table_id", "table"),),
+    MSG_TYPES.ACTION_EXECUTE: (("action_id", "action"),),
+}
+
+HDR_FIELDS = (("switch_id", "switch_id"), ("cxt_id", "cxt_id"),
+              ("sig", "sig"), ("id_", "id"), ("copy_id", "copy_id"))
+
+
+def open_output(path, buffer_size):
+    """Opens the binary writer used by the sinks; path can be '-' (stdout), a
+    regular file (appended to) or a FIFO (blocks until a reader opens it)."""
+    if path == '-':
+        return open(sys.stdout.fileno(), 'wb', buffering=buffer_size,
+                    closefd=False)
+    return open(path, 'ab', buffering=buffer_size)
+
+
+class Stage(object):
+    """Consumer of decoded events. tick(now) is called every interval
+    seconds, whether events are received or not (see StageClock)."""
+
+    interval = None
+
+    def observe(self, p):
+        pass
+
+    def tick(self, now=None):
+        pass
+
+    def reload_names(self, names=None, switch_id=None):
+        pass
+
+    def forget_switch(self, switch_id):
+        pass
+
+    def close(self):
+        pass
+
+
+class StageClock(object):
+    """Ticks the stages which have an interval once it has elapsed since
+    their previous tick. check() is called for every received message and
+    on receive timeouts; it reads the clock once and returns at once when
+    no stage is due."""
+
+    def __init__(self, stages):
+        self.stages = [stage for stage in stages if stage.interval]
+        now = time.monotonic()
+        self.due = [now + stage.interval for stage in self.stages]
+        self.next_due = min(self.due, default=float("inf"))
+
+    def check(self):
+        now = time.monotonic()
+        if now < self.next_due:
+            return
+        for i, stage in enumerate(self.stages):
+            if now >= self.due[i]:
+                stage.tick(now)
+                self.due[i] = now + stage.interval
+        self.next_due = min(self.due)
+
+
+class Sink(Stage):
+    """Writes decoded events to a buffered binary writer, as the same lines
+    as the default printer. The buffer is flushed when it fills up, and at
+    the latest flush_interval seconds after the previous flush (checked on
+    every tick)."""
+
+    def __init__(self, out, flush_interval=1.0):
+        self.out = out
+        self._write = out.write
+        self.flush_interval = self.interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.pending = 0
+
+    def render(self, p):
+        return (str(p) + "\n").encode()
+
+    def observe(self, p):
+        self._write(self.render(p))
+        self.pending += 1
+
+    write = observe
+
+    def tick(self, now=None):
+        if not self.pending:
+            return
+        if now is None:
+            now = time.monotonic()
+        if now - self.last_flush >= self.flush_interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        self.out.flush()
+        self.pending = 0
+        self.last_flush = time.monotonic() if now is None else now
+
+    def close(self):
+        self.flush()
+        self.out.close()
+
+
+class JsonLinesSink(Sink):
+    """One JSON object per event. Each message type gets a precompiled bytes
+    template, and the names of the objects referred to by the events are
+    resolved and JSON-encoded once per config instead of once per event."""
+
+    def __init__(self, out, flush_interval=1.0):
+        super(JsonLinesSink, self).__init__(out, flush_interval)
+        # renderers of the switches which have their own names (discovery)
+        self.by_switch = {}
+        self.reload_names()
+
+    def reload_names(self, names=None, switch_id=None):
+        if names is None:
+            names = name_map
+        frags = {"bool": {True: b'true', False: b'false'}}
+        for (type_, id_), name in names.names.items():
+            frags.setdefault(type_, {})[id_] = \
+                b',"name":' + json.dumps(name).encode()
+        renderers = {}
+        for type_, fields in JSONL_FIELDS.items():
+            renderers[type_] = self._compile(type_, fields, frags)
+        fmt = b'{"type":"CONFIG_CHANGE","switch_id":%d}\n'
+        renderers[MSG_TYPES.CONFIG_CHANGE] = lambda p: fmt % p.switch_id
+        if switch_id is None:
+            self.renderers = renderers
+        else:
+            self.by_switch[switch_id] = renderers
+
+    def forget_switch(self, switch_id):
+        self.by_switch.pop(switch_id, None)
+
+    @staticmethod
+    def _compile(type_, fields, frags):
+        fmt = b'{"type":"' + MSG_TYPES.get_str(type_).encode() + b'"'
+        attrs = []
+        lookups = []
+        for attr, key in HDR_FIELDS:
+            fmt += b',"' + key.encode() + b'":%d'
+            attrs.append(attr)
+        for attr, ref in fields:
+            attrs.append(attr)
+            if ref is None:
+                fmt += b',"' + attr.encode() + b'":%d'
+            elif ref == "bool":
+                fmt += b',"' + attr.encode() + b'":%s'
+                lookups.append((len(attrs) - 1, frags[ref], False))
+            else:
+                fmt += b',"' + attr.encode() + b'":%d%s'
+                lookups.append((len(attrs) - 1, frags.get(ref, {}), True))
+        fmt += b'}\n'
+        get = attrgetter(*attrs)
+
+        if not lookups:
+            return lambda p: fmt % get(p)
+
+        def render(p):
+            values = list(get(p))
+            # insert from the right so that indices stay valid
+            for idx, frag, keep in reversed(lookups):
+                if keep:
+                    values.insert(idx + 1, frag.get(values[idx], b''))
+                else:
+                    values[idx] = frag[values[idx]]
+            return fmt % tuple(values)
+        return render
+
+    def render(self, p):
+        return self.by_switch.get(p.switch_id, self.renderers)[p.type_](p)
+
+
+SINKS = {
+    "text": Sink,
+    "jsonl": JsonLinesSink,
+}
+
+
+def uses_sink(format_, path):
+    # plain print keeps the original line-by-line behaviour on a terminal
+    return not (format_ == "text" and path == '-')
+
+
+def make_sink(format_, path, buffer_size, flush_interval):
+    if not uses_sink(format_, path):
+        return None
+    return SINKS[format_](open_output(path, buffer_size), flush_interval)
+
+
+class Ewma(object):
+    """Exponentially weighted mean and variance of a series."""
+
+    def __init__(self):
+        self.mean = None
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, x, alpha, min_std=0.0):
+        """Adds x to the series and returns its z-score against the mean and
+        variance before the update."""
+        self.count += 1
+        if self.mean is None:
+            self.mean = x
+            return 0.0
+        diff = x - self.mean
+        std = max(math.sqrt(self.var), min_std)
+        z = diff / std if std > 0 else 0.0
+        incr = alpha * diff
+        self.mean += incr
+        self.var = (1 - alpha) * (self.var + diff * incr)
+        return z
+
+
+class AnomalyDetector(Stage):
+    """Tracks the miss ratio of every (switch, table) and the packet rate of
+    every (switch, port). Events only bump a counter; the moving averages are
+    updated once per interval, for every known key, so that a table or port
+    which goes silent is seen as well. State is O(number of tables + ports).
+    """
+
+    # windows with fewer lookups don't update the miss ratio of a table
+    MIN_LOOKUPS = 10
+    # lower bound on the standard deviation, so that a series which has been
+    # constant until now doesn't alert on a tiny change
+    MIN_STD = {"miss_ratio": 0.02, "pkt_rate": 1.0}
+
+    def __init__(self, interval, alpha, threshold, warmup, out=sys.stderr,
+                 names_for=None):
+        self.interval = interval
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.out = out
+        self.names_for = names_for or (lambda switch_id: name_map)
+        # counts of the current window
+        self.lookups = {}
+        self.packets = {}
+        self.stats = {}
+        self.last_tick = time.monotonic()
+
+    def observe(self, p):
+        type_ = p.type_
+        if type_ == MSG_TYPES.TABLE_HIT or type_ == MSG_TYPES.TABLE_MISS:
+            key = (p.switch_id, p.table_id)
+            counts = self.lookups.get(key)
+            if counts is None:
+                counts = self.lookups[key] = [0, 0]
+            counts[type_ == MSG_TYPES.TABLE_MISS] += 1
+        elif type_ == MSG_TYPES.PACKET_IN:
+            key = (p.switch_id, p.port_in)
+            self.packets[key] = self.packets.get(key, 0) + 1
+        elif type_ == MSG_TYPES.PACKET_OUT:
+            key = (p.switch_id, p.port_out)
+            self.packets[key] = self.packets.get(key, 0) + 1
+
+    def tick(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self.last_tick
+        if elapsed < self.interval:
+            return
+        self.last_tick = now
+        for key, (hits, misses) in self.lookups.items():
+            if hits + misses >= self.MIN_LOOKUPS:
+                self.update(("table",) + key, "miss_ratio",
+                            misses / (hits + misses))
+            self.lookups[key] = [0, 0]
+        for key, count in self.packets.items():
+            self.update(("port",) + key, "pkt_rate", count / elapsed)
+            self.packets[key] = 0
+
+    def update(self, key, metric, x):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = Ewma()
+        mean = stats.mean
+        z = stats.update(x, self.alpha, self.MIN_STD[metric])
+        if stats.count > self.warmup and abs(z) >= self.threshold:
+            self.alert(key, metric, x, mean, z)
+
+    def alert(self, key, metric, x, mean, z):
+        kind, switch_id, id_ = key
+        if kind == "table":
+            name = self.names_for(switch_id).get_name("table", id_)
+            what = "table {}".format(name or id_)
+        else:
+            what = "port {}".format(id_)
+        self.out.write(
+            "ALERT: switch {}, {}: {} is {:.3f} (mean {:.3f}, z-score {:+.1f})\n"
+            .format(switch_id, what, metric, x, mean, z))
+        self.out.flush()
+
+    def forget_switch(self, switch_id):
+        for state in (self.lookups, self.packets):
+            for key in [k for k in state if k[0] == switch_id]:
+                del state[key]
+        for key in [k for k in self.stats if k[1] == switch_id]:
+            del self.stats[key]
+
+
+def frame_name(name, default):
+    # ';' separates frames and ' ' separates the stack from its count
+    return (name or default).replace(';', '_').replace(' ', '_')
+
+
+class PathAggregator(Stage):
+    """Turns the events of each packet into a folded stack, e.g.
+    'switch_0;parser;node_2=true;MyIngress.ipv4_lpm:hit;MyIngress.ipv4_forward;out',
+    and counts how many packets took each path.
+
+    Events are grouped by (switch_id, packet id, copy id). A trace ends on
+    PACKET_OUT; traces which got no event for a whole interval are ended
+    with a 'drop' frame. Open traces are kept in two generations, so ending
+    the stale ones is a dict swap per interval."""
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.counts = {}
+        self.traces = {}
+        self.old_traces = {}
+        self.last_tick = time.monotonic()
+
+    def frames(self, p):
+        key = (p.switch_id, p.id_, p.copy_id)
+        frames = self.traces.get(key)
+        if frames is None:
+            frames = self.old_traces.pop(key, None)
+            if frames is None:
+                frames = ["switch_{}".format(p.switch_id)]
+            self.traces[key] = frames
+        return key, frames
+
+    def observe(self, p):
+        type_ = p.type_
+        if type_ == MSG_TYPES.PARSER_START:
+            self.frames(p)[1].append(
+                frame_name(name_lookup("parser", p.parser_id), "parser"))
+        elif type_ == MSG_TYPES.CONDITION_EVAL:
+            self.frames(p)[1].append("{}={}".format(
+                frame_name(name_lookup("condition", p.condition_id),
+                           "condition"), "true" if p.result else "false"))
+        elif type_ == MSG_TYPES.TABLE_HIT or type_ == MSG_TYPES.TABLE_MISS:
+            self.frames(p)[1].append("{}:{}".format(
+                frame_name(name_lookup("table", p.table_id), "table"),
+                "hit" if type_ == MSG_TYPES.TABLE_HIT else "miss"))
+        elif type_ == MSG_TYPES.ACTION_EXECUTE:
+            self.frames(p)[1].append(
+                frame_name(name_lookup("action", p.action_id), "action"))
+        elif type_ == MSG_TYPES.PACKET_OUT:
+            key, frames = self.frames(p)
+            del self.traces[key]
+            frames.append("out")
+            self.count(frames)
+
+    def count(self, frames):
+        stack = ";".join(frames)
+        self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def tick(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if now - self.last_tick < self.interval:
+            return
+        self.last_tick = now
+        for frames in self.old_traces.values():
+            frames.append("drop")
+            self.count(frames)
+        self.old_traces = self.traces
+        self.traces = {}
+        self.dump()
+
+    def dump(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write("{} {}\n".format(stack, count))
+        os.replace(tmp_path, self.path)
+
+    def forget_switch(self, switch_id):
+        for traces in (self.traces, self.old_traces):
+            for key in [k for k in traces if k[0] == switch_id]:
+                del traces[key]
+
+    def close(self):
+        self.dump()
+
+
+def benchmark(nb_events, sink):
+    """Compares the events/s of the default printer with the given sink on
+    synthetic messages covering every message type. Messages are decoded
+    beforehand so that only formatting and writing are measured."""
+    hdr = struct.Struct("<iQIQQQ")
+    payloads = {
+        MSG_TYPES.CONDITION_EVAL: struct.pack("ii", 0, 1),
+        MSG_TYPES.TABLE_HIT: struct.pack("ii", 0, 3),
+        MSG_TYPES.CONFIG_CHANGE: b"",
+    }
+    msgs = []
+    for type_ in sorted(JSONL_FIELDS) + [MSG_TYPES.CONFIG_CHANGE]:
+        payload = payloads.get(type_, struct.pack("i", 0))
+        msgs.append((type_, hdr.pack(type_, 0, 0, 1, 1, 0) + payload))
+    decoded = []
+    for i in range(nb_events):
+        type_, msg = msgs[i % len(msgs)]
+        p = MSG_TYPES.get_msg_class(type_)(msg)
+        p.extract()
+        decoded.append(p)
+
+    with open(os.devnull, 'w') as devnull:
+        start = time.perf_counter()
+        for p in decoded:
+            print(p, file=devnull)
+        printer_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for p in decoded:
+        sink.write(p)
+    sink.flush()
+    sink_time = time.perf_counter() - start
+
+    print("{:<15}: {:.0f} events/s".format("print", nb_events / printer_time),
+          file=sys.stderr)
+    print("{:<15}: {:.0f} events/s".format(
+        type(sink).__name__, nb_events / sink_time), file=sys.stderr)
+
+
+def json_init(client, out=sys.stdout):
     if client is None:
-        print("Unable to request new config from switch because Thrift is unavailable")
+        print("Unable to request new config from switch because Thrift is unavailable",
+              file=out)
         sys.exit(0)
     import bmpy_utils as utils
-    json_cfg = utils.get_json_config(standard_client=client)
+    json_cfg = utils.get_json_config(standard_client=client, out=out)
     name_map.load_names(json_cfg)
 
 
-def recv_msgs(socket_addr, client):
+def parse_ports(spec):
+    ports = []
+    for part in spec.split(','):
+        first, _, last = part.partition('-')
+        ports.extend(range(int(first), int(last or first) + 1))
+    return ports
+
+
+def close_client(client):
+    try:
+        client._oprot.trans.close()
+    except Exception:
+        pass
+
+
+class Attached(object):
+    def __init__(self, socket_addr, endpoint, client, info):
+        self.socket_addr = socket_addr
+        self.endpoint = endpoint
+        self.client = client
+        self.info = info
+
+
+class SwitchDiscovery(object):
+    """Keeps one SUB socket connected to the event socket of every running
+    switch. Socket files are matched to their switch by asking each probed
+    Thrift port for its elogger_socket; the device id and program names of
+    the switch then come from that Thrift server. A switch is detached when
+    its socket file goes away or its Thrift server stops answering.
+
+    Probes and liveness checks run in the receive loop, so they give up
+    after timeout seconds, and a port which didn't answer isn't probed
+    again for retry_interval seconds. Sockets in skip (e.g. one given with
+    --socket) are already subscribed to and aren't attached again."""
+
+    def __init__(self, pattern, thrift_ip, thrift_ports, interval,
+                 stages=(), json_cfg=None, out=sys.stdout, skip=(),
+                 timeout=1.0, retry_interval=30.0):
+        self.pattern = pattern
+        self.thrift_ip = thrift_ip
+        self.thrift_ports = thrift_ports
+        self.interval = interval
+        self.stages = stages
+        # names used for switches without a reachable Thrift server
+        self.json_cfg = json_cfg
+        self.out = out
+        self.attached = {}
+        self.names = {}
+        self.default_names = name_map
+        self.last_scan = None
+        self.skip = set(skip)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        # port -> time of its last failed probe
+        self.failed = {}
+
+    def probe(self, port):
+        import bmpy_utils as utils
+        timeouts = utils.Timeouts(connect=self.timeout, read=self.timeout,
+                                  write=self.timeout)
+        client = None
+        try:
+            client = utils.thrift_connect_standard(
+                self.thrift_ip, port, out=io.StringIO(), timeouts=timeouts)
+            info = client.bm_mgmt_get_info()
+        except (SystemExit, Exception):
+            if client is not None:
+                close_client(client)
+            self.failed[port] = time.monotonic()
+            return None, None
+        self.failed.pop(port, None)
+        return client, info
+
+    def match(self, socket_addrs):
+        matched = {}
+        used = {a.info.thrift_port for a in self.attached.values()
+                if a.info is not None}
+        now = time.monotonic()
+        for port in self.thrift_ports:
+            if port in used:
+                continue
+            failed = self.failed.get(port)
+            if failed is not None and now - failed < self.retry_interval:
+                continue
+            client, info = self.probe(port)
+            if info is not None and info.elogger_socket in socket_addrs:
+                matched[info.elogger_socket] = (client, info)
+                if len(matched) == len(socket_addrs):
+                    break
+            elif client is not None:
+                close_client(client)
+        return matched
+
+    def alive(self, attached):
+        if attached.client is None:
+            return True
+        try:
+            info = attached.client.bm_mgmt_get_info()
+        except Exception:
+            return False
+        return info.elogger_socket == attached.socket_addr
+
+    def scan(self, sub):
+        self.last_scan = time.monotonic()
+        present = {"ipc://" + path for path in glob.glob(self.pattern)}
+        present -= self.skip
+        for socket_addr, attached in list(self.attached.items()):
+            if socket_addr not in present or not self.alive(attached):
+                self.detach(sub, attached)
+        new = present - set(self.attached)
+        # sockets whose switch had no Thrift server up yet are matched again
+        unmatched = {a.socket_addr for a in self.attached.values()
+                     if a.info is None}
+        if not new and not unmatched:
+            return
+        matched = self.match(new | unmatched)
+        for socket_addr in sorted(new):
+            client, info = matched.get(socket_addr, (None, None))
+            self.attach(sub, socket_addr, client, info)
+        for socket_addr in sorted(unmatched):
+            if socket_addr in matched:
+                attached = self.attached[socket_addr]
+                attached.client, attached.info = matched[socket_addr]
+                self.matched(attached)
+
+    def maybe_scan(self, sub):
+        if time.monotonic() - self.last_scan >= self.interval:
+            self.scan(sub)
+
+    def attach(self, sub, socket_addr, client, info):
+        endpoint = sub.connect(socket_addr)
+        attached = Attached(socket_addr, endpoint, client, info)
+        self.attached[socket_addr] = attached
+        if info is None:
+            self.out.write("Attached {} (no Thrift server matched)\n".format(
+                socket_addr))
+            return
+        self.matched(attached)
+
+    def matched(self, attached):
+        self.out.write("Attached {} (device {}, thrift port {})\n".format(
+            attached.socket_addr, attached.info.device_id,
+            attached.info.thrift_port))
+        self.reload(attached.info.device_id)
+
+    def detach(self, sub, attached):
+        sub.shutdown(attached.endpoint)
+        if attached.client is not None:
+            close_client(attached.client)
+        del self.attached[attached.socket_addr]
+        self.out.write("Detached {}\n".format(attached.socket_addr))
+        if attached.info is not None:
+            self.names.pop(attached.info.device_id, None)
+            for stage in self.stages:
+                stage.forget_switch(attached.info.device_id)
+
+    def client_for(self, switch_id):
+        for attached in self.attached.values():
+            if attached.info is not None and \
+                    attached.info.device_id == switch_id:
+                return attached.client
+        return None
+
+    def reload(self, switch_id):
+        client = self.client_for(switch_id)
+        names = NameMap()
+        json_cfg = self.json_cfg
+        if client is not None:
+            import bmpy_utils as utils
+            try:
+                json_cfg = utils.get_json_config(standard_client=client,
+                                                 out=self.out)
+            except (SystemExit, Exception):
+                # the switch went away, the next scan detaches it
+                pass
+        if json_cfg is not None:
+            names.load_names(json_cfg)
+        self.names[switch_id] = names
+        for stage in self.stages:
+            stage.reload_names(names, switch_id)
+
+    def names_for(self, switch_id):
+        return self.names.get(switch_id, self.default_names)
+
+    def select(self, switch_id):
+        # Msg.__str__ resolves names through the global name_map
+        global name_map
+        name_map = self.names_for(switch_id)
+
+
+def recv_msgs(socket_addr, client, sink=None, discovery=None, stages=()):
     def get_msg_type(msg):
         type_, = struct.unpack('i', msg[:4])
         return type_
 
+    # with a sink, stdout may carry the events, so notices go to stderr
+    notices = sys.stdout if sink is None else sys.stderr
+    if sink is not None:
+        stages = [sink] + list(stages)
+
     sub = nnpy.Socket(nnpy.AF_SP, nnpy.SUB)
-    sub.connect(socket_addr)
+    if socket_addr is not None:
+        sub.connect(socket_addr)
     sub.setsockopt(nnpy.SUB, nnpy.SUB_SUBSCRIBE, '')
+    clock = StageClock(stages)
+    # wake up periodically so that idle stages still get ticked and
+    # switches keep being discovered
+    timeouts = [stage.interval for stage in stages if stage.interval]
+    if discovery is not None:
+        timeouts.append(discovery.interval)
+        discovery.scan(sub)
+    if timeouts:
+        sub.setsockopt(nnpy.SOL_SOCKET, nnpy.RCVTIMEO,
+                       max(1, int(min(timeouts) * 1000)))
 
     while True:
-        msg = sub.recv()
+        try:
+            msg = sub.recv()
+        except nnpy.NNError as e:
+            if e.error_no != errno.ETIMEDOUT:
+                raise
+            clock.check()
+            if discovery is not None:
+                discovery.scan(sub)
+            continue
         msg_type = get_msg_type(msg)
 
         try:
             p = MSG_TYPES.get_msg_class(msg_type)(msg)
         except:
-            print("Unknown msg type", msg_type)
+            print("Unknown msg type", msg_type, file=notices)
             continue
         p.extract()
-        print(p)
+        if discovery is not None:
+            discovery.select(p.switch_id)
+        if sink is None:
+            print(p)
+        for stage in stages:
+            stage.observe(p)
+        clock.check()
 
         if p.type_ == MSG_TYPES.CONFIG_CHANGE:
-            print("The JSON config has changed")
-            print("Requesting new config from switch,", end=' ')
-            print("which may cause some log messages to be dropped")
-            json_init(client)
+            print("The JSON config has changed", file=notices)
+            print("Requesting new config from switch,", end=' ', file=notices)
+            print("which may cause some log messages to be dropped",
+                  file=notices)
+            if discovery is not None:
+                discovery.reload(p.switch_id)
+            else:
+                json_init(client, notices)
+                for stage in stages:
+                    stage.reload_names()
+
+        if discovery is not None:
+            discovery.maybe_scan(sub)
+
+
+def make_stages(notices, names_for=None):
+    stages = []
+    if args.detect:
+        stages.append(AnomalyDetector(args.detect_interval, args.detect_alpha,
+                                      args.detect_threshold,
+                                      args.detect_warmup, out=notices,
+                                      names_for=names_for))
+    if args.flamegraph is not None:
+        stages.append(PathAggregator(args.flamegraph,
+                                     args.flamegraph_interval))
+    return stages
 
 
 def main():
+    # with a sink, stdout may carry the events, so notices go to stderr
+    notices = sys.stderr if uses_sink(args.format, args.output) else sys.stdout
+
     deprecated_args = []
     for a in deprecated_args:
         if getattr(args, a) is not None:
-            print("Command line option '--{}' is deprecated".format(a), end=' ')
-            print("and will be ignored")
+            print("Command line option '--{}' is deprecated".format(a), end=' ',
+                  file=notices)
+            print("and will be ignored", file=notices)
 
     client = None
     socket_addr = None
     json_cfg = None
 
+    if args.benchmark is not None:
+        if args.json is not None:
+            with open(args.json, 'r') as f:
+                name_map.load_names(f.read())
+        sink = make_sink(args.format, args.output, args.buffer_size,
+                         args.flush_interval)
+        if sink is None:
+            sink = Sink(open_output(os.devnull, args.buffer_size))
+        benchmark(args.benchmark, sink)
+        sink.close()
+        return
+
+    if args.discover:
+        if args.json is not None:
+            with open(args.json, 'r') as f:
+                json_cfg = f.read()
+            name_map.load_names(json_cfg)
+        sink = make_sink(args.format, args.output, args.buffer_size,
+                         args.flush_interval)
+        stages = make_stages(notices, lambda switch_id:
+                             discovery.names_for(switch_id))
+        discovery = SwitchDiscovery(args.discover_glob, args.thrift_ip,
+                                    parse_ports(args.discover_ports),
+                                    args.discover_interval,
+                                    stages=[sink] + stages if sink else stages,
+                                    json_cfg=json_cfg, out=notices,
+                                    skip=[args.socket] if args.socket else [])
+        try:
+            recv_msgs(args.socket, None, sink, discovery, stages)
+        finally:
+            if sink is not None:
+                sink.close()
+            for stage in stages:
+                stage.close()
+        return
+
     if args.socket is not None:
         socket_addr = args.socket
 
@@ -504,30 +1271,44 @@ def main():
             import bmpy_utils as utils
         except:
             print(
-                "When '--json' or '--socket' is not provided, the client needs bmpy_utils")
-            print("bmpy_utils is not available when building bmv2 without Thrift support")
+                "When '--json' or '--socket' is not provided, the client needs bmpy_utils",
+                file=notices)
+            print("bmpy_utils is not available when building bmv2 without Thrift support",
+                  file=notices)
             sys.exit(1)
         client = utils.thrift_connect_standard(
-            args.thrift_ip, args.thrift_port)
+            args.thrift_ip, args.thrift_port, out=notices)
         info = client.bm_mgmt_get_info()
         if info.elogger_socket is None:
-            print("The event logger is not enabled on the switch,", end=' ')
-            print("run with '--nanolog <addr>'")
+            print("The event logger is not enabled on the switch,", end=' ',
+                  file=notices)
+            print("run with '--nanolog <addr>'", file=notices)
             sys.exit(1)
         if args.socket is None:
             socket_addr = info.elogger_socket
-            print("'--socket' not provided, using", socket_addr, end=' ')
-            print("(obtained from switch)")
+            print("'--socket' not provided, using", socket_addr, end=' ',
+                  file=notices)
+            print("(obtained from switch)", file=notices)
 
         if args.json is None:
-            json_cfg = utils.get_json_config(standard_client=client)
+            json_cfg = utils.get_json_config(standard_client=client,
+                                             out=notices)
 
     if args.json is not None:
         with open(args.json, 'r') as f:
             json_cfg = f.read()
     name_map.load_names(json_cfg)
 
-    recv_msgs(socket_addr, client)
+    sink = make_sink(args.format, args.output, args.buffer_size,
+                     args.flush_interval)
+    stages = make_stages(notices)
+    try:
+        recv_msgs(socket_addr, client, sink, stages=stages)
+    finally:
+        if sink is not None:
+            sink.close()
+        for stage in stages:
+            stage.close()
 
 
 if __name__ == "__main__":